@@ -0,0 +1,292 @@
+"""
+Benchmark the conversion of recipes and the feedrattler edits applied to them.
+
+Every recipe of the corpus goes through the stages of the conversion: the conversion of
+`meta.yaml` by conda-recipe-manager, the loading of the converted recipe, the build number
+bump, each fix and the YAML dump. The wall time and the memory peak of every stage are
+reported, and saved with `--output` to be compared against with `--baseline`:
+
+    python benchmarks/bench_conversion.py --output before.json
+    python benchmarks/bench_conversion.py --baseline before.json
+
+The corpus is versioned: each recipe of `corpus/<version>/<name>/` has its `meta.yaml` and the
+`recipe.yaml` converted from it, which the edit stages start from so their timings do not
+depend on the conda-recipe-manager version. A new corpus version must be created instead of
+editing the recipes of an existing one, including the generated `huge` recipe.
+"""
+
+import dataclasses
+import io
+import json
+import logging
+import pathlib
+import platform
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass
+from importlib.metadata import PackageNotFoundError, version
+from typing import Annotated, Callable, Iterator, Optional
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from feedrattler import __version__
+from feedrattler.recipe import bump_build_number
+from feedrattler.utils import (
+    initialize_yaml,
+    remove_empty_script_test_data,
+    update_python_min_in_recipe_data,
+    update_python_version_in_tests_data,
+)
+
+CORPUS_VERSION = "v1"
+CORPUS_DIR = pathlib.Path(__file__).parent / "corpus" / CORPUS_VERSION
+
+
+@dataclass
+class StageResult:
+    recipe: str
+    stage: str
+    median: float
+    min: float
+    peak_memory: int
+
+
+def huge_recipe(n_outputs: int = 40, n_requirements: int = 60) -> tuple[str, str]:
+    """
+    A multi-output recipe with long requirement lists and many selectors, as `meta.yaml`
+    and converted `recipe.yaml` texts.
+    """
+
+    meta_yaml = [
+        '{% set name = "huge" %}',
+        '{% set version = "1.0.0" %}',
+        "",
+        "package:",
+        "  name: {{ name }}-split",
+        "  version: {{ version }}",
+        "",
+        "source:",
+        "  url: https://example.com/{{ name }}-{{ version }}.tar.gz",
+        f"  sha256: {'0' * 64}",
+        "",
+        "build:",
+        "  number: 3",
+        "",
+        "outputs:",
+    ]
+    recipe_yaml = [
+        "schema_version: 1",
+        "",
+        "context:",
+        "  name: huge",
+        "  version: 1.0.0",
+        "",
+        "recipe:",
+        "  name: ${{ name }}-split",
+        "  version: ${{ version }}",
+        "",
+        "source:",
+        "  url: https://example.com/${{ name }}-${{ version }}.tar.gz",
+        f"  sha256: {'0' * 64}",
+        "",
+        "build:",
+        "  number: 3",
+        "",
+        "outputs:",
+    ]
+
+    selectors = {3: "linux", 5: "osx and arm64", 7: "win"}
+    for i in range(n_outputs):
+        meta_yaml += [
+            f"  - name: huge-part{i}",
+            "    requirements:",
+            "      build:",
+            "        - {{ compiler('c') }}",
+            "        - {{ stdlib('c') }}",
+            "      host:",
+        ]
+        recipe_yaml += [
+            "  - package:",
+            f"      name: huge-part{i}",
+            "    requirements:",
+            "      build:",
+            "        - ${{ compiler('c') }}",
+            "        - ${{ stdlib('c') }}",
+            "      host:",
+        ]
+        for j in range(n_requirements):
+            selector = next((selectors[k] for k in selectors if j % k == k - 1), None)
+            requirement = f"dep{j} >={j % 10}.{i % 10}"
+            if selector is None:
+                meta_yaml.append(f"        - {requirement}")
+                recipe_yaml.append(f"        - {requirement}")
+            else:
+                meta_yaml.append(f"        - {requirement}  # [{selector}]")
+                recipe_yaml += [f"        - if: {selector}", f"          then: {requirement}"]
+        meta_yaml += [
+            "    test:",
+            "      commands:",
+            f"        - huge-part{i} --version",
+        ]
+        recipe_yaml += [
+            "    tests:",
+            "      - script:",
+            f"          - huge-part{i} --version",
+        ]
+
+    about = [
+        "",
+        "about:",
+        "  license: MIT",
+        "  summary: A huge recipe",
+    ]
+    return "\n".join(meta_yaml + about) + "\n", "\n".join(recipe_yaml + about) + "\n"
+
+
+def load_corpus() -> dict[str, tuple[str, str]]:
+    """The `meta.yaml` and converted `recipe.yaml` texts of every recipe of the corpus, by name."""
+
+    corpus = {
+        path.name: ((path / "meta.yaml").read_text(), (path / "recipe.yaml").read_text())
+        for path in sorted(CORPUS_DIR.iterdir())
+        if path.is_dir()
+    }
+    corpus["huge"] = huge_recipe()
+    return corpus
+
+
+def _convert(meta_yaml: str):
+    from conda_recipe_manager.parser.recipe_parser_convert import RecipeParserConvert
+
+    parser = RecipeParserConvert(RecipeParserConvert.pre_process_recipe_text(meta_yaml))
+    parser.render_to_v1_recipe_format()
+
+
+def _stages(meta_yaml: str, recipe_yaml: str, convert: bool) -> Iterator[tuple[str, Callable[[], None]]]:
+    # The stages of `convert_recipe_text`, each run once the previous one is done
+    yaml = initialize_yaml()
+    state = {}
+
+    def load():
+        state["data"] = yaml.load(recipe_yaml)
+
+    if convert:
+        yield "convert", lambda: _convert(meta_yaml)
+    yield "yaml_load", load
+    yield "bump_build_number", lambda: bump_build_number(state["data"])
+    yield "fix_python_min", lambda: update_python_min_in_recipe_data(state["data"])
+    yield "fix_python_version_in_tests", lambda: update_python_version_in_tests_data(state["data"])
+    yield "fix_empty_script_test", lambda: remove_empty_script_test_data(state["data"])
+    yield "yaml_dump", lambda: yaml.dump(state["data"], io.StringIO())
+
+
+def benchmark_recipe(
+    name: str, meta_yaml: str, recipe_yaml: str, repeat: int, convert: bool
+) -> list[StageResult]:
+    times = {}
+    for _ in range(repeat):
+        for stage, run in _stages(meta_yaml, recipe_yaml, convert):
+            start = time.perf_counter()
+            run()
+            times.setdefault(stage, []).append(time.perf_counter() - start)
+
+    # The memory peaks are measured in a separate run since tracing slows the stages down
+    peaks = {}
+    tracemalloc.start()
+    try:
+        for stage, run in _stages(meta_yaml, recipe_yaml, convert):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            run()
+            peaks[stage] = tracemalloc.get_traced_memory()[1] - current
+    finally:
+        tracemalloc.stop()
+
+    return [
+        StageResult(
+            recipe=name,
+            stage=stage,
+            median=statistics.median(stage_times),
+            min=min(stage_times),
+            peak_memory=peaks[stage],
+        )
+        for stage, stage_times in times.items()
+    ]
+
+
+def _package_version(name: str) -> Optional[str]:
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def main(
+    repeat: Annotated[int, typer.Option(min=1, help="🔁 The number of runs of every stage.")] = 20,
+    recipe: Annotated[
+        Optional[list[str]], typer.Option(help="📄 Only benchmark these recipes of the corpus.")
+    ] = None,
+    output: Annotated[Optional[str], typer.Option(help="💾 Save the results to this JSON file.")] = None,
+    baseline: Annotated[
+        Optional[str], typer.Option(help="⚖️ Compare the results to those saved in this JSON file.")
+    ] = None,
+):
+    """⏱️ Benchmark the recipe conversion stages over the recipe corpus."""
+
+    # The edits log every change, keep the terminal I/O out of the timings
+    logging.disable(logging.INFO)
+
+    crm_version = _package_version("conda-recipe-manager")
+    if crm_version is None:
+        Console().print("⚠️ conda-recipe-manager is not installed, the convert stage is skipped")
+
+    corpus = load_corpus()
+    results = []
+    for name in recipe or corpus:
+        meta_yaml, recipe_yaml = corpus[name]
+        results += benchmark_recipe(name, meta_yaml, recipe_yaml, repeat, convert=crm_version is not None)
+
+    baseline_results = {}
+    if baseline is not None:
+        data = json.loads(pathlib.Path(baseline).read_text())
+        if data["corpus_version"] != CORPUS_VERSION:
+            raise typer.BadParameter(f"The baseline uses the corpus {data['corpus_version']}")
+        baseline_results = {(result["recipe"], result["stage"]): result for result in data["results"]}
+
+    table = Table(title=f"Conversion benchmark (corpus {CORPUS_VERSION}, {repeat} runs)")
+    for column in ("Recipe", "Stage", "Median (ms)", "Min (ms)", "Peak memory (KiB)"):
+        table.add_column(column, justify="left" if column in ("Recipe", "Stage") else "right")
+    if baseline_results:
+        table.add_column("vs baseline", justify="right")
+    for result in results:
+        row = [
+            result.recipe,
+            result.stage,
+            f"{result.median * 1000:.3f}",
+            f"{result.min * 1000:.3f}",
+            f"{result.peak_memory / 1024:.1f}",
+        ]
+        if baseline_results:
+            previous = baseline_results.get((result.recipe, result.stage))
+            row.append(f"{result.median / previous['median']:.2f}x" if previous else "-")
+        table.add_row(*row)
+    Console().print(table)
+
+    if output is not None:
+        data = {
+            "corpus_version": CORPUS_VERSION,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "feedrattler": __version__,
+            "conda_recipe_manager": crm_version,
+            "ruamel.yaml": _package_version("ruamel.yaml"),
+            "results": [dataclasses.asdict(result) for result in results],
+        }
+        pathlib.Path(output).write_text(json.dumps(data, indent=2))
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,278 @@
+import logging
+import pathlib
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Optional, Union
+
+from github import Github
+
+from .convert import ConversionReport, FeedstockSkipped, convert_feedstock_to_v1
+from .detect import FeedstockFormat, detect_feedstock_formats
+from .github_client import GitHubClient
+from .rerender import RerenderPool
+from .results import BatchStatus, FeedstockResult, ResultStore
+from .workspace import WorkspaceManager
+
+logger = logging.getLogger(__name__)
+
+
+def read_feedstock_list(path: str) -> list[str]:
+    """
+    Read feedstock names from a file, one per line. Blank lines and `#` comments
+    are ignored and duplicates are dropped while preserving order.
+
+    Args:
+        path: The path to the file or `-` to read from stdin.
+    """
+
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        lines = pathlib.Path(path).read_text().splitlines()
+
+    feedstock_names = []
+    for line in lines:
+        name = line.split("#", 1)[0].strip()
+        if name and name not in feedstock_names:
+            feedstock_names.append(name)
+    return feedstock_names
+
+
+def convert_one(
+    gh: GitHubClient,
+    feedstock_name: str,
+    workspaces: WorkspaceManager,
+    workspace_force_erase: bool,
+    **convert_kwargs,
+) -> FeedstockResult:
+    """
+    Convert a feedstock in a workspace and report the outcome instead of raising.
+
+    Args:
+        gh: The GitHub client.
+        feedstock_name: The name of the feedstock to convert.
+        workspaces: The manager of the local clone directories.
+        workspace_force_erase: Erase an existing workspace of the feedstock.
+        convert_kwargs: Forwarded to `convert_feedstock_to_v1`.
+
+    Returns:
+        The result of the conversion.
+    """
+
+    # Name the worker thread after the feedstock so interleaved log lines can be told apart
+    thread = threading.current_thread()
+    thread_name = thread.name
+    thread.name = feedstock_name
+
+    start = time.perf_counter()
+    report = ConversionReport()
+    try:
+        with workspaces.workspace(feedstock_name) as workspace_dir:
+            convert_feedstock_to_v1(
+                gh=gh,
+                feedstock_name=feedstock_name,
+                local_clone_dir=str(workspace_dir),
+                local_clone_dir_force_erase=workspace_force_erase,
+                report=report,
+                **convert_kwargs,
+            )
+    except FeedstockSkipped as e:
+        logger.info(str(e))
+        return feedstock_result(feedstock_name, BatchStatus.skipped, start, report, message=str(e))
+    except Exception as e:
+        logger.exception(f"❗ Failed to convert {feedstock_name}")
+        return feedstock_result(feedstock_name, BatchStatus.failed, start, report, message=str(e))
+    finally:
+        thread.name = thread_name
+
+    return feedstock_result(feedstock_name, BatchStatus.success, start, report)
+
+
+def feedstock_result(
+    feedstock_name: str,
+    status: BatchStatus,
+    start: float,
+    report: ConversionReport,
+    message: Optional[str] = None,
+) -> FeedstockResult:
+    """The result of a conversion started at the `time.perf_counter()` value `start`."""
+
+    return FeedstockResult(
+        feedstock_name=feedstock_name,
+        status=status,
+        duration=time.perf_counter() - start,
+        message=message,
+        failed_stage=report.failed_stage,
+        warnings=report.warnings,
+        pr_url=report.pr_url,
+        manual_pr_url=report.manual_pr_url,
+        stage_durations={stage: round(duration, 3) for stage, duration in report.stage_durations.items()},
+        finished_at=time.time(),
+    )
+
+
+# The number of last completed conversions the throughput is measured over
+PROGRESS_WINDOW = 20
+
+
+def _log_progress(
+    client: GitHubClient,
+    result: FeedstockResult,
+    counts: Counter,
+    completions: deque,
+    n_total: int,
+    n_calls_start: int,
+):
+    # Project the time to complete the queued feedstocks from the recent throughput, so the
+    # projection follows the current pace, and from the time the rate limit budget will make
+    # us wait for the GitHub requests they need
+    counts[result.status] += 1
+    completions.append(time.perf_counter())
+    n_done = sum(counts.values())
+    n_queued = n_total - n_done
+    throughput = (len(completions) - 1) / max(completions[-1] - completions[0], 1e-6)
+    calls_per_feedstock = (client.n_calls() - n_calls_start) / n_done
+    throughput_eta = n_queued / throughput
+    rate_limit_eta = client.governor.projected_wait(round(calls_per_feedstock * n_queued))
+    eta = max(throughput_eta, rate_limit_eta)
+
+    logger.info(
+        f"📈 {n_done}/{n_total} feedstocks done ({result.feedstock_name}: {result.status.value}), "
+        + ", ".join(f"{counts[status]} {status.value}" for status in BatchStatus)
+        + f", {throughput * 60:.1f} feedstocks/min, projected completion in {eta / 60:.1f} min"
+        + (" (limited by the GitHub rate limit budget)" if rate_limit_eta > throughput_eta else "")
+    )
+
+
+def convert_feedstocks_to_v1(
+    gh: Union[Github, GitHubClient],
+    feedstock_names: Iterable[str],
+    github_username: str,
+    max_workers: int = 4,
+    workspace_dir: Optional[str] = None,
+    workspace_force_erase: bool = False,
+    keep_failed: bool = False,
+    workspace_quota: Optional[int] = None,
+    tmpfs: bool = False,
+    only_v0: bool = False,
+    rerender_workers: Optional[int] = None,
+    rerender_timeout: Optional[float] = 900.0,
+    result_store: Optional[ResultStore] = None,
+    **convert_kwargs,
+) -> list[FeedstockResult]:
+    """
+    Convert many feedstocks with a bounded pool of workers.
+
+    Each feedstock gets its own workspace and its own result: a failure is recorded
+    and does not abort the other conversions. The workspaces are managed by a
+    `WorkspaceManager` and removed once their conversion is done.
+
+    Args:
+        gh: The GitHub client, shared by all workers.
+        feedstock_names: The names of the feedstock repositories.
+        github_username: The GitHub username owning the forks.
+        max_workers: The maximum number of feedstocks converted concurrently.
+        workspace_dir: A directory in which each feedstock is cloned to `<workspace_dir>/<feedstock_name>`.
+            A temporary dir is used if not set.
+        workspace_force_erase: Force erase a feedstock workspace if it already exists.
+        keep_failed: Keep the workspaces of the failed conversions, always the case when resuming.
+        workspace_quota: The maximum total size in bytes of the workspaces.
+        tmpfs: Create the temporary workspace dir on a RAM-backed filesystem.
+        only_v0: Detect the recipe format of all the feedstocks upfront with batched GitHub queries
+            and skip the ones that are not v0 feedstocks before cloning anything.
+        rerender_workers: The maximum number of concurrent rerenders, each running in its own process.
+            Defaults to the number of CPUs.
+        rerender_timeout: The timeout of a rerender in seconds, a hung rerender is killed after it.
+        result_store: Append the result of every feedstock to this store as soon as it is done.
+        **convert_kwargs: Extra arguments forwarded to `convert_feedstock_to_v1`.
+
+    Returns:
+        One result per feedstock, in input order.
+    """
+
+    feedstock_names = list(feedstock_names)
+    client = GitHubClient.wrap(gh)
+
+    try:
+        skipped = {}
+        if only_v0:
+            formats = client.call(
+                "graphql_detect",
+                detect_feedstock_formats,
+                feedstock_names,
+                git_rev=convert_kwargs.get("git_rev"),
+            )
+            skipped = {
+                name: FeedstockResult(
+                    feedstock_name=name,
+                    status=BatchStatus.skipped,
+                    duration=0.0,
+                    message=f"not a v0 feedstock ({feedstock_format.value})",
+                    finished_at=time.time(),
+                )
+                for name, feedstock_format in formats.items()
+                if feedstock_format != FeedstockFormat.v0
+            }
+            logger.info(f"⏭️ Skipping {len(skipped)} feedstocks that are not v0 feedstocks")
+            if result_store is not None:
+                for result in skipped.values():
+                    result_store.append(result)
+
+        logger.info(
+            f"🗂️ Converting {len(feedstock_names) - len(skipped)} feedstocks with {max_workers} workers"
+        )
+
+        with (
+            WorkspaceManager(
+                workspace_dir,
+                # The failed conversions must be kept to be resumed again
+                keep_failed=keep_failed or convert_kwargs.get("resume", False),
+                quota=workspace_quota,
+                tmpfs=tmpfs,
+            ) as workspaces,
+            RerenderPool(max_workers=rerender_workers, timeout=rerender_timeout) as rerender_pool,
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="feedrattler") as executor,
+        ):
+            futures = {
+                feedstock_name: executor.submit(
+                    convert_one,
+                    client,
+                    feedstock_name,
+                    workspaces,
+                    workspace_force_erase,
+                    github_username=github_username,
+                    rerender_pool=rerender_pool,
+                    **convert_kwargs,
+                )
+                for feedstock_name in feedstock_names
+                if feedstock_name not in skipped
+            }
+
+            counts = Counter()
+            completions = deque([time.perf_counter()], maxlen=PROGRESS_WINDOW + 1)
+            n_calls_start = client.n_calls()
+            for future in as_completed(futures.values()):
+                result = future.result()
+                if result_store is not None:
+                    result_store.append(result)
+                _log_progress(client, result, counts, completions, len(futures), n_calls_start)
+
+            results = [
+                skipped[feedstock_name] if feedstock_name in skipped else futures[feedstock_name].result()
+                for feedstock_name in feedstock_names
+            ]
+
+        n_success = sum(result.status == BatchStatus.success for result in results)
+        n_failed = sum(result.status == BatchStatus.failed for result in results)
+        logger.info(
+            f"🏁 Converted {n_success}/{len(results)} feedstocks ({n_failed} failed, {len(skipped)} skipped)"
+        )
+        client.log_latency_summary()
+
+        return results
+    finally:
+        if client is not gh:
+            client.close()
@@ -0,0 +1,80 @@
+import json
+import logging
+import os
+import pathlib
+from enum import Enum
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Step(str, Enum):
+    clone = "clone"
+    commit = "commit"
+    rerender = "rerender"
+    push = "push"
+    pull_request = "pull_request"
+
+
+class Checkpoint:
+    """
+    The completed steps of a feedstock conversion, stored next to the clone so an interrupted
+    or failed conversion can be resumed from its first incomplete step.
+
+    Every step records the data needed to check the workspace is still in the state it left it
+    in, such as the commit the feedstock branch pointed to once the step completed.
+
+    Args:
+        workspace_dir: The directory holding the feedstock clone.
+        options: The conversion options the steps depend on. A checkpoint recorded with
+            different options can not be resumed.
+        steps: The completed steps and their data.
+    """
+
+    FILE_NAME = "feedrattler-checkpoint.json"
+
+    def __init__(
+        self,
+        workspace_dir: os.PathLike,
+        options: dict[str, Any],
+        steps: Optional[dict[str, dict[str, Any]]] = None,
+    ):
+        self.workspace_dir = pathlib.Path(workspace_dir)
+        self.options = options
+        self.steps = steps if steps is not None else {}
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self.workspace_dir / self.FILE_NAME
+
+    @classmethod
+    def load(cls, workspace_dir: os.PathLike) -> Optional["Checkpoint"]:
+        path = pathlib.Path(workspace_dir) / cls.FILE_NAME
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text())
+        return cls(workspace_dir, options=data["options"], steps=data["steps"])
+
+    def done(self, step: Step) -> bool:
+        return step.value in self.steps
+
+    def get(self, step: Step) -> dict[str, Any]:
+        return self.steps[step.value]
+
+    def last_sha(self) -> str:
+        """The commit of the feedstock branch after the last completed step."""
+
+        for step in (Step.rerender, Step.commit, Step.clone):
+            if self.done(step):
+                return self.get(step)["sha"]
+        raise ValueError("❗ No step has been completed")
+
+    def record(self, step: Step, **data):
+        self.steps[step.value] = data
+        self.workspace_dir.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first so an interruption never leaves a partial checkpoint
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"options": self.options, "steps": self.steps}, indent=2))
+        tmp_path.rename(self.path)
+        logger.debug(f"💾 Recorded the {step.value} checkpoint in {self.path}")
@@ -9,23 +9,43 @@ pixi add python pygithub gitpython typer rich conda-smithy conda-recipe-manager
 You need a GH fine-grained token with "Read and Write access to administration and code"
 """
 
+import dataclasses
+import json
 import logging
 import os
-from typing import Annotated, Optional
+import pathlib
+import signal
+import threading
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Annotated, Optional
 
 import typer
 from dotenv import load_dotenv
-from github import Github
+from rich.console import Console
 from rich.logging import RichHandler
+from rich.table import Table
 
-from .convert import convert_feedstock_to_v1
+from .detect import FeedstockFormat
+from .results import BatchStatus
 from .utils import (
     CloneType,
+    ExistingPolicy,
     auto_detect_clone_type,
     detect_username_ssh,
     token_from_gh_cli,
 )
 
+# The modules importing git, PyGithub, conda-recipe-manager or conda-smithy are imported by the
+# commands using them so `--help`, `--version` and the light commands start fast
+if TYPE_CHECKING:
+    from .conversion_cache import ConversionCache
+    from .git_utils import MirrorCache
+    from .github_client import GitHubClient
+    from .metrics import RunMetrics
+    from .rerender_cache import RerenderCache
+    from .results import FeedstockResult, ResultStore
+
 logger = logging.getLogger(__name__)
 
 app = typer.Typer(no_args_is_help=True)
@@ -39,110 +59,926 @@ def version_callback(value: bool):
         raise typer.Exit()
 
 
+# The arguments and options shared by several commands, their defaults are set in the signatures
+VersionOption = Annotated[
+    bool,
+    typer.Option("--version", callback=version_callback, help="Show the version of the application."),
+]
+FeedstockListArgument = Annotated[
+    str,
+    typer.Argument(help="📄 Path to a file with one feedstock name per line. Use `-` to read from stdin."),
+]
+GitHubUsernameArgument = Annotated[
+    Optional[str], typer.Argument(help="👤 The GitHub username or organization that owns the feedstock.")
+]
+LogLevelOption = Annotated[
+    str,
+    typer.Option(help="🚦 The log level to use. Options: DEBUG, INFO, WARNING, ERROR, CRITICAL"),
+]
+GitHubTokenOption = Annotated[
+    Optional[str],
+    typer.Option(
+        envvar="GITHUB_TOKEN",
+        help="🔑 GitHub token. Defaults to the GITHUB_TOKEN environment variable or gh cli.",
+    ),
+]
+DotenvOption = Annotated[
+    Optional[str], typer.Option(help="📄 Path to a .env file containing environment variables.")
+]
+RotateTokensOption = Annotated[
+    bool,
+    typer.Option(
+        help="🔑 Rotate read requests across the tokens of the GITHUB_TOKENS environment variable (comma separated) and gh cli."
+    ),
+]
+GitHubWaitTimeoutOption = Annotated[
+    float,
+    typer.Option(
+        min=0, help="⏳ The maximum time in seconds to wait for GitHub, e.g. for a new fork to be ready."
+    ),
+]
+CacheDirOption = Annotated[
+    Optional[str],
+    typer.Option(
+        envvar="FEEDRATTLER_CACHE_DIR",
+        help="🗄️ The feedrattler cache directory. Defaults to `~/.cache/feedrattler`.",
+    ),
+]
+UsePixiOption = Annotated[
+    bool,
+    typer.Option(
+        help="🚀 Add `pixi` to the conda-forge configuration `conda_install_tool` to manage the conda environment."
+    ),
+]
+ResumeOption = Annotated[
+    bool,
+    typer.Option(
+        help="⏩ Resume the failed conversions from the checkpoints in their clone dir or workspace, skipping their completed steps."
+    ),
+]
+OnExistingOption = Annotated[
+    ExistingPolicy,
+    typer.Option(
+        help="♻️ What to do when the conversion branch or an open v1 PR already exists: skip the feedstock, update the open PR, or force a new PR."
+    ),
+]
+GitRevOption = Annotated[
+    Optional[str],
+    typer.Option(help="📌 The git SHA to clone the feedstock. The default branch HEAD is used when not set."),
+]
+BranchNameOption = Annotated[
+    str, typer.Option(help="🌿 The name of the branch to create for the converted recipe.")
+]
+DraftPrOption = Annotated[bool, typer.Option(help="📝 Whether to create a draft pull request or not.")]
+RerenderOption = Annotated[bool, typer.Option(help="🔄 Whether to re-render the feedstock after conversion.")]
+RerenderWorkersOption = Annotated[
+    Optional[int],
+    typer.Option(
+        min=1,
+        help="👷 The number of re-render worker processes, each re-rendering one feedstock at a time. Defaults to the number of CPUs.",
+    ),
+]
+RerenderTimeoutOption = Annotated[
+    float,
+    typer.Option(min=0, help="⏳ The maximum time in seconds of a re-render before it is killed."),
+]
+RerenderLogDirOption = Annotated[
+    Optional[str],
+    typer.Option(
+        help="📝 Directory in which the re-render logs are written to `<feedstock_name>.log`. Defaults to `rerender-logs` in the cache dir."
+    ),
+]
+SaveRerenderLogsOption = Annotated[
+    bool,
+    typer.Option(
+        help="📝 Write the re-render logs of the successful conversions too, not only of the failed ones."
+    ),
+]
+MetricsFileOption = Annotated[
+    Optional[str],
+    typer.Option(
+        help="⏱️ Append the per-stage metrics (wall and CPU time, bytes cloned and pushed, GitHub calls) of each feedstock to this file as JSON lines."
+    ),
+]
+ResultStoreOption = Annotated[
+    Optional[str],
+    typer.Option(
+        help="🗃️ Append the result of each feedstock (status, failed stage, warnings, PR URL, stage durations) to this file as JSON lines. Defaults to `results.jsonl` in the cache dir."
+    ),
+]
+CloneTypeOption = Annotated[CloneType, typer.Option(help="🐑 The type of clone to use (ssh or https).")]
+CloneDepthOption = Annotated[
+    Optional[int],
+    typer.Option(min=1, help="🪶 Create a shallow clone truncated to the given number of commits."),
+]
+CloneFilterOption = Annotated[
+    Optional[str], typer.Option(help="🧹 Partial clone filter such as `blob:none` or `tree:0`.")
+]
+CloneSingleBranchOption = Annotated[
+    bool, typer.Option(help="🌱 Only clone the history of the default branch or `--git-rev`.")
+]
+MirrorCacheOption = Annotated[
+    bool,
+    typer.Option(
+        help="🗄️ Clone from a local mirror of the feedstock kept in the cache dir, only fetching new objects."
+    ),
+]
+MirrorCacheMaxSizeOption = Annotated[
+    float, typer.Option(min=0, help="🗄️ The maximum size of the mirror cache in GiB.")
+]
+ConversionCacheOption = Annotated[
+    bool,
+    typer.Option(
+        help="⚡ Reuse the cached conversion of a feedstock whose recipe and `conda-forge.yml` did not change."
+    ),
+]
+RerenderCacheOption = Annotated[
+    bool,
+    typer.Option(
+        help="⚡ Reuse the cached re-render of a feedstock whose converted files, conda-forge pinning and conda-smithy version did not change."
+    ),
+]
+MaxWorkersOption = Annotated[
+    int, typer.Option(min=1, help="👷 The maximum number of feedstocks converted concurrently.")
+]
+SpoolDirOption = Annotated[
+    Optional[str],
+    typer.Option(help="📬 The spool directory of the server. Defaults to `spool` in the cache dir."),
+]
+WorkspaceDirOption = Annotated[
+    Optional[str],
+    typer.Option(
+        help="📁 Directory in which each feedstock is cloned to `<workspace-dir>/<feedstock_name>`. A temporary dir is used if not set."
+    ),
+]
+KeepFailedOption = Annotated[
+    bool,
+    typer.Option(help="📁 Keep the workspaces of the failed conversions instead of removing them."),
+]
+WorkspaceQuotaOption = Annotated[
+    Optional[float],
+    typer.Option(
+        min=0,
+        help="💾 The maximum total size of the workspaces in GiB. Kept workspaces are evicted and new conversions wait to stay under it.",
+    ),
+]
+TmpfsOption = Annotated[
+    bool,
+    typer.Option(help="🐏 Create the temporary workspace dir on the RAM-backed filesystem at `/dev/shm`."),
+]
+
+
+def _setup_logging(log_level: str, format: str = "%(message)s"):
+    logging.basicConfig(
+        level=log_level,
+        format=format,
+        datefmt="[%X]",
+        handlers=[RichHandler()],
+    )
+
+
+def _setup_github(
+    github_username: Optional[str],
+    github_token: Optional[str],
+    dotenv: Optional[str],
+    clone_type: CloneType,
+    pool_size: int = 10,
+    rotate_tokens: bool = False,
+) -> tuple["GitHubClient", str, CloneType]:
+    from .github_client import GitHubClient
+
+    load_dotenv(dotenv)
+    github_token = os.getenv("GITHUB_TOKEN", github_token)
+    if not github_token:
+        github_token = token_from_gh_cli(github_username)
+
+    tokens = [github_token]
+    if rotate_tokens and github_token:
+        # Extra tokens are only used for read requests, writes always use the primary token
+        extra_tokens = [token.strip() for token in os.getenv("GITHUB_TOKENS", "").split(",")]
+        extra_tokens.append(token_from_gh_cli(None))
+        tokens += [token for token in dict.fromkeys(extra_tokens) if token and token != github_token]
+        logger.info(f"🔑 Rotating read requests across {len(tokens)} GitHub tokens")
+
+    client = GitHubClient.from_tokens(tokens, pool_size=pool_size)
+    # If we have a token, check if it's valid and corresponds to the username
+    if github_token:
+        github_username_api = client.gh.get_user().login
+        if github_username is None:
+            github_username = github_username_api
+        if github_username != github_username_api:
+            raise ValueError(f"GitHub username mismatch: {github_username} != {github_username_api}")
+
+    # If we still don't have a username, try to detect it from SSH
+    if github_username is None:
+        github_username = detect_username_ssh()
+
+    # Automatic detection failed so give up
+    if github_username is None:
+        raise ValueError("GitHub username couldn't be auto detected")
+
+    # If a clone type wasn't specified, try to auto-detect it
+    if clone_type == CloneType.auto:
+        clone_type = auto_detect_clone_type(github_username)
+
+    return client, github_username, clone_type
+
+
+def _setup_conversion_cache(enabled: bool, cache_dir: Optional[str]) -> Optional["ConversionCache"]:
+    from .conversion_cache import ConversionCache
+
+    if not enabled:
+        return None
+    return ConversionCache(pathlib.Path(cache_dir) / "conversions" if cache_dir is not None else None)
+
+
+def _setup_rerender_cache(enabled: bool, cache_dir: Optional[str]) -> Optional["RerenderCache"]:
+    from .rerender_cache import RerenderCache
+
+    if not enabled:
+        return None
+    return RerenderCache(pathlib.Path(cache_dir) / "rerenders" if cache_dir is not None else None)
+
+
+def _setup_metrics(metrics_file: Optional[str]) -> "RunMetrics":
+    from .metrics import JsonLinesWriter, RunMetrics
+
+    metrics = RunMetrics()
+    if metrics_file is not None:
+        metrics.add_hook(JsonLinesWriter(metrics_file))
+    return metrics
+
+
+def _setup_result_store(result_store: Optional[str], cache_dir: Optional[str]) -> "ResultStore":
+    from .results import ResultStore
+
+    if result_store is None and cache_dir is not None:
+        result_store = pathlib.Path(cache_dir) / "results.jsonl"
+    return ResultStore(result_store)
+
+
+def _spool_dir(cache_dir: Optional[str]) -> Optional[pathlib.Path]:
+    return pathlib.Path(cache_dir) / "spool" if cache_dir is not None else None
+
+
+def _setup_mirror_cache(
+    enabled: bool, max_size: float, cache_dir: Optional[str], min_age: float = 3600
+) -> Optional["MirrorCache"]:
+    from .git_utils import MirrorCache
+
+    if not enabled:
+        return None
+    return MirrorCache(
+        cache_dir=pathlib.Path(cache_dir) / "mirrors" if cache_dir is not None else None,
+        max_size=int(max_size * 2**30),
+        min_age=min_age,
+    )
+
+
+def _quota_bytes(quota: Optional[float]) -> Optional[int]:
+    return int(quota * 2**30) if quota is not None else None
+
+
+def _print_results(
+    results: list["FeedstockResult"], title: str = "Batch conversion results", exit_on_failure: bool = True
+):
+    table = Table(title=title)
+    table.add_column("Feedstock")
+    table.add_column("Status")
+    table.add_column("Stage")
+    table.add_column("Duration (s)", justify="right")
+    table.add_column("Message")
+    for result in results:
+        table.add_row(
+            result.feedstock_name,
+            result.status.value,
+            result.failed_stage or "",
+            f"{result.duration:.1f}",
+            result.message or result.pr_url or result.manual_pr_url or "",
+        )
+    Console().print(table)
+
+    if exit_on_failure and any(result.status == BatchStatus.failed for result in results):
+        raise typer.Exit(code=1)
+
+
 @app.command()
 def main(
     feedstock_name: Annotated[str, typer.Argument(help="📦 The name of the feedstock repository.")],
-    github_username: Annotated[
-        Optional[str], typer.Argument(help="👤 The GitHub username or organization that owns the feedstock.")
+    github_username: GitHubUsernameArgument = None,
+    use_pixi: UsePixiOption = True,
+    local_clone_dir: Annotated[
+        Optional[str],
+        typer.Option(
+            help="📁 Path to a local clone of the feedstock repository. A temporary dir, removed once done, will be created if not set."
+        ),
     ] = None,
-    use_pixi: Annotated[
+    local_clone_dir_force_erase: Annotated[
+        bool, typer.Option(help="💥 Force erase the local clone directory if it exists.")
+    ] = False,
+    resume: ResumeOption = False,
+    on_existing: OnExistingOption = ExistingPolicy.skip,
+    git_rev: GitRevOption = None,
+    branch_name: BranchNameOption = "convert_feedstock_to_v1_recipe_format",
+    rerender: RerenderOption = True,
+    rerender_timeout: RerenderTimeoutOption = 900.0,
+    rerender_log_dir: RerenderLogDirOption = None,
+    save_rerender_logs: SaveRerenderLogsOption = False,
+    draft_pr: DraftPrOption = True,
+    enable_rerender_logs: Annotated[
+        bool, typer.Option(help="📝 Enable detailed logs from the re-rendering process.")
+    ] = False,
+    log_level: LogLevelOption = "INFO",
+    metrics_file: MetricsFileOption = None,
+    result_store: ResultStoreOption = None,
+    github_token: GitHubTokenOption = None,
+    dotenv: DotenvOption = None,
+    clone_type: CloneTypeOption = CloneType.auto,
+    clone_depth: CloneDepthOption = None,
+    clone_filter: CloneFilterOption = None,
+    clone_single_branch: CloneSingleBranchOption = False,
+    mirror_cache: MirrorCacheOption = False,
+    mirror_cache_max_size: MirrorCacheMaxSizeOption = 20.0,
+    conversion_cache: ConversionCacheOption = True,
+    rerender_cache: RerenderCacheOption = True,
+    cache_dir: CacheDirOption = None,
+    github_wait_timeout: GitHubWaitTimeoutOption = 60.0,
+    version: VersionOption = False,
+):
+    if resume and local_clone_dir is None:
+        raise typer.BadParameter("--resume requires --local-clone-dir")
+
+    from .batch import feedstock_result
+    from .convert import ConversionReport, FeedstockSkipped, convert_feedstock_to_v1
+
+    _setup_logging(log_level)
+    client, github_username, clone_type = _setup_github(github_username, github_token, dotenv, clone_type)
+    store = _setup_result_store(result_store, cache_dir)
+
+    report = ConversionReport()
+    start = time.perf_counter()
+    status, message = BatchStatus.failed, None
+    try:
+        convert_feedstock_to_v1(
+            gh=client,
+            feedstock_name=feedstock_name,
+            github_username=github_username,
+            use_pixi=use_pixi,
+            local_clone_dir=local_clone_dir,
+            local_clone_dir_force_erase=local_clone_dir_force_erase,
+            resume=resume,
+            on_existing=on_existing,
+            git_rev=git_rev,
+            branch_name=branch_name,
+            enable_rerender_logs=enable_rerender_logs,
+            do_rerender=rerender,
+            rerender_timeout=rerender_timeout,
+            rerender_log_dir=rerender_log_dir,
+            save_rerender_logs=save_rerender_logs,
+            clone_type=clone_type,
+            draft_pr=draft_pr,
+            clone_depth=clone_depth,
+            clone_filter=clone_filter,
+            clone_single_branch=clone_single_branch,
+            mirror_cache=_setup_mirror_cache(mirror_cache, mirror_cache_max_size, cache_dir),
+            conversion_cache=_setup_conversion_cache(conversion_cache, cache_dir),
+            rerender_cache=_setup_rerender_cache(rerender_cache, cache_dir),
+            metrics=_setup_metrics(metrics_file),
+            github_wait_timeout=github_wait_timeout,
+            report=report,
+        )
+        status = BatchStatus.success
+    except FeedstockSkipped as e:
+        status, message = BatchStatus.skipped, str(e)
+        logger.info(message)
+    except Exception as e:
+        message = str(e)
+        raise
+    finally:
+        store.append(feedstock_result(feedstock_name, status, start, report, message=message))
+        client.log_latency_summary()
+        client.close()
+
+
+batch_app = typer.Typer(no_args_is_help=True)
+
+
+@batch_app.callback()
+def batch_main(
+    version: VersionOption = False,
+):
+    """🗂️ Run feedrattler over many feedstocks."""
+
+
+@batch_app.command("convert")
+def batch_convert(
+    feedstock_list: FeedstockListArgument,
+    github_username: GitHubUsernameArgument = None,
+    max_workers: MaxWorkersOption = 4,
+    workspace_dir: WorkspaceDirOption = None,
+    workspace_force_erase: Annotated[
+        bool, typer.Option(help="💥 Force erase a feedstock workspace if it already exists.")
+    ] = False,
+    keep_failed: KeepFailedOption = False,
+    workspace_quota: WorkspaceQuotaOption = None,
+    tmpfs: TmpfsOption = False,
+    resume: ResumeOption = False,
+    on_existing: OnExistingOption = ExistingPolicy.skip,
+    only_v0: Annotated[
         bool,
         typer.Option(
-            help="🚀 Add `pixi` to the conda-forge configuration `conda_install_tool` to manage the conda environment."
+            help="🔍 Detect the recipe format of all the feedstocks upfront and skip the ones that are not v0 feedstocks."
         ),
     ] = True,
-    local_clone_dir: Annotated[
+    use_pixi: UsePixiOption = True,
+    branch_name: BranchNameOption = "convert_feedstock_to_v1_recipe_format",
+    rerender: RerenderOption = True,
+    rerender_workers: RerenderWorkersOption = None,
+    rerender_timeout: RerenderTimeoutOption = 900.0,
+    rerender_log_dir: RerenderLogDirOption = None,
+    save_rerender_logs: SaveRerenderLogsOption = False,
+    draft_pr: DraftPrOption = True,
+    log_level: LogLevelOption = "INFO",
+    metrics_file: MetricsFileOption = None,
+    result_store: ResultStoreOption = None,
+    github_token: GitHubTokenOption = None,
+    dotenv: DotenvOption = None,
+    rotate_tokens: RotateTokensOption = False,
+    clone_type: CloneTypeOption = CloneType.auto,
+    clone_depth: CloneDepthOption = None,
+    clone_filter: CloneFilterOption = None,
+    clone_single_branch: CloneSingleBranchOption = False,
+    mirror_cache: MirrorCacheOption = False,
+    mirror_cache_max_size: MirrorCacheMaxSizeOption = 20.0,
+    conversion_cache: ConversionCacheOption = True,
+    rerender_cache: RerenderCacheOption = True,
+    cache_dir: CacheDirOption = None,
+    github_wait_timeout: GitHubWaitTimeoutOption = 60.0,
+):
+    """🗂️ Convert many feedstocks to v1 recipes in parallel."""
+
+    if resume and workspace_dir is None:
+        raise typer.BadParameter("--resume requires --workspace-dir")
+    if tmpfs and workspace_dir is not None:
+        raise typer.BadParameter("--tmpfs can not be used with --workspace-dir")
+
+    from .batch import convert_feedstocks_to_v1, read_feedstock_list
+
+    _setup_logging(log_level, format="[%(threadName)s] %(message)s")
+    # Each conversion issues a few GitHub requests in the background
+    client, github_username, clone_type = _setup_github(
+        github_username,
+        github_token,
+        dotenv,
+        clone_type,
+        pool_size=3 * max_workers,
+        rotate_tokens=rotate_tokens,
+    )
+
+    with client:
+        results = convert_feedstocks_to_v1(
+            gh=client,
+            feedstock_names=read_feedstock_list(feedstock_list),
+            github_username=github_username,
+            max_workers=max_workers,
+            workspace_dir=workspace_dir,
+            workspace_force_erase=workspace_force_erase,
+            keep_failed=keep_failed,
+            workspace_quota=_quota_bytes(workspace_quota),
+            tmpfs=tmpfs,
+            resume=resume,
+            on_existing=on_existing,
+            only_v0=only_v0,
+            use_pixi=use_pixi,
+            branch_name=branch_name,
+            do_rerender=rerender,
+            rerender_workers=rerender_workers,
+            rerender_timeout=rerender_timeout,
+            rerender_log_dir=rerender_log_dir,
+            save_rerender_logs=save_rerender_logs,
+            clone_type=clone_type,
+            draft_pr=draft_pr,
+            clone_depth=clone_depth,
+            clone_filter=clone_filter,
+            clone_single_branch=clone_single_branch,
+            mirror_cache=_setup_mirror_cache(mirror_cache, mirror_cache_max_size, cache_dir),
+            conversion_cache=_setup_conversion_cache(conversion_cache, cache_dir),
+            rerender_cache=_setup_rerender_cache(rerender_cache, cache_dir),
+            metrics=_setup_metrics(metrics_file),
+            result_store=_setup_result_store(result_store, cache_dir),
+            github_wait_timeout=github_wait_timeout,
+        )
+
+    _print_results(results)
+
+
+@batch_app.command("detect")
+def batch_detect(
+    feedstock_list: FeedstockListArgument,
+    output: Annotated[
         Optional[str],
         typer.Option(
-            help="📁 Path to a local clone of the feedstock repository. A temporary dir will be created if not set."
+            help="💾 Write the names of the feedstocks matching `--format` to this file, one per line."
         ),
     ] = None,
-    local_clone_dir_force_erase: Annotated[
-        bool, typer.Option(help="💥 Force erase the local clone directory if it exists.")
-    ] = False,
+    format: Annotated[
+        Optional[list[FeedstockFormat]],
+        typer.Option(help="🔍 Only report feedstocks with these formats. Can be repeated."),
+    ] = None,
     git_rev: Annotated[
         Optional[str],
+        typer.Option(help="📌 The git revision to inspect. The default branch HEAD is used when not set."),
+    ] = None,
+    log_level: LogLevelOption = "INFO",
+    github_token: GitHubTokenOption = None,
+    dotenv: DotenvOption = None,
+    rotate_tokens: RotateTokensOption = False,
+):
+    """🔍 Detect whether feedstocks are v0 or v1 feedstocks with batched GitHub queries."""
+
+    from .batch import read_feedstock_list
+    from .detect import detect_feedstock_formats
+
+    _setup_logging(log_level)
+    client, _, _ = _setup_github(None, github_token, dotenv, CloneType.https, rotate_tokens=rotate_tokens)
+
+    with client:
+        formats = client.call(
+            "graphql_detect", detect_feedstock_formats, read_feedstock_list(feedstock_list), git_rev=git_rev
+        )
+    if format:
+        formats = {
+            name: feedstock_format for name, feedstock_format in formats.items() if feedstock_format in format
+        }
+
+    table = Table(title="Feedstock recipe formats")
+    table.add_column("Feedstock")
+    table.add_column("Format")
+    for name, feedstock_format in formats.items():
+        table.add_row(name, feedstock_format.value)
+    Console().print(table)
+
+    for feedstock_format in FeedstockFormat:
+        count = sum(value == feedstock_format for value in formats.values())
+        logger.info(f"📊 {feedstock_format.value}: {count} feedstocks")
+
+    if output is not None:
+        pathlib.Path(output).write_text("".join(f"{name}\n" for name in formats))
+        logger.info(f"💾 Wrote {len(formats)} feedstock names to {output}")
+
+
+@batch_app.command("scan")
+def batch_scan(
+    output: Annotated[
+        Optional[str],
+        typer.Option(help="💾 Write the scan of every feedstock to this file as JSON lines."),
+    ] = None,
+    owner: Annotated[
+        str, typer.Option(help="🏢 The GitHub organization owning the feedstocks.")
+    ] = "conda-forge",
+    max_workers: Annotated[
+        int, typer.Option(min=1, help="👷 The maximum number of concurrent GitHub requests.")
+    ] = 8,
+    scan_cache: Annotated[
+        bool,
         typer.Option(
-            help="📌 The git SHA to clone the feedstock. The default branch HEAD is used when not set."
+            help="⚡ Reuse the previous scan from the cache dir and only request the feedstocks that changed since, with conditional requests."
         ),
-    ] = None,
-    branch_name: Annotated[
-        str, typer.Option(help="🌿 The name of the branch to create for the converted recipe.")
-    ] = "convert_feedstock_to_v1_recipe_format",
-    rerender: Annotated[
-        bool, typer.Option(help="🔄 Whether to re-render the feedstock after conversion.")
     ] = True,
-    draft_pr: Annotated[bool, typer.Option(help="📝 Whether to create a draft pull request or not.")] = True,
-    enable_rerender_logs: Annotated[
-        bool, typer.Option(help="📝 Enable detailed logs from the re-rendering process.")
-    ] = False,
-    log_level: Annotated[
-        str,
-        typer.Option(help="🚦 The log level to use. Options: DEBUG, INFO, WARNING, ERROR, CRITICAL"),
-    ] = "INFO",
-    github_token: Annotated[
+    cache_dir: CacheDirOption = None,
+    log_level: LogLevelOption = "INFO",
+    github_token: GitHubTokenOption = None,
+    dotenv: DotenvOption = None,
+    rotate_tokens: RotateTokensOption = False,
+):
+    """📡 Scan all the feedstocks of an organization: recipe format, `bld.bat`, `noarch: python` and multi-output."""
+
+    from .scan import ScanCache, scan_feedstocks
+
+    _setup_logging(log_level)
+    client, _, _ = _setup_github(
+        None, github_token, dotenv, CloneType.https, pool_size=max_workers, rotate_tokens=rotate_tokens
+    )
+
+    cache = None
+    if scan_cache:
+        cache = ScanCache(pathlib.Path(cache_dir) / "scans" if cache_dir is not None else None)
+    with client:
+        scans = scan_feedstocks(client, owner=owner, cache=cache)
+
+    table = Table(title=f"Feedstocks of {owner}")
+    table.add_column("Format")
+    table.add_column("Feedstocks", justify="right")
+    table.add_column("bld.bat", justify="right")
+    table.add_column("noarch: python", justify="right")
+    table.add_column("Multi-output", justify="right")
+    for feedstock_format in FeedstockFormat:
+        format_scans = [scan for scan in scans if scan.format == feedstock_format]
+        table.add_row(
+            feedstock_format.value,
+            str(len(format_scans)),
+            str(sum(scan.has_bld_bat for scan in format_scans)),
+            str(sum(scan.noarch_python for scan in format_scans)),
+            str(sum(scan.multi_output for scan in format_scans)),
+        )
+    Console().print(table)
+
+    if output is not None:
+        with open(output, "w") as f:
+            for scan in scans:
+                f.write(json.dumps(dataclasses.asdict(scan)) + "\n")
+        logger.info(f"💾 Wrote the scan of {len(scans)} feedstocks to {output}")
+
+    client.log_latency_summary()
+
+
+@batch_app.command("serve")
+def batch_serve(
+    github_username: GitHubUsernameArgument = None,
+    spool_dir: SpoolDirOption = None,
+    max_workers: MaxWorkersOption = 4,
+    rerender_workers: RerenderWorkersOption = None,
+    rerender_timeout: RerenderTimeoutOption = 900.0,
+    rerender_log_dir: RerenderLogDirOption = None,
+    save_rerender_logs: SaveRerenderLogsOption = False,
+    poll_interval: Annotated[
+        float, typer.Option(min=0.1, help="⏱️ The time in seconds between two checks for new jobs.")
+    ] = 1.0,
+    workspace_dir: WorkspaceDirOption = None,
+    keep_failed: KeepFailedOption = False,
+    workspace_quota: WorkspaceQuotaOption = None,
+    tmpfs: TmpfsOption = False,
+    log_level: LogLevelOption = "INFO",
+    metrics_file: MetricsFileOption = None,
+    result_store: ResultStoreOption = None,
+    github_token: GitHubTokenOption = None,
+    dotenv: DotenvOption = None,
+    rotate_tokens: RotateTokensOption = False,
+    clone_type: CloneTypeOption = CloneType.auto,
+    mirror_cache: MirrorCacheOption = False,
+    mirror_cache_max_size: MirrorCacheMaxSizeOption = 20.0,
+    conversion_cache: ConversionCacheOption = True,
+    rerender_cache: RerenderCacheOption = True,
+    cache_dir: CacheDirOption = None,
+    github_wait_timeout: GitHubWaitTimeoutOption = 60.0,
+):
+    """🔥 Run a long-lived server converting the feedstocks submitted with `feedrattler-batch submit`."""
+
+    if tmpfs and workspace_dir is not None:
+        raise typer.BadParameter("--tmpfs can not be used with --workspace-dir")
+
+    from .server import Spool, serve
+
+    _setup_logging(log_level, format="[%(threadName)s] %(message)s")
+    client, github_username, clone_type = _setup_github(
+        github_username,
+        github_token,
+        dotenv,
+        clone_type,
+        pool_size=3 * max_workers,
+        rotate_tokens=rotate_tokens,
+    )
+
+    # Finish the running jobs on SIGTERM, like on Ctrl+C
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+
+    with client:
+        try:
+            serve(
+                gh=client,
+                github_username=github_username,
+                spool=Spool(spool_dir if spool_dir is not None else _spool_dir(cache_dir)),
+                max_workers=max_workers,
+                rerender_workers=rerender_workers,
+                rerender_timeout=rerender_timeout,
+                rerender_log_dir=rerender_log_dir,
+                save_rerender_logs=save_rerender_logs,
+                poll_interval=poll_interval,
+                workspace_dir=workspace_dir,
+                keep_failed=keep_failed,
+                workspace_quota=_quota_bytes(workspace_quota),
+                tmpfs=tmpfs,
+                stop_event=stop_event,
+                clone_type=clone_type,
+                mirror_cache=_setup_mirror_cache(mirror_cache, mirror_cache_max_size, cache_dir),
+                conversion_cache=_setup_conversion_cache(conversion_cache, cache_dir),
+                rerender_cache=_setup_rerender_cache(rerender_cache, cache_dir),
+                metrics=_setup_metrics(metrics_file),
+                result_store=_setup_result_store(result_store, cache_dir),
+                github_wait_timeout=github_wait_timeout,
+            )
+        except KeyboardInterrupt:
+            logger.info("🛑 Server interrupted")
+
+
+@batch_app.command("submit")
+def batch_submit(
+    feedstock_list: FeedstockListArgument,
+    github_username: Annotated[
         Optional[str],
+        typer.Argument(help="👤 The GitHub username owning the forks. Defaults to the server user."),
+    ] = None,
+    spool_dir: SpoolDirOption = None,
+    wait: Annotated[
+        bool, typer.Option(help="⏳ Wait for the jobs to be done and print their results.")
+    ] = False,
+    timeout: Annotated[
+        float,
+        typer.Option(
+            min=0,
+            help="⏳ With `--wait`, stop waiting after this many minutes and report the jobs that are not done.",
+        ),
+    ] = 360.0,
+    use_pixi: UsePixiOption = True,
+    git_rev: GitRevOption = None,
+    branch_name: BranchNameOption = "convert_feedstock_to_v1_recipe_format",
+    rerender: RerenderOption = True,
+    draft_pr: DraftPrOption = True,
+    resume: ResumeOption = False,
+    on_existing: OnExistingOption = ExistingPolicy.skip,
+    clone_depth: CloneDepthOption = None,
+    clone_filter: CloneFilterOption = None,
+    clone_single_branch: CloneSingleBranchOption = False,
+    cache_dir: CacheDirOption = None,
+    log_level: LogLevelOption = "INFO",
+):
+    """📬 Queue feedstock conversions for a running `feedrattler-batch serve`."""
+
+    from .batch import read_feedstock_list
+    from .server import Spool
+
+    _setup_logging(log_level)
+    spool = Spool(spool_dir if spool_dir is not None else _spool_dir(cache_dir))
+
+    job_ids = [
+        spool.submit(
+            feedstock_name,
+            github_username=github_username,
+            use_pixi=use_pixi,
+            git_rev=git_rev,
+            branch_name=branch_name,
+            do_rerender=rerender,
+            draft_pr=draft_pr,
+            resume=resume,
+            on_existing=on_existing,
+            clone_depth=clone_depth,
+            clone_filter=clone_filter,
+            clone_single_branch=clone_single_branch,
+        )
+        for feedstock_name in read_feedstock_list(feedstock_list)
+    ]
+    logger.info(f"📬 Submitted {len(job_ids)} jobs to {spool.spool_dir}")
+
+    if not wait:
+        return
+
+    results = {}
+    deadline = time.monotonic() + timeout * 60
+    while len(results) < len(job_ids):
+        if time.monotonic() > deadline:
+            pending = [job_id for job_id in job_ids if job_id not in results]
+            logger.error(
+                f"⏳ Timed out after {timeout:.0f} minutes, {len(pending)} jobs are not done: {', '.join(pending)}"
+            )
+            if results:
+                _print_results(list(results.values()), exit_on_failure=False)
+            raise typer.Exit(code=1)
+        time.sleep(1)
+        for job_id in job_ids:
+            if job_id not in results and (result := spool.result(job_id)) is not None:
+                results[job_id] = result
+                logger.info(
+                    f"🏁 {len(results)}/{len(job_ids)} jobs done ({result.feedstock_name}: {result.status.value})"
+                )
+
+    _print_results([results[job_id] for job_id in job_ids])
+
+
+@batch_app.command("results")
+def batch_results(
+    status: Annotated[
+        Optional[list[BatchStatus]],
+        typer.Option(help="🔍 Only report the feedstocks with these statuses. Can be repeated."),
+    ] = None,
+    failed_stage: Annotated[
+        Optional[list[str]],
         typer.Option(
-            envvar="GITHUB_TOKEN",
-            help="🔑 GitHub token. Defaults to the GITHUB_TOKEN environment variable or gh cli.",
+            help="🔍 Only report the feedstocks that failed in these stages, e.g. `rerender`. Can be repeated."
         ),
     ] = None,
-    dotenv: Annotated[
-        Optional[str], typer.Option(help="📄 Path to a .env file containing environment variables.")
+    run_id: Annotated[
+        Optional[str],
+        typer.Option(help="🏷️ Only report the results of this run. Use `last` for the last run."),
     ] = None,
-    clone_type: Annotated[
-        CloneType, typer.Option(help="🐑 The type of clone to use (ssh or https).")
-    ] = CloneType.auto,
-    version: Annotated[
+    history: Annotated[
         bool,
-        typer.Option("--version", callback=version_callback, help="Show the version of the application."),
+        typer.Option(help="📜 Report every stored result instead of the last result of each feedstock."),
     ] = False,
+    output: Annotated[
+        Optional[str],
+        typer.Option(
+            help="💾 Write the names of the reported feedstocks to this file, one per line, e.g. to convert them again."
+        ),
+    ] = None,
+    result_store: Annotated[
+        Optional[str],
+        typer.Option(help="🗃️ The result store to read. Defaults to `results.jsonl` in the cache dir."),
+    ] = None,
+    cache_dir: CacheDirOption = None,
+    log_level: LogLevelOption = "INFO",
 ):
-    load_dotenv(dotenv)
-    github_token = os.getenv("GITHUB_TOKEN", github_token)
-    if not github_token:
-        github_token = token_from_gh_cli(github_username)
+    """🗃️ Query the stored results of the previous conversions."""
 
-    FORMAT = "%(message)s"
-    logging.basicConfig(
-        level=log_level,
-        format=FORMAT,
-        datefmt="[%X]",
-        handlers=[RichHandler()],
-    )
+    _setup_logging(log_level)
+    store = _setup_result_store(result_store, cache_dir)
 
-    gh = Github(login_or_token=github_token)
-    # If we have a token, check if it's valid and corresponds to the username
-    if github_token:
-        github_username_api = gh.get_user().login
-        if github_username is None:
-            github_username = github_username_api
-        if github_username != github_username_api:
-            raise ValueError(f"GitHub username mismatch: {github_username} != {github_username_api}")
+    results = store.results() if history or run_id is not None else store.latest()
+    if run_id == "last":
+        run_id = results[-1].run_id if results else None
+    if run_id is not None:
+        results = [result for result in results if result.run_id == run_id]
+    if status:
+        results = [result for result in results if result.status in status]
+    if failed_stage:
+        results = [result for result in results if result.failed_stage in failed_stage]
 
-    # If we still don't have a username, try to detect it from SSH
-    if github_username is None:
-        github_username = detect_username_ssh()
+    _print_results(results, title=f"Conversion results in {store.path}", exit_on_failure=False)
 
-    # Automatic detection failed so give up
-    if github_username is None:
-        raise ValueError("GitHub username couldn't be auto detected")
+    # The failure classes, to prioritize what to fix or retry
+    counts = Counter((result.status, result.failed_stage) for result in results)
+    for (result_status, stage), count in counts.most_common():
+        logger.info(f"📊 {result_status.value}" + (f" in {stage}" if stage else "") + f": {count} feedstocks")
 
-    # If a clone type wasn't specified, try to auto-detect it
-    if clone_type == CloneType.auto:
-        clone_type = auto_detect_clone_type(github_username)
+    if output is not None:
+        names = list(dict.fromkeys(result.feedstock_name for result in results))
+        pathlib.Path(output).write_text("".join(f"{name}\n" for name in names))
+        logger.info(f"💾 Wrote {len(names)} feedstock names to {output}")
+
+
+cache_app = typer.Typer(no_args_is_help=True)
+batch_app.add_typer(cache_app, name="cache", help="🗄️ Show or prune the local mirror and conversion caches.")
+
+
+@cache_app.command("show")
+def cache_show(
+    cache_dir: CacheDirOption = None,
+):
+    """🗄️ Show the mirrors in the local cache, least recently used first."""
+
+    cache = _setup_mirror_cache(True, 0, cache_dir)
+    entries = cache.entries()
+
+    table = Table(title=f"Mirror cache at {cache.cache_dir}")
+    table.add_column("Feedstock")
+    table.add_column("Size (MiB)", justify="right")
+    table.add_column("Last used")
+    for entry in entries:
+        table.add_row(
+            entry.feedstock_name,
+            f"{entry.size / 2**20:.1f}",
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry.last_used)),
+        )
+    table.add_section()
+    table.add_row(f"{len(entries)} mirrors", f"{sum(entry.size for entry in entries) / 2**20:.1f}", "")
+    Console().print(table)
 
-    convert_feedstock_to_v1(
-        gh=gh,
-        feedstock_name=feedstock_name,
-        github_username=github_username,
-        use_pixi=use_pixi,
-        local_clone_dir=local_clone_dir,
-        local_clone_dir_force_erase=local_clone_dir_force_erase,
-        git_rev=git_rev,
-        branch_name=branch_name,
-        enable_rerender_logs=enable_rerender_logs,
-        do_rerender=rerender,
-        clone_type=clone_type,
-        draft_pr=draft_pr,
+    conversion_cache = _setup_conversion_cache(True, cache_dir)
+    Console().print(
+        f"Conversion cache at {conversion_cache.cache_dir}: {conversion_cache.size() / 2**20:.1f} MiB"
     )
+    rerender_cache = _setup_rerender_cache(True, cache_dir)
+    Console().print(f"Rerender cache at {rerender_cache.cache_dir}: {rerender_cache.size() / 2**20:.1f} MiB")
+
+
+@cache_app.command("prune")
+def cache_prune(
+    max_size: Annotated[
+        float,
+        typer.Option(
+            min=0, help="🗄️ Evict the least recently used mirrors until the cache is below this size in GiB."
+        ),
+    ] = 0.0,
+    conversions: Annotated[bool, typer.Option(help="⚡ Also clear the conversion cache.")] = False,
+    rerenders: Annotated[bool, typer.Option(help="⚡ Also clear the re-render cache.")] = False,
+    min_age: Annotated[
+        float,
+        typer.Option(
+            min=0,
+            help="⏳ Never evict mirrors used less than this many minutes ago, the working clones of a running conversion may still borrow their objects.",
+        ),
+    ] = 60.0,
+    cache_dir: CacheDirOption = None,
+    log_level: LogLevelOption = "INFO",
+):
+    """🗑️ Evict mirrors from the local cache. Everything not used recently is evicted by default."""
+
+    _setup_logging(log_level)
+    cache = _setup_mirror_cache(True, max_size, cache_dir, min_age=min_age * 60)
+    evicted = cache.prune(cache.max_size)
+    logger.info(f"🗑️ Evicted {len(evicted)} mirrors ({sum(entry.size for entry in evicted) / 2**20:.1f} MiB)")
+
+    if conversions:
+        _setup_conversion_cache(True, cache_dir).clear()
+    if rerenders:
+        _setup_rerender_cache(True, cache_dir).clear()
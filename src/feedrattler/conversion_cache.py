@@ -0,0 +1,143 @@
+import hashlib
+import importlib.metadata
+import json
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+from typing import Optional
+
+from . import __version__
+from .utils import default_cache_dir, directory_size
+
+logger = logging.getLogger(__name__)
+
+
+def _package_version(name: str) -> str:
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+@dataclass
+class ConversionOutput:
+    """
+    The changes made to a feedstock by the conversion steps, relative to the feedstock root.
+
+    Args:
+        recipe_yaml: The content of `recipe/recipe.yaml`.
+        conda_forge_yml: The content of `conda-forge.yml`.
+        warnings: The conversion warnings, if any.
+        renames: The `(source, destination)` file renames.
+        removed: The removed files.
+    """
+
+    recipe_yaml: str
+    conda_forge_yml: str
+    warnings: Optional[str] = None
+    renames: list[tuple[str, str]] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    def apply(self, repo_dir: os.PathLike):
+        """Apply the changes to a fresh clone of the feedstock."""
+
+        repo_dir = pathlib.Path(repo_dir)
+        for path in self.removed:
+            (repo_dir / path).unlink()
+        for source, destination in self.renames:
+            (repo_dir / source).rename(repo_dir / destination)
+        (repo_dir / "recipe" / "recipe.yaml").write_text(self.recipe_yaml)
+        (repo_dir / "conda-forge.yml").write_text(self.conda_forge_yml)
+
+    def paths(self) -> list[str]:
+        """All the paths changed by the conversion, including the removed and renamed ones."""
+
+        renamed = [path for rename in self.renames for path in rename]
+        return [*self.removed, *renamed, "recipe/recipe.yaml", "conda-forge.yml"]
+
+
+class ConversionCache:
+    """
+    An on-disk cache of conversion results keyed by the hash of everything they depend on.
+
+    The conversion and the recipe fixes are deterministic given the files of the `recipe/`
+    directory, `conda-forge.yml`, `use_pixi` and the feedrattler and conda-recipe-manager versions,
+    so converting an unchanged feedstock again, e.g. when retrying after a failed push, reuses
+    the cached result.
+
+    Args:
+        cache_dir: The directory holding the results. Defaults to `conversions` in the feedrattler cache dir.
+    """
+
+    def __init__(self, cache_dir: Optional[os.PathLike] = None):
+        self.cache_dir = (
+            pathlib.Path(cache_dir) if cache_dir is not None else default_cache_dir() / "conversions"
+        )
+
+    @staticmethod
+    def key(repo_dir: os.PathLike, use_pixi: bool) -> str:
+        """The cache key of the conversion of a feedstock clone, before it is converted."""
+
+        repo_dir = pathlib.Path(repo_dir)
+        digest = hashlib.sha256()
+
+        def update(name: str, content: bytes):
+            digest.update(f"{name}\0{len(content)}\0".encode())
+            digest.update(content)
+
+        update("feedrattler", __version__.encode())
+        update("conda-recipe-manager", _package_version("conda-recipe-manager").encode())
+        update("use_pixi", str(use_pixi).encode())
+        update("conda-forge.yml", (repo_dir / "conda-forge.yml").read_bytes())
+        for path in sorted((repo_dir / "recipe").rglob("*")):
+            if path.is_file():
+                update(path.relative_to(repo_dir).as_posix(), path.read_bytes())
+
+        return digest.hexdigest()
+
+    def path(self, key: str) -> pathlib.Path:
+        return self.cache_dir / key[:2] / key
+
+    def get(self, key: str) -> Optional[ConversionOutput]:
+        path = self.path(key)
+        if not path.exists():
+            return None
+
+        metadata = json.loads((path / "conversion.json").read_text())
+        return ConversionOutput(
+            recipe_yaml=(path / "recipe.yaml").read_text(),
+            conda_forge_yml=(path / "conda-forge.yml").read_text(),
+            warnings=metadata["warnings"],
+            renames=[tuple(rename) for rename in metadata["renames"]],
+            removed=metadata["removed"],
+        )
+
+    def put(self, key: str, output: ConversionOutput):
+        path = self.path(key)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary dir first so a concurrent `get` never sees a partial entry
+        tmp_path = pathlib.Path(tempfile.mkdtemp(dir=path.parent))
+        (tmp_path / "recipe.yaml").write_text(output.recipe_yaml)
+        (tmp_path / "conda-forge.yml").write_text(output.conda_forge_yml)
+        (tmp_path / "conversion.json").write_text(
+            json.dumps({"warnings": output.warnings, "renames": output.renames, "removed": output.removed})
+        )
+        try:
+            tmp_path.rename(path)
+        except OSError:
+            # Stored concurrently by another conversion
+            shutil.rmtree(tmp_path)
+
+    def size(self) -> int:
+        return directory_size(self.cache_dir) if self.cache_dir.exists() else 0
+
+    def clear(self):
+        if self.cache_dir.exists():
+            logger.info(f"🗑️ Clearing the conversion cache {self.cache_dir}")
+            shutil.rmtree(self.cache_dir)
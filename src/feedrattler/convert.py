@@ -1,121 +1,191 @@
-import contextlib
 import logging
 import os
 import pathlib
+import re
 import shutil
-import tempfile
-import time
-from typing import Optional
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from typing import Optional, Union
 
-from conda_recipe_manager.commands.convert import convert_file
-from conda_recipe_manager.commands.utils.types import ExitCode
-from conda_smithy import configure_feedstock
 from git import Repo
-from github import Github, UnknownObjectException
+from github import Github, GithubException, UnknownObjectException
+from github.Branch import Branch
+from github.MergedUpstream import MergedUpstream
+from github.PullRequest import PullRequest
+from github.Repository import Repository
 
 from . import __version__
+from .checkpoint import Checkpoint, Step
+from .conversion_cache import ConversionCache, ConversionOutput
+from .git_utils import (
+    MirrorCache,
+    clone_feedstock,
+    commit_paths,
+    push_branch,
+    repo_size,
+    unpushed_size,
+)
+from .github_client import GitHubClient, lazy_repo
+from .metrics import RunMetrics, StageMetrics
+from .recipe import find_unsupported_jinja, postprocess_recipe_text
+from .rerender import RerenderPool
+from .rerender_cache import RerenderCache, pinning_from_message
 from .utils import (
     CloneType,
+    ExistingPolicy,
+    default_cache_dir,
     initialize_yaml,
-    remove_empty_script_test,
     rename_bld_bat_to_build_bat,
-    update_python_min_in_recipe,
-    update_python_version_in_tests,
+    wait_until,
 )
+from .workspace import WorkspaceManager
 
 logger = logging.getLogger(__name__)
 
 
-def convert_feedstock_to_v1(
-    gh: Github,
-    feedstock_name: str,
-    github_username: str,
-    use_pixi: bool = False,
-    local_clone_dir: Optional[str] = None,
-    local_clone_dir_force_erase: bool = False,
-    git_rev: Optional[str] = None,
-    branch_name: str = "convert_feedstock_to_v1_recipe_format",
-    enable_rerender_logs: bool = False,
-    do_rerender: bool = True,
-    clone_type: CloneType = CloneType.https,
-    draft_pr: bool = True,
-):
-    # Step 0: Initialize
+class FeedstockSkipped(Exception):
+    """Raised when a feedstock does not need to be converted, e.g. when a conversion PR is already open."""
 
-    logging.info(
-        f"🚀 Start converting conda-forge/{feedstock_name} to v1 recipe using GH user '{github_username}'"
-    )
-    logging.info(f"📦 feedstock_name={feedstock_name}")
-    logging.info(f"👤 github_username={github_username}")
-    logging.info(f"🔧 use_pixi={use_pixi}")
 
-    org = gh.get_organization("conda-forge")
-    gh_repo = org.get_repo(feedstock_name)
+@dataclass
+class ConversionReport:
+    """
+    What a feedstock conversion did, filled in as it runs so it is also available when it fails.
 
-    # Step 1: Check if feedstock is already a v1 feedstock
+    Args:
+        pr_url: The URL of the created or updated pull request.
+        manual_pr_url: The URL to create the pull request manually at, when creating it failed.
+        warnings: The conversion warnings, if any.
+        stage_durations: The wall time in seconds of every completed stage and of the `total`.
+        failed_stage: The stage the conversion failed in.
+    """
 
-    logging.info(f"🔍 Checking if {feedstock_name} is already a v1 feedstock with `recipe/recipe.yaml`")
-    try:
-        if git_rev is not None:
-            gh_repo.get_contents("recipe/recipe.yaml", ref=git_rev)
-        else:
-            gh_repo.get_contents("recipe/recipe.yaml")
-        is_v1_feedstock = True
-    except UnknownObjectException:
-        is_v1_feedstock = False
+    pr_url: Optional[str] = None
+    manual_pr_url: Optional[str] = None
+    warnings: Optional[str] = None
+    stage_durations: dict[str, float] = field(default_factory=dict)
+    failed_stage: Optional[str] = None
 
-    if is_v1_feedstock:
-        raise Exception(f"❗ {feedstock_name} is already a v1 feedstock since `recipe/recipe.yaml` exists.")
+    def add_stage(self, record: StageMetrics):
+        """A metrics hook recording the durations and the failed stage."""
 
-    logging.info(f"✅ {feedstock_name} is not a v1 feedstock.")
+        self.stage_durations[record.stage] = record.wall_time
+        # A skipped feedstock did not fail in the stage it was skipped in
+        if record.error is not None and not record.skipped and record.stage != "total":
+            self.failed_stage = record.stage
 
-    # Step 2: Clone the repository
 
-    if local_clone_dir is None:
-        repo_dir_temp_parent = pathlib.Path(tempfile.mkdtemp())
-    else:
-        repo_dir_temp_parent = pathlib.Path(local_clone_dir)
+@dataclass
+class RecipeConversion:
+    recipe_yaml: Optional[str]
+    warnings: list[str] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
 
-        if repo_dir_temp_parent.exists():
-            if local_clone_dir_force_erase:
-                # delete the directory if it already exists
-                logging.info(f"🗑️ Deleting existing directory {repo_dir_temp_parent}")
-                shutil.rmtree(repo_dir_temp_parent)
-            else:
-                raise Exception(f"❗ Directory {repo_dir_temp_parent} already exists")
+    @property
+    def success(self) -> bool:
+        return self.recipe_yaml is not None and not self.errors
+
+
+def convert_recipe_text(meta_yaml: str, fail_on_unsupported_jinja: bool = True) -> RecipeConversion:
+    """
+    Convert the text of a v0 recipe to a v1 recipe and apply all the feedrattler edits to it.
+
+    This is a pure function without any filesystem I/O, so it can run in worker processes
+    or on recipes fetched from the GitHub API. File-level edits such as the `bld.bat` rename
+    are not part of it.
+
+    Args:
+        meta_yaml: The content of the `meta.yaml` file.
+        fail_on_unsupported_jinja: Fail when the recipe contains Jinja statements other than `{% set %}`.
 
-    # conda-smithy requires the clone directory to be named after the feedstock
-    repo_dir_temp = repo_dir_temp_parent / feedstock_name
+    Returns:
+        The converted recipe, or `None` on failure, with the conversion warnings and errors.
+    """
 
-    logger.info(f"🔄 Cloning {gh_repo.clone_url} to {repo_dir_temp}")
-    git_repo = Repo.clone_from(gh_repo.clone_url, repo_dir_temp)
+    if fail_on_unsupported_jinja and (statements := find_unsupported_jinja(meta_yaml)):
+        return RecipeConversion(
+            recipe_yaml=None,
+            errors=[f"Unsupported Jinja statement: {{% {statement} %}}" for statement in statements],
+        )
 
-    # If git_rev is set then checkout the revision
-    if git_rev is not None:
-        logging.info(f"🔄 Checking out git revision {git_rev}")
-        git_repo.git.checkout(git_rev)
+    # conda-recipe-manager is slow to import, only import it when converting
+    from conda_recipe_manager.parser.recipe_parser_convert import RecipeParserConvert
+    from conda_recipe_manager.types import MessageCategory
 
-    # Create a new branch and checkout
-    new_branch = git_repo.create_head(branch_name)
-    new_branch.checkout()
+    try:
+        parser = RecipeParserConvert(RecipeParserConvert.pre_process_recipe_text(meta_yaml))
+        recipe_yaml, msg_tbl, _ = parser.render_to_v1_recipe_format()
+    except Exception as e:
+        return RecipeConversion(recipe_yaml=None, errors=[f"Failed to parse the recipe: {e}"])
 
-    # Step 3: Convert `meta.yaml` to `recipe.yaml`
+    conversion = RecipeConversion(
+        recipe_yaml=None,
+        warnings=msg_tbl.get_messages(MessageCategory.WARNING),
+        errors=msg_tbl.get_messages(MessageCategory.ERROR),
+    )
+    if not conversion.errors:
+        conversion.recipe_yaml = postprocess_recipe_text(recipe_yaml)
+    return conversion
+
+
+def _convert_feedstock_files(
+    repo_dir: pathlib.Path,
+    use_pixi: bool,
+    meta_yaml: Optional[str] = None,
+    conversion: Optional[RecipeConversion] = None,
+) -> ConversionOutput:
+    """
+    Convert the recipe and update `conda-forge.yml` of a feedstock clone in place.
+
+    Args:
+        repo_dir: The feedstock clone.
+        use_pixi: Whether to use pixi as conda install tool.
+        meta_yaml: The `meta.yaml` converted by the pre-check, if any.
+        conversion: The conversion of `meta_yaml` by the pre-check. It is reused instead of
+            converting the recipe again when the clone has the same `meta.yaml`.
+    """
+
+    # Step 3: Convert `meta.yaml` to `recipe.yaml`, the converted recipe is kept in memory
+    # and only written once all the edits are applied in step 5
+
+    meta_yaml_path = repo_dir / "recipe" / "meta.yaml"
+    recipe_yaml_path = repo_dir / "recipe" / "recipe.yaml"
+
+    warning_msg = None
+    if conversion is not None and conversion.success and meta_yaml_path.read_text() == meta_yaml:
+        logging.info("⚡ Reusing the conversion of the pre-check, `meta.yaml` is unchanged")
+        if conversion.warnings:
+            warning_msg = f"❗ Warning while converting {meta_yaml_path} to {recipe_yaml_path}"
+            warning_msg += "\n" + "\n".join(conversion.warnings)
+            logging.warning(warning_msg)
+        # Already post-processed by `convert_recipe_text`
+        recipe_yaml = conversion.recipe_yaml
+    else:
+        from conda_recipe_manager.commands.convert import convert_file
+        from conda_recipe_manager.commands.utils.types import ExitCode
+
+        logging.info("🔄 Converting `meta.yaml` to `recipe.yaml`")
+        result = convert_file(
+            meta_yaml_path,
+            output=None,
+            print_output=False,
+            debug=False,
+            fail_on_unsupported_jinja=True,
+        )
 
-    logging.info("🔄 Converting `meta.yaml` to `recipe.yaml`")
-    meta_yaml_path = repo_dir_temp / "recipe" / "meta.yaml"
-    recipe_yaml_path = repo_dir_temp / "recipe" / "recipe.yaml"
-    result = convert_file(meta_yaml_path, output=recipe_yaml_path, print_output=False, debug=False, fail_on_unsupported_jinja=True)
+        if result.code == ExitCode.RENDER_WARNINGS:
+            warning_msg = f"❗ Warning while converting {meta_yaml_path} to {recipe_yaml_path}"
+            # NOTE: not super clean to directly call `_tbl` but it's a quick way to get the error message
+            warning_msg += "\n" + str(result.msg_tbl._tbl)
+            logging.warning(warning_msg)
+        elif result.code != ExitCode.SUCCESS:
+            error_msg = f"❗ Failed to convert {meta_yaml_path} to {recipe_yaml_path}"
+            # NOTE: not super clean to directly call `_tbl` but it's a quick way to get the error message
+            error_msg += str(result.msg_tbl._tbl)
+            raise Exception(error_msg)
 
-    if result.code == ExitCode.RENDER_WARNINGS:
-        warning_msg = f"❗ Warning while converting {meta_yaml_path} to {recipe_yaml_path}"
-        # NOTE: not super clean to directly call `_tbl` but it's a quick way to get the error message
-        warning_msg += "\n" + str(result.msg_tbl._tbl)
-        logging.warning(warning_msg)
-    elif result.code != ExitCode.SUCCESS:
-        error_msg = f"❗ Failed to convert {meta_yaml_path} to {recipe_yaml_path}"
-        # NOTE: not super clean to directly call `_tbl` but it's a quick way to get the error message
-        error_msg += str(result.msg_tbl._tbl)
-        raise Exception(error_msg)
+        # Step 5 is applied to the converted recipe once `conda-forge.yml` is updated
+        recipe_yaml = None
 
     # Delete meta.yaml file
     os.remove(meta_yaml_path)
@@ -124,7 +194,7 @@ def convert_feedstock_to_v1(
 
     # Step 4: Edit `conda-forge.yml` to use `rattler-build` and `pixi`
 
-    conda_forge_config_path = repo_dir_temp / "conda-forge.yml"
+    conda_forge_config_path = repo_dir / "conda-forge.yml"
     logging.info(f"📄 Loading {conda_forge_config_path}")
 
     yaml = initialize_yaml()
@@ -145,119 +215,146 @@ def convert_feedstock_to_v1(
     with open(conda_forge_config_path, "w") as f:
         yaml.dump(conda_forge_config, f)
 
-    # Step 5: bump the build number
+    # Step 5: bump the build number, apply the recipe fixes and write `recipe.yaml`
 
-    logging.info(f"🔢 Bumping build number in {recipe_yaml_path}")
+    if recipe_yaml is None:
+        logging.info(f"🔢 Bumping build number in {recipe_yaml_path}")
+        recipe_yaml = postprocess_recipe_text(result.content)
 
-    yaml = initialize_yaml()
+    logging.info(f"💾 Writing updated {recipe_yaml_path}")
+    recipe_yaml_path.write_text(recipe_yaml)
+
+    # fix #4: if present rename bld.bat to build.bat
+    # NOTE: waiting for upstream discussion at https://github.com/conda-incubator/conda-recipe-manager/issues/314
+    renames = []
+    if rename_bld_bat_to_build_bat(recipe_yaml_path):
+        renames.append(("recipe/bld.bat", "recipe/build.bat"))
+
+    return ConversionOutput(
+        recipe_yaml=recipe_yaml,
+        conda_forge_yml=conda_forge_config_path.read_text(),
+        warnings=warning_msg,
+        renames=renames,
+        removed=["recipe/meta.yaml"],
+    )
 
-    with open(recipe_yaml_path, "r") as f:
-        recipe_yaml = yaml.load(f)
 
-    build_number_raw = recipe_yaml["build"]["number"]
+def _get_recipe_contents(gh: Github, feedstock_name: str, path: str, git_rev: Optional[str]):
+    gh_repo = lazy_repo(gh, f"conda-forge/{feedstock_name}")
     try:
-        build_number = int(build_number_raw) + 1
-    except ValueError:
-        raise Exception(f"❗ Failed to bump build number: {build_number_raw} is not an integer")
+        if git_rev is not None:
+            return gh_repo.get_contents(path, ref=git_rev)
+        else:
+            return gh_repo.get_contents(path)
+    except UnknownObjectException:
+        return None
 
-    recipe_yaml["build"]["number"] = build_number
 
-    logging.info(f"💾 Writing updated {recipe_yaml_path}")
-    with open(recipe_yaml_path, "w") as f:
-        yaml.dump(recipe_yaml, f)
+def _get_recipe_files(gh: Github, feedstock_name: str, git_rev: Optional[str]) -> Optional[list[str]]:
+    contents = _get_recipe_contents(gh, feedstock_name, "recipe", git_rev)
+    return [content.name for content in contents] if contents is not None else None
 
-    # fix #1: replace `python ${{ python_min }}` by `python ${{ python_min }}.*`
-    # NOTE: waiting for upstream fix at https://github.com/conda-incubator/conda-recipe-manager/issues/308
-    update_python_min_in_recipe(recipe_yaml_path)
 
-    # fix #2: if noarch=python then add python_min to tests[].python.python_version
-    # NOTE: waiting for upstream fix at https://github.com/conda-incubator/conda-recipe-manager/issues/309
-    update_python_version_in_tests(recipe_yaml_path)
+def _get_meta_yaml(gh: Github, feedstock_name: str, git_rev: Optional[str]) -> Optional[str]:
+    content = _get_recipe_contents(gh, feedstock_name, "recipe/meta.yaml", git_rev)
+    return content.decoded_content.decode() if content is not None else None
 
-    # fix #3: remove script test if tests[].script does not exist
-    # NOTE: waiting for upstream fix at https://github.com/hadim/feedrattler/issues/7
-    remove_empty_script_test(recipe_yaml_path)
 
-    # fix #4: if present rename bld.bat to build.bat
-    # NOTE: waiting for upstream discussion at https://github.com/conda-incubator/conda-recipe-manager/issues/314
-    rename_bld_bat_to_build_bat(recipe_yaml_path)
+def _precheck_recipe(
+    feedstock_name: str, recipe_files: list[str], meta_yaml: Optional[str]
+) -> RecipeConversion:
+    """
+    Reject a feedstock whose conversion is bound to fail, from its `recipe/` listing and `meta.yaml`
+    fetched with the GitHub API, before cloning it or creating its fork.
 
-    # Step 6: Commit changes
+    Returns:
+        The in-memory conversion of `meta_yaml`, reused by step 3 if the clone has the same `meta.yaml`.
+    """
 
-    logging.info("📝 Committing changes")
+    if meta_yaml is None:
+        raise Exception(f"❗ {feedstock_name} has no `recipe/meta.yaml` to convert")
 
-    commit_message = "Convert to v1 feedstock"
-    if use_pixi:
-        commit_message += " and use pixi as conda install tool"
-
-    git_repo = Repo(repo_dir_temp)
-
-    # Add and commit changes
-    git_repo.git.add(".")
-    git_repo.git.commit("-m", commit_message)
-
-    # Step 7: Rerender the feedstock
-
-    if do_rerender:
-        logging.info("🔄 Rerendering the feedstock")
-        with open(os.devnull, "w") as devnull:
-            with (
-                contextlib.redirect_stdout(None if enable_rerender_logs else devnull),
-                contextlib.redirect_stderr(None if enable_rerender_logs else devnull),
-            ):
-                configure_feedstock.main(
-                    forge_file_directory=repo_dir_temp,
-                    forge_yml=None,
-                    no_check_uptodate=True,  # NOTE: ok or not?
-                    commit=True,
-                    exclusive_config_file=None,
-                    check=False,
-                    temporary_directory=None,
-                )
+    if "bld.bat" in recipe_files and "build.bat" in recipe_files:
+        raise Exception(
+            "❗ both `bld.bat` and `build.bat` script already exists so it is not possible to rename `bld.bat` to `build.bat`"
+        )
+
+    # Dry run of step 3 in memory
+    conversion = convert_recipe_text(meta_yaml, fail_on_unsupported_jinja=True)
+    if not conversion.success:
+        raise Exception(f"❗ {feedstock_name} can not be converted:\n" + "\n".join(conversion.errors))
+    return conversion
 
-    # Step 8: Check if the user has a fork of the feedstock, if not create it
 
-    gh_user = gh.get_user(github_username)
+def _get_fork(gh: Github, github_username: str, feedstock_name: str) -> Optional[Repository]:
     try:
-        fork_repo = gh_user.get_repo(feedstock_name)
+        return gh.get_repo(f"{github_username}/{feedstock_name}")
     except UnknownObjectException:
-        logging.info(f"🔀 Creating fork for {github_username}/{feedstock_name}")
-        fork_repo = gh_repo.create_fork()
-        time.sleep(2)
-
-        # Wait for the fork to be created
-        # NOTE: might be overkill...
-        max_retries = 30
-        for attempt in range(max_retries):
-            try:
-                gh_user.get_repo(feedstock_name)
-                logging.info(f"✅ Fork created successfully on attempt {attempt + 1}")
-                break
-            except UnknownObjectException:
-                logging.info(f"⏳ Waiting for fork creation... attempt {attempt + 1}/{max_retries}")
-                time.sleep(2)
-        else:
-            raise Exception(
-                f"❗ Fork creation for {github_username}/{feedstock_name} failed after {max_retries} attempts"
-            )
+        return None
 
-    # Let's sleep 2 more seconds before pushing to the fork
-    time.sleep(2)
 
-    # Step 9: Push changes to the fork
-    if clone_type == CloneType.ssh:
-        fork_clone_url = fork_repo.ssh_url
-    elif clone_type == CloneType.https:
-        fork_clone_url = fork_repo.clone_url
-    else:
-        raise NotImplementedError(f"❗ {clone_type=} is not implemented")
+def _create_fork(gh: Github, feedstock_name: str) -> Repository:
+    return lazy_repo(gh, f"conda-forge/{feedstock_name}").create_fork()
+
+
+def _merge_upstream(gh: Github, github_username: str, feedstock_name: str, branch: str) -> MergedUpstream:
+    return lazy_repo(gh, f"{github_username}/{feedstock_name}").merge_upstream(branch)
+
+
+def _create_pull(gh: Github, feedstock_name: str, **kwargs) -> PullRequest:
+    return lazy_repo(gh, f"conda-forge/{feedstock_name}").create_pull(**kwargs)
+
+
+# A title mentioning v1, `recipe.yaml` or rattler-build, e.g. "Convert to v1 recipe" or "Move to rattler-build"
+V1_PULL_TITLE_PATTERN = re.compile(r"\bv1\b|recipe\.yaml|rattler", re.IGNORECASE)
+
 
-    git_repo.remotes.origin.set_url(fork_clone_url)
-    git_repo.remotes.origin.push(refspec=f"{branch_name}:{branch_name}")
-    logging.info(f"🚀 Pushed changes to {github_username}/{feedstock_name}:{branch_name}")
+def _is_v1_pull(pr: PullRequest, branch_name: str) -> bool:
+    """
+    Whether an open pull request converts the feedstock to a v1 recipe.
 
-    # Step 10: Create a PR to the conda-forge feedstock
+    Such pull requests may be opened by hand or by other tools, so this is a heuristic: the
+    pull request is from a branch named like the feedrattler branch, its title matches
+    `V1_PULL_TITLE_PATTERN`, or it adds `recipe/recipe.yaml`. The changed files are only
+    listed, with one more request, when the branch name and the title do not match.
+    """
 
+    if pr.head.ref == branch_name or V1_PULL_TITLE_PATTERN.search(pr.title):
+        return True
+    return any(file.filename == "recipe/recipe.yaml" and file.status == "added" for file in pr.get_files())
+
+
+def _get_open_pulls(
+    gh: Github, feedstock_name: str, head: str, branch_name: str
+) -> tuple[Optional[PullRequest], list[PullRequest]]:
+    """The open pull request from `head` if any, and the other open v1 pull requests, see `_is_v1_pull`."""
+
+    own_pull, other_pulls = None, []
+    for pr in lazy_repo(gh, f"conda-forge/{feedstock_name}").get_pulls(state="open"):
+        if pr.head.label == head:
+            own_pull = pr
+        elif _is_v1_pull(pr, branch_name):
+            other_pulls.append(pr)
+    return own_pull, other_pulls
+
+
+def _get_branch(gh: Github, github_username: str, feedstock_name: str, branch_name: str) -> Optional[Branch]:
+    try:
+        return lazy_repo(gh, f"{github_username}/{feedstock_name}").get_branch(branch_name)
+    except UnknownObjectException:
+        # The fork or the branch does not exist
+        return None
+
+
+def _close_pull(gh: Github, feedstock_name: str, number: int, comment: str):
+    # Fetch the PR again with the write client, the PR found by the pre-flight may come from a
+    # read-only rotated token
+    pr = lazy_repo(gh, f"conda-forge/{feedstock_name}").get_pull(number)
+    pr.create_issue_comment(comment)
+    pr.edit(state="closed")
+
+
+def _pull_request_text(feedstock_name: str) -> tuple[str, str]:
     pr_title = f"Convert {feedstock_name} to v1 feedstock"
     pr_body = f"""This PR converts {feedstock_name} to a v1 recipe and switch the conda build tool to rattler-build.
 It has been automatically generated with [feedrattler v{__version__}](https://github.com/hadim/feedrattler).
@@ -271,22 +368,425 @@ Changes:
 - [x] 🔄 Rerender the feedstock with conda-smithy
 - [ ] Ensured the license file is being packaged.
 """
+    return pr_title, pr_body
 
-    logging.info("Creating a pull request to the conda-forge feedstock")
-    try:
-        pr = gh_repo.create_pull(
-            title=pr_title,
-            body=pr_body,
-            head=f"{github_username}:{branch_name}",
-            base="main",
-            draft=draft_pr,
+
+def convert_feedstock_to_v1(
+    gh: Union[Github, GitHubClient],
+    feedstock_name: str,
+    github_username: str,
+    use_pixi: bool = False,
+    local_clone_dir: Optional[str] = None,
+    local_clone_dir_force_erase: bool = False,
+    git_rev: Optional[str] = None,
+    branch_name: str = "convert_feedstock_to_v1_recipe_format",
+    enable_rerender_logs: bool = False,
+    do_rerender: bool = True,
+    clone_type: CloneType = CloneType.https,
+    draft_pr: bool = True,
+    clone_depth: Optional[int] = None,
+    clone_filter: Optional[str] = None,
+    clone_single_branch: bool = False,
+    mirror_cache: Optional[MirrorCache] = None,
+    github_wait_timeout: float = 60.0,
+    rerender_pool: Optional[RerenderPool] = None,
+    rerender_timeout: Optional[float] = None,
+    rerender_log_dir: Optional[str] = None,
+    save_rerender_logs: bool = False,
+    conversion_cache: Optional[ConversionCache] = None,
+    rerender_cache: Optional[RerenderCache] = None,
+    metrics: Optional[RunMetrics] = None,
+    resume: bool = False,
+    on_existing: ExistingPolicy = ExistingPolicy.skip,
+    report: Optional[ConversionReport] = None,
+) -> ConversionReport:
+    metrics = metrics if metrics is not None else RunMetrics()
+    report = report if report is not None else ConversionReport()
+
+    with (
+        metrics.track(
+            feedstock_name, hooks=[report.add_stage], skip_exceptions=(FeedstockSkipped,)
+        ) as stages,
+        ExitStack() as stack,
+    ):
+        # Step 0: Initialize
+
+        logging.info(
+            f"🚀 Start converting conda-forge/{feedstock_name} to v1 recipe using GH user '{github_username}'"
         )
-        logging.info(f"Created pull request: {pr.html_url}")
-    except Exception as e:
-        logging.error(f"❗ Failed to create a pull request: {e}")
-        pr_url = (
-            f"https://github.com/conda-forge/{feedstock_name}/compare/main...{github_username}:{branch_name}"
+        logging.info(f"📦 feedstock_name={feedstock_name}")
+        logging.info(f"👤 github_username={github_username}")
+        logging.info(f"🔧 use_pixi={use_pixi}")
+
+        stages.start("check")
+        client = GitHubClient.wrap(gh)
+        if client is not gh:
+            stack.callback(client.close)
+
+        # Independent GitHub requests are issued concurrently. The fork lookup keeps running
+        # in the background while the feedstock is cloned, converted and rerendered.
+        gh_repo_future = client.submit("get_repo", Github.get_repo, f"conda-forge/{feedstock_name}")
+        recipe_files_future = client.submit("get_contents", _get_recipe_files, feedstock_name, git_rev)
+        meta_yaml_future = client.submit("get_contents", _get_meta_yaml, feedstock_name, git_rev)
+        fork_repo_future = client.submit("get_fork", _get_fork, github_username, feedstock_name)
+        head = f"{github_username}:{branch_name}"
+        open_pulls_future = client.submit("get_pulls", _get_open_pulls, feedstock_name, head, branch_name)
+        fork_branch_future = client.submit(
+            "get_branch", _get_branch, github_username, feedstock_name, branch_name
         )
-        logging.info(f"Create a PR manually at {pr_url} 🚀")
-        print(f"PR title: {pr_title} 🎉")
-        print(f"PR body:\n{pr_body} ✨")
+
+        # Step 1: Check if feedstock is already a v1 feedstock
+
+        logging.info(f"🔍 Checking if {feedstock_name} is already a v1 feedstock with `recipe/recipe.yaml`")
+        recipe_files = recipe_files_future.result()
+        if recipe_files is None:
+            raise Exception(f"❗ {feedstock_name} has no `recipe` directory")
+        if "recipe.yaml" in recipe_files:
+            raise FeedstockSkipped(
+                f"⏭️ {feedstock_name} is already a v1 feedstock since `recipe/recipe.yaml` exists."
+            )
+
+        gh_repo = gh_repo_future.result()
+
+        logging.info(f"✅ {feedstock_name} is not a v1 feedstock.")
+
+        # Pre-flight: look for the branch and the PRs published by a previous conversion before
+        # doing any work, instead of failing to push or to open the PR at the end
+        stages.start("preflight")
+
+        pr_title, pr_body = _pull_request_text(feedstock_name)
+        own_pull, other_pulls = open_pulls_future.result()
+        fork_branch = fork_branch_future.result()
+
+        # The branch and PR of an interrupted conversion are resumed, not skipped
+        resuming = resume and local_clone_dir is not None and Checkpoint.load(local_clone_dir) is not None
+
+        if on_existing == ExistingPolicy.skip and not resuming:
+            if own_pull is not None:
+                raise FeedstockSkipped(
+                    f"⏭️ {feedstock_name} already has an open pull request: {own_pull.html_url}"
+                )
+            elif other_pulls:
+                raise FeedstockSkipped(
+                    f"⏭️ {feedstock_name} already has an open v1 pull request by {other_pulls[0].user.login}: "
+                    f"{other_pulls[0].html_url}"
+                )
+            elif fork_branch is not None:
+                raise FeedstockSkipped(f"⏭️ The branch {head} of {feedstock_name} already exists")
+        for pr in other_pulls:
+            logging.warning(
+                f"⚠️ {feedstock_name} already has an open v1 pull request by {pr.user.login}: {pr.html_url}"
+            )
+        if fork_branch is not None:
+            logging.info(f"♻️ The existing branch {head} will be overwritten")
+
+        # Pre-check: convert the recipe fetched with the API in memory to reject the feedstocks
+        # that would fail to convert before cloning them
+        stages.start("precheck")
+
+        logging.info(f"🧪 Checking that the recipe of {feedstock_name} can be converted")
+        meta_yaml = meta_yaml_future.result()
+        precheck_conversion = _precheck_recipe(feedstock_name, recipe_files, meta_yaml)
+
+        # Step 2: Clone the repository
+        stages.start("clone")
+
+        # The options the steps depend on, a checkpoint recorded with other options is not resumed
+        checkpoint_options = {"use_pixi": use_pixi, "git_rev": git_rev, "branch_name": branch_name}
+        checkpoint = None
+
+        if local_clone_dir is None:
+            if resume:
+                logging.info("ℹ️ Nothing to resume without a local clone directory")
+            # Clone to a temporary workspace removed once the conversion is done
+            workspaces = stack.enter_context(WorkspaceManager())
+            repo_dir_temp_parent = stack.enter_context(workspaces.workspace(feedstock_name))
+        else:
+            repo_dir_temp_parent = pathlib.Path(local_clone_dir)
+
+            if resume:
+                checkpoint = Checkpoint.load(repo_dir_temp_parent)
+                if checkpoint is None:
+                    logging.info(f"ℹ️ No checkpoint to resume in {repo_dir_temp_parent}")
+                elif checkpoint.options != checkpoint_options:
+                    raise Exception(
+                        f"❗ The checkpoint in {repo_dir_temp_parent} was recorded with other options "
+                        f"({checkpoint.options}), erase the directory to start over"
+                    )
+                elif not (repo_dir_temp_parent / feedstock_name / ".git").exists():
+                    logging.info(f"ℹ️ The clone of the checkpoint in {repo_dir_temp_parent} is missing")
+                    checkpoint = None
+
+            if checkpoint is not None:
+                logging.info(
+                    f"⏩ Resuming the conversion of {feedstock_name} after the steps: {', '.join(checkpoint.steps)}"
+                )
+            elif repo_dir_temp_parent.exists():
+                if local_clone_dir_force_erase:
+                    # delete the directory if it already exists
+                    logging.info(f"🗑️ Deleting existing directory {repo_dir_temp_parent}")
+                    shutil.rmtree(repo_dir_temp_parent)
+                else:
+                    raise Exception(f"❗ Directory {repo_dir_temp_parent} already exists")
+
+        # conda-smithy requires the clone directory to be named after the feedstock
+        repo_dir_temp = repo_dir_temp_parent / feedstock_name
+
+        if checkpoint is not None and checkpoint.done(Step.pull_request):
+            report.pr_url = checkpoint.get(Step.pull_request)["url"]
+            logging.info(f"✅ The pull request of {feedstock_name} was already created: {report.pr_url}")
+            return report
+
+        if checkpoint is not None:
+            git_repo = Repo(repo_dir_temp)
+            # Discard the changes of the interrupted step
+            git_repo.git.checkout("--force", "-B", branch_name, checkpoint.last_sha())
+            git_repo.git.clean("-d", "--force", "-x")
+        elif mirror_cache is not None:
+            if clone_depth is not None or clone_filter is not None or clone_single_branch:
+                logging.info(
+                    "ℹ️ Ignoring shallow and partial clone options when cloning from the mirror cache"
+                )
+            git_repo = mirror_cache.clone(feedstock_name, gh_repo.clone_url, repo_dir_temp, git_rev=git_rev)
+        else:
+            logger.info(f"🔄 Cloning {gh_repo.clone_url} to {repo_dir_temp}")
+            git_repo = clone_feedstock(
+                gh_repo.clone_url,
+                repo_dir_temp,
+                git_rev=git_rev,
+                depth=clone_depth,
+                filter=clone_filter,
+                single_branch=clone_single_branch,
+            )
+
+        if checkpoint is None:
+            stages.set(bytes_cloned=repo_size(git_repo))
+
+            # Create a new branch and checkout
+            new_branch = git_repo.create_head(branch_name)
+            new_branch.checkout()
+
+            checkpoint = Checkpoint(repo_dir_temp_parent, checkpoint_options)
+            checkpoint.record(Step.clone, sha=git_repo.head.commit.hexsha)
+
+        if not checkpoint.done(Step.commit):
+            # Steps 3 to 5 are skipped when the conversion of the same inputs is cached
+            stages.start("convert")
+
+            conversion_key = None
+            cached_output = None
+            if conversion_cache is not None:
+                conversion_key = conversion_cache.key(repo_dir_temp, use_pixi)
+                cached_output = conversion_cache.get(conversion_key)
+
+            if cached_output is not None:
+                logging.info(f"⚡ Reusing the cached conversion {conversion_key[:12]} of {feedstock_name}")
+                if cached_output.warnings is not None:
+                    logging.warning(cached_output.warnings)
+                cached_output.apply(repo_dir_temp)
+                conversion_output = cached_output
+            else:
+                conversion_output = _convert_feedstock_files(
+                    repo_dir_temp, use_pixi, meta_yaml, precheck_conversion
+                )
+                if conversion_cache is not None:
+                    conversion_cache.put(conversion_key, conversion_output)
+            report.warnings = conversion_output.warnings
+
+            # Step 6: Commit changes
+            stages.start("commit")
+
+            logging.info("📝 Committing changes")
+
+            commit_message = "Convert to v1 feedstock"
+            if use_pixi:
+                commit_message += " and use pixi as conda install tool"
+
+            # Only commit the paths changed by the conversion, without scanning the whole working tree
+            commit_paths(git_repo, conversion_output.paths(), commit_message)
+            checkpoint.record(Step.commit, sha=git_repo.head.commit.hexsha)
+
+        # Step 7: Rerender the feedstock
+
+        if do_rerender and not checkpoint.done(Step.rerender):
+            stages.start("rerender")
+
+            # conda-smithy is skipped when its inputs did not change since a previous rerender
+            cached_changes = None
+            if rerender_cache is not None and (pinning_version := rerender_cache.pinning_version()):
+                cached_changes = rerender_cache.get(
+                    rerender_cache.key(git_repo, feedstock_name, pinning_version)
+                )
+
+            if cached_changes is not None:
+                logging.info(f"⚡ Reusing the cached rerender (conda-forge-pinning {pinning_version})")
+                cached_changes.apply(repo_dir_temp)
+                if cached_changes.message is not None:
+                    commit_paths(git_repo, cached_changes.paths(), cached_changes.message)
+            else:
+                base_sha = git_repo.head.commit.hexsha
+                logging.info("🔄 Rerendering the feedstock")
+                pool = rerender_pool if rerender_pool is not None else RerenderPool(max_workers=1)
+                try:
+                    rerender_result = pool.rerender(
+                        repo_dir_temp, timeout=rerender_timeout, stream_logs=enable_rerender_logs
+                    )
+                finally:
+                    if rerender_pool is None:
+                        pool.shutdown()
+
+                # The captured output is only written out when it is needed
+                log_path = None
+                if save_rerender_logs or not rerender_result.success:
+                    log_dir = (
+                        pathlib.Path(rerender_log_dir)
+                        if rerender_log_dir is not None
+                        else default_cache_dir() / "rerender-logs"
+                    )
+                    log_path = rerender_result.write_log(log_dir / f"{feedstock_name}.log")
+                    logging.info(f"📝 Wrote the rerender log to {log_path}")
+
+                if rerender_result.timed_out:
+                    raise Exception(
+                        f"❗ Rerendering {feedstock_name} timed out after {rerender_result.duration:.0f}s, "
+                        f"see {log_path}"
+                    )
+                elif rerender_result.cancelled:
+                    raise Exception(f"❗ Rerendering {feedstock_name} was cancelled")
+                elif not rerender_result.success:
+                    raise Exception(
+                        f"❗ Failed to rerender {feedstock_name} (exit code {rerender_result.returncode}), "
+                        f"see {log_path}:\n" + rerender_result.output_tail()
+                    )
+                logging.info(
+                    f"✅ Rerendered the feedstock in {rerender_result.duration:.1f}s"
+                    + (f" ({milestones})" if (milestones := rerender_result.milestones_summary()) else "")
+                )
+                # Store the output under the pinning it was made with, the one of the lookup can be
+                # newer than the pinning a warm worker resolved when it started
+                rerender_pinning = rerender_result.pinning_version
+                if rerender_pinning is None and git_repo.head.commit.hexsha != base_sha:
+                    rerender_pinning = pinning_from_message(git_repo.head.commit.message)
+                if rerender_cache is not None and rerender_pinning is not None:
+                    rerender_cache.put(
+                        rerender_cache.key(git_repo, feedstock_name, rerender_pinning, rev=base_sha),
+                        git_repo,
+                        base_sha,
+                    )
+
+            checkpoint.record(Step.rerender, sha=git_repo.head.commit.hexsha)
+
+        # Step 8: Check if the user has a fork of the feedstock, if not create it
+        stages.start("fork")
+
+        fork_repo = fork_repo_future.result()
+        fork_created = fork_repo is None
+        if fork_created:
+            logging.info(f"🔀 Creating fork for {github_username}/{feedstock_name}")
+            client.call("create_fork", _create_fork, feedstock_name, write=True)
+
+            # Forks are created asynchronously: wait until the fork and its git data are available
+            def fork_ready():
+                try:
+                    fork = client.call("get_fork", _get_fork, github_username, feedstock_name)
+                    if fork is not None:
+                        client.call("get_branch", lambda _: fork.get_branch(fork.default_branch))
+                except GithubException as e:
+                    # 404 or 409 while the fork git data is still being copied
+                    if e.status not in (404, 409):
+                        raise
+                    return None
+                return fork
+
+            fork_repo, fork_wait = wait_until(
+                fork_ready, f"fork {github_username}/{feedstock_name}", timeout=github_wait_timeout
+            )
+            logging.info(f"✅ Fork created successfully in {fork_wait:.1f}s")
+
+        # Step 9: Push changes to the fork
+        stages.start("push")
+        # A resumed conversion skips the push if the existing fork already has the branch
+        head_sha = git_repo.head.commit.hexsha
+        if not fork_created and checkpoint.done(Step.push) and checkpoint.get(Step.push)["sha"] == head_sha:
+            logging.info(
+                f"⏩ {head_sha[:12]} was already pushed to {github_username}/{feedstock_name}:{branch_name}"
+            )
+        else:
+            if clone_type == CloneType.ssh:
+                fork_clone_url = fork_repo.ssh_url
+            elif clone_type == CloneType.https:
+                fork_clone_url = fork_repo.clone_url
+            else:
+                raise NotImplementedError(f"❗ {clone_type=} is not implemented")
+
+            if not fork_created:
+                # Sync a stale fork with upstream server-side so the push only sends the new objects
+                try:
+                    merged = client.call(
+                        "merge_upstream",
+                        _merge_upstream,
+                        github_username,
+                        feedstock_name,
+                        fork_repo.default_branch,
+                        write=True,
+                    )
+                    if merged.merge_type != "none":
+                        logging.info(
+                            f"🔄 Synced {github_username}/{feedstock_name}:{fork_repo.default_branch} "
+                            f"with conda-forge ({merged.merge_type})"
+                        )
+                except GithubException as e:
+                    # 409 when the fork branch has diverged from upstream
+                    logging.warning(f"⚠️ Failed to sync the fork {github_username}/{feedstock_name}: {e}")
+
+            stages.set(bytes_pushed=unpushed_size(git_repo, branch_name))
+            push_branch(git_repo, fork_clone_url, branch_name, force=fork_branch is not None)
+            logging.info(f"🚀 Pushed changes to {github_username}/{feedstock_name}:{branch_name}")
+            checkpoint.record(Step.push, sha=git_repo.head.commit.hexsha)
+
+        # Step 10: Create a PR to the conda-forge feedstock
+        stages.start("pull_request")
+
+        if own_pull is not None and on_existing != ExistingPolicy.force:
+            # The push updated the open PR
+            logging.info(f"🔄 Updated the pull request: {own_pull.html_url}")
+            checkpoint.record(Step.pull_request, url=own_pull.html_url)
+            report.pr_url = own_pull.html_url
+            return report
+
+        if own_pull is not None:
+            logging.info(f"🗑️ Closing the previous pull request {own_pull.html_url}")
+            client.call(
+                "close_pull",
+                _close_pull,
+                feedstock_name,
+                own_pull.number,
+                "Superseded by a new conversion, a new pull request will be opened.",
+                write=True,
+            )
+
+        logging.info("Creating a pull request to the conda-forge feedstock")
+        try:
+            pr = client.call(
+                "create_pull",
+                _create_pull,
+                feedstock_name,
+                write=True,
+                title=pr_title,
+                body=pr_body,
+                head=f"{github_username}:{branch_name}",
+                base="main",
+                draft=draft_pr,
+            )
+            logging.info(f"Created pull request: {pr.html_url}")
+            checkpoint.record(Step.pull_request, url=pr.html_url)
+            report.pr_url = pr.html_url
+        except Exception as e:
+            logging.error(f"❗ Failed to create a pull request: {e}")
+            pr_url = f"https://github.com/conda-forge/{feedstock_name}/compare/main...{github_username}:{branch_name}"
+            logging.info(f"Create a PR manually at {pr_url} 🚀")
+            report.manual_pr_url = pr_url
+            print(f"PR title: {pr_title} 🎉")
+            print(f"PR body:\n{pr_body} ✨")
+
+    return report
@@ -0,0 +1,93 @@
+import logging
+from enum import Enum
+from typing import TYPE_CHECKING, Iterable, Optional
+
+if TYPE_CHECKING:
+    # PyGithub is slow to import and only used for type hints here, see `feedrattler.cli`
+    from github import Github
+
+logger = logging.getLogger(__name__)
+
+
+class FeedstockFormat(str, Enum):
+    v0 = "v0"
+    v1 = "v1"
+    missing = "missing"
+
+
+def _detection_query(n_feedstocks: int) -> str:
+    variables = ", ".join(f"$name{i}: String!" for i in range(n_feedstocks))
+    repositories = "\n".join(
+        f"""  r{i}: repository(owner: $owner, name: $name{i}) {{
+    v1: object(expression: $v1Path) {{ __typename }}
+    v0: object(expression: $v0Path) {{ __typename }}
+  }}"""
+        for i in range(n_feedstocks)
+    )
+    return f"query($owner: String!, $v1Path: String!, $v0Path: String!, {variables}) {{\n{repositories}\n}}"
+
+
+def detect_feedstock_formats(
+    gh: "Github",
+    feedstock_names: Iterable[str],
+    owner: str = "conda-forge",
+    git_rev: Optional[str] = None,
+    batch_size: int = 100,
+) -> dict[str, FeedstockFormat]:
+    """
+    Detect whether feedstocks use a v0 (`recipe/meta.yaml`) or v1 (`recipe/recipe.yaml`) recipe.
+
+    Feedstocks are checked by batches of `batch_size` with a single GraphQL query per batch
+    (one aliased `repository` field per feedstock) instead of several REST calls per feedstock.
+
+    Args:
+        gh: The GitHub client. GraphQL requires an authenticated client.
+        feedstock_names: The names of the feedstock repositories.
+        owner: The owner of the feedstock repositories.
+        git_rev: The git revision to inspect. The default branch HEAD is used when not set.
+        batch_size: The number of feedstocks checked per request.
+
+    Returns:
+        The format of each feedstock, `missing` when the repository or its recipe does not exist.
+    """
+
+    feedstock_names = list(feedstock_names)
+    rev = git_rev if git_rev is not None else "HEAD"
+    formats = {}
+
+    for start in range(0, len(feedstock_names), batch_size):
+        batch = feedstock_names[start : start + batch_size]
+        logger.info(
+            f"🔍 Detecting the recipe format of {len(batch)} feedstocks ({start + len(batch)}/{len(feedstock_names)})"
+        )
+
+        variables = {
+            "owner": owner,
+            "v1Path": f"{rev}:recipe/recipe.yaml",
+            "v0Path": f"{rev}:recipe/meta.yaml",
+        }
+        variables.update({f"name{i}": name for i, name in enumerate(batch)})
+        _, response = gh.requester.requestJsonAndCheck(
+            "POST",
+            gh.requester.graphql_url,
+            input={"query": _detection_query(len(batch)), "variables": variables},
+        )
+
+        # Missing repositories are reported as NOT_FOUND errors next to the data of the other ones
+        errors = [error for error in response.get("errors", []) if error.get("type") != "NOT_FOUND"]
+        if errors:
+            raise Exception(f"❗ Failed to detect the recipe format of feedstocks: {errors}")
+
+        data = response.get("data") or {}
+        for i, name in enumerate(batch):
+            repository = data.get(f"r{i}")
+            if repository is None:
+                formats[name] = FeedstockFormat.missing
+            elif repository["v1"] is not None:
+                formats[name] = FeedstockFormat.v1
+            elif repository["v0"] is not None:
+                formats[name] = FeedstockFormat.v0
+            else:
+                formats[name] = FeedstockFormat.missing
+
+    return formats
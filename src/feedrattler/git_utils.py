@@ -0,0 +1,314 @@
+import logging
+import os
+import pathlib
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from git import GitCommandError, Repo
+
+from .utils import default_cache_dir, directory_size
+
+logger = logging.getLogger(__name__)
+
+
+def clone_feedstock(
+    clone_url: str,
+    repo_dir: os.PathLike,
+    git_rev: Optional[str] = None,
+    depth: Optional[int] = None,
+    filter: Optional[str] = None,
+    single_branch: bool = False,
+) -> Repo:
+    """
+    Clone a feedstock repository, optionally as a shallow and/or partial clone.
+
+    When `git_rev` is set together with `depth` or `single_branch`, only that revision
+    is fetched so it does not need to be part of the default branch shallow history.
+
+    Args:
+        clone_url: The URL of the repository to clone.
+        repo_dir: The directory to clone into.
+        git_rev: The git revision to checkout. The default branch HEAD is used when not set.
+        depth: Truncate the history to the given number of commits.
+        filter: A partial clone filter such as `blob:none` or `tree:0`.
+        single_branch: Only fetch the history of a single branch.
+    """
+
+    clone_options = {}
+    if depth is not None:
+        clone_options["depth"] = depth
+    if filter is not None:
+        clone_options["filter"] = filter
+
+    if git_rev is not None and (depth is not None or single_branch):
+        logger.info(f"🔄 Fetching git revision {git_rev} from {clone_url} to {repo_dir}")
+        git_repo = Repo.init(repo_dir)
+        git_repo.create_remote("origin", clone_url)
+        if filter is not None:
+            # Register origin as the promisor remote so missing objects are fetched lazily
+            git_repo.git.config("remote.origin.promisor", "true")
+            git_repo.git.config("remote.origin.partialclonefilter", filter)
+        git_repo.git.fetch("origin", git_rev, **clone_options)
+        git_repo.git.checkout("FETCH_HEAD")
+        return git_repo
+
+    if single_branch:
+        clone_options["single_branch"] = True
+
+    git_repo = Repo.clone_from(clone_url, repo_dir, **clone_options)
+
+    # If git_rev is set then checkout the revision
+    if git_rev is not None:
+        logging.info(f"🔄 Checking out git revision {git_rev}")
+        git_repo.git.checkout(git_rev)
+
+    return git_repo
+
+
+def is_shallow(git_repo: Repo) -> bool:
+    return (pathlib.Path(git_repo.git_dir) / "shallow").exists()
+
+
+def repo_size(git_repo: Repo) -> int:
+    """The size in bytes of the objects stored in a repository, excluding borrowed objects."""
+
+    stats = dict(line.split(": ", 1) for line in git_repo.git.count_objects("-v").splitlines())
+    return (int(stats["size"]) + int(stats["size-pack"])) * 1024
+
+
+def unpushed_size(git_repo: Repo, branch_name: str, base_remote: str = "origin") -> Optional[int]:
+    """
+    Estimate the size in bytes of the objects pushed with a branch: the objects of the
+    branch that are not in the `base_remote` branches, which the fork shares.
+
+    Returns:
+        The estimate, or `None` if git is too old to compute it.
+    """
+
+    try:
+        size = git_repo.git.rev_list(
+            "--objects", "--disk-usage", branch_name, "--not", f"--remotes={base_remote}"
+        )
+    except GitCommandError:
+        return None
+    return int(size)
+
+
+def commit_paths(git_repo: Repo, paths: Iterable[str], message: str) -> str:
+    """
+    Commit the changes of the given paths on top of HEAD with git plumbing.
+
+    Unlike `git add .` and `git commit`, which stat every file of the working tree to find
+    the changes, only the index entries of `paths` are updated, whether the files were added,
+    modified or removed, and the commit is built from the index with `write-tree` and
+    `commit-tree`.
+
+    Args:
+        git_repo: The local repository.
+        paths: The changed paths, relative to the repository root.
+        message: The commit message.
+
+    Returns:
+        The SHA of the new commit.
+    """
+
+    git_repo.git.update_index("--add", "--remove", "--", *paths)
+    tree = git_repo.git.write_tree()
+    parent = git_repo.head.commit.hexsha
+    sha = git_repo.git.commit_tree(tree, "-p", parent, "-m", message)
+    git_repo.git.update_ref("-m", f"commit: {message}", "HEAD", sha, parent)
+    return sha
+
+
+def push_branch(
+    git_repo: Repo, remote_url: str, branch_name: str, remote_name: str = "fork", force: bool = False
+):
+    """
+    Push a branch to a remote, typically the user fork of the feedstock.
+
+    A shallow clone can only be pushed if the remote already has the commits at the
+    shallow boundary. When that is not the case the full history is fetched from `origin`
+    and the push is retried.
+
+    Args:
+        git_repo: The local repository.
+        remote_url: The URL of the remote to push to.
+        branch_name: The name of the branch to push.
+        remote_name: The name of the git remote to create or update with `remote_url`.
+        force: Overwrite the branch on the remote, e.g. the branch of a previous conversion.
+    """
+
+    if remote_name in git_repo.remotes:
+        remote = git_repo.remotes[remote_name]
+        remote.set_url(remote_url)
+    else:
+        remote = git_repo.create_remote(remote_name, remote_url)
+
+    refspec = f"{'+' if force else ''}{branch_name}:{branch_name}"
+    try:
+        remote.push(refspec=refspec).raise_if_error()
+    except GitCommandError:
+        if not is_shallow(git_repo):
+            raise
+        logger.info("🔄 The remote is missing the shallow clone history, unshallowing before pushing again")
+        git_repo.remotes.origin.fetch(unshallow=True)
+        remote.push(refspec=refspec).raise_if_error()
+
+
+@dataclass
+class MirrorEntry:
+    feedstock_name: str
+    path: pathlib.Path
+    size: int
+    last_used: float
+
+
+class MirrorCache:
+    """
+    An on-disk cache of bare mirrors of feedstock repositories, keyed by feedstock name.
+
+    A cache hit only fetches the new objects from the remote, and working clones are
+    created from the mirror with `git clone --shared` so they borrow its objects
+    through git alternates instead of copying them.
+
+    Args:
+        cache_dir: The directory holding the mirrors. Defaults to `mirrors` in the feedrattler cache dir.
+        max_size: The maximum total size in bytes of the cache. The least recently used mirrors
+            are evicted when it is exceeded.
+        min_age: Mirrors used less than `min_age` seconds ago are never evicted since working
+            clones created from them might still be in use.
+    """
+
+    LAST_USED_FILE = "feedrattler-last-used"
+    # Only the branches and tags, not the `refs/pull/*` refs GitHub keeps for every pull request
+    REFSPECS = ("+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*")
+
+    def __init__(
+        self,
+        cache_dir: Optional[os.PathLike] = None,
+        max_size: Optional[int] = None,
+        min_age: float = 3600,
+    ):
+        self.cache_dir = pathlib.Path(cache_dir) if cache_dir is not None else default_cache_dir() / "mirrors"
+        self.max_size = max_size
+        self.min_age = min_age
+        self._lock = threading.Lock()
+        self._mirror_locks: dict[str, threading.Lock] = {}
+
+    def mirror_path(self, feedstock_name: str) -> pathlib.Path:
+        return self.cache_dir / f"{feedstock_name}.git"
+
+    def _mirror_lock(self, feedstock_name: str) -> threading.Lock:
+        with self._lock:
+            return self._mirror_locks.setdefault(feedstock_name, threading.Lock())
+
+    def update(self, feedstock_name: str, clone_url: str) -> pathlib.Path:
+        """Create the mirror of a feedstock or fetch its new objects if it is already cached."""
+
+        mirror_path = self.mirror_path(feedstock_name)
+
+        with self._mirror_lock(feedstock_name):
+            if mirror_path.exists():
+                # Mark the mirror as used first so it is not evicted while being fetched
+                (mirror_path / self.LAST_USED_FILE).touch()
+                logger.info(f"🔄 Fetching {clone_url} into the mirror {mirror_path}")
+                try:
+                    Repo(mirror_path).git.fetch("--prune", "origin", *self.REFSPECS)
+                except GitCommandError as e:
+                    logger.warning(f"⚠️ Failed to update the mirror {mirror_path}, recreating it: {e}")
+                    shutil.rmtree(mirror_path)
+
+            if not mirror_path.exists():
+                logger.info(f"🔄 Mirroring {clone_url} to {mirror_path}")
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                mirror = Repo.clone_from(clone_url, mirror_path, bare=True)
+                mirror.git.config("remote.origin.fetch", self.REFSPECS[0])
+                for refspec in self.REFSPECS[1:]:
+                    mirror.git.config("--add", "remote.origin.fetch", refspec)
+
+            (mirror_path / self.LAST_USED_FILE).touch()
+
+        if self.max_size is not None:
+            self.prune(self.max_size, keep={feedstock_name})
+
+        return mirror_path
+
+    def clone(
+        self,
+        feedstock_name: str,
+        clone_url: str,
+        repo_dir: os.PathLike,
+        git_rev: Optional[str] = None,
+    ) -> Repo:
+        """
+        Clone a feedstock from its up-to-date local mirror.
+
+        The clone `origin` remote points to `clone_url`, as if it was cloned from it.
+        """
+
+        mirror_path = self.update(feedstock_name, clone_url)
+
+        logger.info(f"🔄 Cloning the mirror {mirror_path} to {repo_dir}")
+        git_repo = Repo.clone_from(str(mirror_path), repo_dir, shared=True)
+        git_repo.remotes.origin.set_url(clone_url)
+
+        # If git_rev is set then checkout the revision
+        if git_rev is not None:
+            logging.info(f"🔄 Checking out git revision {git_rev}")
+            git_repo.git.checkout(git_rev)
+
+        return git_repo
+
+    def entries(self) -> list[MirrorEntry]:
+        """The cached mirrors, least recently used first."""
+
+        if not self.cache_dir.exists():
+            return []
+
+        entries = []
+        for mirror_path in self.cache_dir.glob("*.git"):
+            last_used_path = mirror_path / self.LAST_USED_FILE
+            last_used = last_used_path.stat().st_mtime if last_used_path.exists() else 0.0
+            entries.append(
+                MirrorEntry(
+                    feedstock_name=mirror_path.name.removesuffix(".git"),
+                    path=mirror_path,
+                    size=directory_size(mirror_path),
+                    last_used=last_used,
+                )
+            )
+        return sorted(entries, key=lambda entry: entry.last_used)
+
+    def prune(self, max_size: int = 0, keep: Iterable[str] = ()) -> list[MirrorEntry]:
+        """
+        Evict the least recently used mirrors until the cache is smaller than `max_size` bytes.
+
+        Args:
+            max_size: The target size of the cache in bytes. Use 0 to evict everything.
+            keep: The names of feedstocks whose mirror must not be evicted.
+
+        Returns:
+            The evicted mirrors.
+        """
+
+        keep = set(keep)
+        evicted = []
+
+        with self._lock:
+            entries = self.entries()
+            total_size = sum(entry.size for entry in entries)
+
+            for entry in entries:
+                if total_size <= max_size:
+                    break
+                if entry.feedstock_name in keep or time.time() - entry.last_used < self.min_age:
+                    continue
+                logger.info(f"🗑️ Evicting the mirror {entry.path} ({entry.size / 2**20:.1f} MiB)")
+                shutil.rmtree(entry.path)
+                total_size -= entry.size
+                evicted.append(entry)
+
+        return evicted
@@ -0,0 +1,292 @@
+import contextlib
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional, Sequence, TypeVar, Union
+
+from github import Github, RateLimitExceededException
+from github.Repository import Repository
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_CALL_COUNTERS: contextvars.ContextVar[tuple[Counter, ...]] = contextvars.ContextVar(
+    "github_call_counters", default=()
+)
+_CALL_COUNTERS_LOCK = threading.Lock()
+
+
+@contextlib.contextmanager
+def count_calls() -> Iterator[Counter]:
+    """
+    Count the GitHub calls issued in the current context by call name, including the
+    background calls submitted from it.
+    """
+
+    counter = Counter()
+    token = _CALL_COUNTERS.set(_CALL_COUNTERS.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _CALL_COUNTERS.reset(token)
+
+
+def lazy_repo(gh: Github, full_name: str) -> Repository:
+    """
+    A repository that is not fetched until one of its attributes is read, so acting on it,
+    e.g. creating a pull request, costs a single request.
+
+    The deprecated `get_repo(..., lazy=True)` and `Github.withLazy` both create a new requester
+    with its own connection pool, this one reuses the connections of `gh`.
+    """
+
+    return Repository(gh.requester, url=f"/repos/{full_name}", completed=False)
+
+
+@dataclass
+class TokenBudget:
+    remaining: Optional[int] = None
+    limit: Optional[int] = None
+    reset: float = 0.0
+    blocked_until: float = 0.0
+
+
+class RateLimitGovernor:
+    """
+    Track the GitHub rate limit budget of one or several tokens and decide which token
+    to use and how long to wait before each request.
+
+    The budgets are updated from the `X-RateLimit-*` headers of the responses. Requests are
+    delayed until the reset time when a token gets below `reserve` remaining requests, or when
+    GitHub asked to back off with `Retry-After`, so work is throttled before the limit is hit.
+
+    Args:
+        n_tokens: The number of tokens. The first one is the primary token used for writes.
+        reserve: The number of requests kept in reserve on each token.
+    """
+
+    def __init__(self, n_tokens: int = 1, reserve: int = 50):
+        self.reserve = reserve
+        self._budgets = [TokenBudget() for _ in range(n_tokens)]
+        self._lock = threading.Lock()
+
+    def _available_at(self, budget: TokenBudget, now: float) -> float:
+        available_at = budget.blocked_until
+        if budget.remaining is not None and budget.remaining <= self.reserve and budget.reset > now:
+            available_at = max(available_at, budget.reset)
+        return available_at
+
+    def acquire(self, write: bool = False) -> tuple[int, float]:
+        """
+        Select a token for a request.
+
+        Writes always use the primary token since they act on behalf of its user. Reads use the
+        token available the soonest, with the largest remaining budget.
+
+        Returns:
+            The index of the token and the time in seconds to wait before using it.
+        """
+
+        with self._lock:
+            now = time.time()
+            candidates = [0] if write else range(len(self._budgets))
+            index = min(
+                candidates,
+                key=lambda i: (
+                    self._available_at(self._budgets[i], now),
+                    -(self._budgets[i].remaining if self._budgets[i].remaining is not None else math.inf),
+                ),
+            )
+            budget = self._budgets[index]
+            wait = max(0.0, self._available_at(budget, now) - now)
+            if budget.remaining is not None:
+                # Count the request right away so concurrent requests see the reduced budget
+                budget.remaining -= 1
+            return index, wait
+
+    def update(self, index: int, remaining: int, limit: int, reset: float):
+        """Update the budget of a token from the rate limit headers of a response."""
+
+        if limit < 0:
+            return
+        with self._lock:
+            budget = self._budgets[index]
+            budget.remaining, budget.limit, budget.reset = remaining, limit, reset
+
+    def block(self, index: int, until: float):
+        """Do not use a token until `until`, e.g. after a secondary rate limit `Retry-After`."""
+
+        with self._lock:
+            budget = self._budgets[index]
+            budget.blocked_until = max(budget.blocked_until, until)
+
+    def remaining(self) -> Optional[int]:
+        """The total remaining requests of all the tokens, if known."""
+
+        with self._lock:
+            known = [budget.remaining for budget in self._budgets if budget.remaining is not None]
+            return sum(known) if known else None
+
+    def projected_wait(self, n_requests: int) -> float:
+        """
+        The time in seconds spent waiting for rate limit resets to issue `n_requests` more requests.
+        """
+
+        with self._lock:
+            now = time.time()
+            budgets = [budget for budget in self._budgets if budget.remaining is not None]
+            if not budgets:
+                return 0.0
+
+            available = sum(max(0, budget.remaining - self.reserve) for budget in budgets)
+            if n_requests <= available:
+                return 0.0
+
+            # Every reset gives each token its full budget back for another hour
+            per_hour = sum(max(1, budget.limit - self.reserve) for budget in budgets)
+            n_resets = math.ceil((n_requests - available) / per_hour)
+            next_reset = min(max(budget.reset, now) for budget in budgets)
+            return next_reset - now + (n_resets - 1) * 3600
+
+
+class GitHubClient:
+    """
+    A thin layer over PyGithub clients used for all the GitHub API traffic of feedrattler.
+
+    The underlying `requests` sessions keep their connections alive and are sized with
+    `pool_size`, so independent calls can be issued concurrently with `submit` and reuse
+    pooled connections. The latency of every call is recorded by call name, and every call
+    goes through a `RateLimitGovernor`.
+
+    Args:
+        gh: The PyGithub client, or several clients authenticated with different tokens to
+            rotate reads across them. The first one is used for writes.
+        max_workers: The maximum number of concurrent background calls.
+        reserve: The number of requests kept in reserve on each token.
+        max_rate_limit_retries: The number of times a call is retried after hitting a rate limit.
+    """
+
+    def __init__(
+        self,
+        gh: Union[Github, Sequence[Github]],
+        max_workers: int = 8,
+        reserve: int = 50,
+        max_rate_limit_retries: int = 3,
+    ):
+        self.ghs = list(gh) if isinstance(gh, (list, tuple)) else [gh]
+        self.gh = self.ghs[0]
+        self.governor = RateLimitGovernor(n_tokens=len(self.ghs), reserve=reserve)
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.max_workers = max_workers
+        # Only created by the first `submit`, many clients only issue blocking calls
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._latencies: dict[str, list[float]] = defaultdict(list)
+
+    @classmethod
+    def from_tokens(cls, tokens: Sequence[Optional[str]], pool_size: int = 10, **kwargs) -> "GitHubClient":
+        ghs = [Github(login_or_token=token, pool_size=pool_size) for token in tokens]
+        return cls(ghs, max_workers=pool_size, **kwargs)
+
+    @classmethod
+    def wrap(cls, gh: Union[Github, "GitHubClient"]) -> "GitHubClient":
+        """
+        Return `gh` if it already is a `GitHubClient`, otherwise wrap it into one.
+
+        A client created here is owned by the caller, which must `close` it once done.
+        """
+
+        if isinstance(gh, GitHubClient):
+            return gh
+        return cls(gh)
+
+    def call(self, name: str, fn: Callable[..., T], *args, write: bool = False, **kwargs) -> T:
+        """
+        Call `fn(gh, *args, **kwargs)` with the PyGithub client selected by the rate limit
+        governor and record its latency under `name`.
+
+        Args:
+            name: The name of the call, used to aggregate latencies.
+            fn: The function issuing the requests, it receives the PyGithub client as first argument.
+            write: Whether the call acts on behalf of the user (fork, PR, ...) and must use the primary token.
+        """
+
+        with _CALL_COUNTERS_LOCK:
+            for counter in _CALL_COUNTERS.get():
+                counter[name] += 1
+
+        for attempt in range(self.max_rate_limit_retries + 1):
+            index, wait = self.governor.acquire(write=write)
+            if wait > 0:
+                logger.info(f"🚦 GitHub rate limit budget exhausted, waiting {wait:.0f}s before {name}")
+                time.sleep(wait)
+
+            gh = self.ghs[index]
+            start = time.perf_counter()
+            try:
+                return fn(gh, *args, **kwargs)
+            except RateLimitExceededException as e:
+                if attempt == self.max_rate_limit_retries:
+                    raise
+                retry_after = (e.headers or {}).get("retry-after")
+                until = (
+                    time.time() + float(retry_after) if retry_after else gh.requester.rate_limiting_resettime
+                )
+                logger.warning(
+                    f"🚦 GitHub rate limit hit during {name}, retrying in {until - time.time():.0f}s"
+                )
+                self.governor.block(index, until)
+            finally:
+                latency = time.perf_counter() - start
+                with self._lock:
+                    self._latencies[name].append(latency)
+                logger.debug(f"🌐 GitHub {name} took {latency * 1000:.0f}ms")
+                self.governor.update(index, *gh.requester.rate_limiting, gh.requester.rate_limiting_resettime)
+
+    def submit(self, name: str, fn: Callable[..., T], *args, **kwargs) -> "Future[T]":
+        """Run `call` in the background."""
+
+        # Run in a copy of the current context so the call is counted by `count_calls`
+        context = contextvars.copy_context()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="github")
+            executor = self._executor
+        return executor.submit(context.run, self.call, name, fn, *args, **kwargs)
+
+    def latencies(self) -> dict[str, list[float]]:
+        """The latency in seconds of every call, by call name."""
+
+        with self._lock:
+            return {name: list(latencies) for name, latencies in self._latencies.items()}
+
+    def n_calls(self) -> int:
+        with self._lock:
+            return sum(len(latencies) for latencies in self._latencies.values())
+
+    def log_latency_summary(self):
+        for name, latencies in sorted(self.latencies().items()):
+            logger.info(
+                f"🌐 GitHub {name}: {len(latencies)} calls, "
+                f"mean {sum(latencies) / len(latencies) * 1000:.0f}ms, max {max(latencies) * 1000:.0f}ms"
+            )
+        if (remaining := self.governor.remaining()) is not None:
+            logger.info(f"🚦 GitHub rate limit budget: {remaining} requests left")
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> "GitHubClient":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
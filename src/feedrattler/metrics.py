@@ -0,0 +1,207 @@
+import dataclasses
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional, Type
+
+from .github_client import count_calls
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StageMetrics:
+    """
+    The metrics of one stage of a feedstock conversion, or of the whole conversion for the
+    `total` stage.
+
+    Args:
+        feedstock_name: The name of the feedstock.
+        stage: The name of the stage.
+        start: The start time of the stage as a Unix timestamp.
+        wall_time: The elapsed time in seconds.
+        cpu_time: The CPU time in seconds of the thread running the conversion.
+        children_cpu_time: The CPU time in seconds of the terminated child processes (git,
+            rerenders) of the whole feedrattler process, it includes other feedstocks when
+            several are converted concurrently. `None` when not available on the platform.
+        github_calls: The number of GitHub calls by call name.
+        bytes_cloned: The size in bytes of the objects stored in the clone.
+        bytes_pushed: The estimated size in bytes of the objects pushed to the fork.
+        error: The error message if the stage failed.
+        skipped: Whether the error is not a failure but the reason the conversion was skipped,
+            e.g. because a conversion pull request is already open.
+    """
+
+    feedstock_name: str
+    stage: str
+    start: float
+    wall_time: float
+    cpu_time: float
+    children_cpu_time: Optional[float]
+    github_calls: dict[str, int] = field(default_factory=dict)
+    bytes_cloned: Optional[int] = None
+    bytes_pushed: Optional[int] = None
+    error: Optional[str] = None
+    skipped: bool = False
+
+
+MetricsHook = Callable[[StageMetrics], None]
+
+
+def _children_cpu_time() -> Optional[float]:
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class _Span:
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.fields = {}
+        self._start = time.time()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        self._children_cpu_start = _children_cpu_time()
+        self._calls_context = count_calls()
+        self._calls = self._calls_context.__enter__()
+
+    def end(self, feedstock_name: str, error: Optional[str] = None, skipped: bool = False) -> StageMetrics:
+        self._calls_context.__exit__(None, None, None)
+        children_cpu_time = _children_cpu_time()
+        return StageMetrics(
+            feedstock_name=feedstock_name,
+            stage=self.stage,
+            start=self._start,
+            wall_time=time.perf_counter() - self._wall_start,
+            cpu_time=time.thread_time() - self._cpu_start,
+            children_cpu_time=(
+                children_cpu_time - self._children_cpu_start if children_cpu_time is not None else None
+            ),
+            github_calls=dict(self._calls),
+            error=error,
+            skipped=skipped,
+            **self.fields,
+        )
+
+
+class StageTracker:
+    """
+    Time the consecutive stages of a feedstock conversion.
+
+    Use it as a context manager around the conversion: `start` ends the current stage and
+    starts the next one, and the error of a failed conversion is recorded on the stage it
+    happened in. A `total` record covering the whole conversion is emitted last.
+
+    Besides the hooks of `metrics`, the records are passed to `hooks`, which only receive the
+    records of this conversion. The exceptions of `skip_exceptions` end the conversion without
+    failing it, their records are marked as `skipped`.
+    """
+
+    def __init__(
+        self,
+        metrics: "RunMetrics",
+        feedstock_name: str,
+        hooks: Iterable[MetricsHook] = (),
+        skip_exceptions: tuple[Type[BaseException], ...] = (),
+    ):
+        self.metrics = metrics
+        self.feedstock_name = feedstock_name
+        self.hooks = list(hooks)
+        self.skip_exceptions = skip_exceptions
+        self._total: Optional[_Span] = None
+        self._current: Optional[_Span] = None
+        self._records: list[StageMetrics] = []
+
+    def start(self, stage: str):
+        self._end_current()
+        self._current = _Span(stage)
+
+    def set(self, **fields):
+        """Set fields of the current stage such as `bytes_cloned`."""
+
+        self._current.fields.update(fields)
+
+    def _end_current(self, error: Optional[str] = None, skipped: bool = False):
+        if self._current is None:
+            return
+        record = self._current.end(self.feedstock_name, error, skipped)
+        self._current = None
+        self._records.append(record)
+        self._emit(record)
+
+    def _emit(self, record: StageMetrics):
+        self.metrics.emit(record)
+        self.metrics.emit(record, self.hooks)
+
+    def __enter__(self) -> "StageTracker":
+        self._total = _Span("total")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        error = str(exc_value) if exc_value is not None else None
+        skipped = isinstance(exc_value, self.skip_exceptions)
+        self._end_current(error, skipped)
+
+        total = self._total.end(self.feedstock_name, error, skipped)
+        for record in self._records:
+            for name in ("bytes_cloned", "bytes_pushed"):
+                if (value := getattr(record, name)) is not None:
+                    setattr(total, name, (getattr(total, name) or 0) + value)
+        self._emit(total)
+
+        logger.info(
+            f"⏱️ {self.feedstock_name} took {total.wall_time:.1f}s: "
+            + ", ".join(f"{record.stage} {record.wall_time:.1f}s" for record in self._records)
+        )
+
+
+class RunMetrics:
+    """
+    Collect the per-stage metrics of feedstock conversions and pass them to hooks.
+
+    Args:
+        hooks: Functions called with every `StageMetrics` record, possibly from several threads.
+    """
+
+    def __init__(self, hooks: Iterable[MetricsHook] = ()):
+        self.hooks = list(hooks)
+
+    def add_hook(self, hook: MetricsHook):
+        self.hooks.append(hook)
+
+    def emit(self, record: StageMetrics, hooks: Optional[Iterable[MetricsHook]] = None):
+        for hook in self.hooks if hooks is None else hooks:
+            try:
+                hook(record)
+            except Exception:
+                logger.exception(f"❗ Metrics hook {hook} failed")
+
+    def track(
+        self,
+        feedstock_name: str,
+        hooks: Iterable[MetricsHook] = (),
+        skip_exceptions: tuple[Type[BaseException], ...] = (),
+    ) -> StageTracker:
+        return StageTracker(self, feedstock_name, hooks, skip_exceptions)
+
+
+class JsonLinesWriter:
+    """A metrics hook appending every record as a JSON line to a file."""
+
+    def __init__(self, path: os.PathLike):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, record: StageMetrics):
+        line = json.dumps(dataclasses.asdict(record))
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
@@ -0,0 +1,109 @@
+import io
+import logging
+import re
+
+import ruamel.yaml
+
+from .utils import (
+    initialize_yaml,
+    remove_empty_script_test_data,
+    update_python_min_in_recipe_data,
+    update_python_version_in_tests_data,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def bump_build_number(data: ruamel.yaml.CommentedMap):
+    """
+    Increment `build.number` of a v1 recipe loaded with ruamel.
+
+    Args:
+        data: The recipe loaded with ruamel, updated in place.
+    """
+
+    build_number_raw = data["build"]["number"]
+    try:
+        build_number = int(build_number_raw) + 1
+    except ValueError:
+        raise Exception(f"❗ Failed to bump build number: {build_number_raw} is not an integer")
+
+    data["build"]["number"] = build_number
+
+
+def postprocess_recipe_data(data: ruamel.yaml.CommentedMap):
+    """
+    Apply all the feedrattler edits to a freshly converted v1 recipe.
+
+    Args:
+        data: The recipe loaded with ruamel, updated in place.
+    """
+
+    bump_build_number(data)
+
+    # fix #1: replace `python ${{ python_min }}` by `python ${{ python_min }}.*`
+    # NOTE: waiting for upstream fix at https://github.com/conda-incubator/conda-recipe-manager/issues/308
+    update_python_min_in_recipe_data(data)
+
+    # fix #2: if noarch=python then add python_min to tests[].python.python_version
+    # NOTE: waiting for upstream fix at https://github.com/conda-incubator/conda-recipe-manager/issues/309
+    update_python_version_in_tests_data(data)
+
+    # fix #3: remove script test if tests[].script does not exist
+    # NOTE: waiting for upstream fix at https://github.com/hadim/feedrattler/issues/7
+    remove_empty_script_test_data(data)
+
+
+def postprocess_recipe_text(recipe_yaml: str) -> str:
+    """
+    Bump the build number and apply all the fixes to the text of a converted recipe.
+
+    Args:
+        recipe_yaml: The content of the `recipe.yaml` file.
+
+    Returns:
+        The updated content.
+    """
+
+    yaml = initialize_yaml()
+    data = yaml.load(recipe_yaml)
+
+    postprocess_recipe_data(data)
+
+    stream = io.StringIO()
+    yaml.dump(data, stream)
+    return stream.getvalue()
+
+
+def find_unsupported_jinja(meta_yaml: str) -> list[str]:
+    """
+    Find the Jinja statements of a v0 recipe that can not be converted to a v1 recipe.
+
+    Only `{% set ... %}` statements are supported, control structures such as `{% for %}`
+    or `{% if %}` and macros are not.
+
+    Args:
+        meta_yaml: The content of the `meta.yaml` file.
+
+    Returns:
+        The unsupported statements, in order of appearance.
+    """
+
+    statements = re.findall(r"{%-?\s*(.*?)\s*-?%}", meta_yaml, flags=re.DOTALL)
+    return [statement for statement in statements if statement.split(maxsplit=1)[:1] != ["set"]]
+
+
+def is_noarch_python(recipe_text: str) -> bool:
+    """
+    Whether a v0 or v1 recipe, or one of its outputs, is a `noarch: python` package.
+
+    The recipe text is matched without parsing it so v0 recipes need not be rendered.
+    """
+
+    return re.search(r"^\s*noarch\s*:\s*[\"']?python\b", recipe_text, flags=re.MULTILINE) is not None
+
+
+def is_multi_output(recipe_text: str) -> bool:
+    """Whether a v0 or v1 recipe defines several outputs, see `is_noarch_python`."""
+
+    return re.search(r"^outputs\s*:", recipe_text, flags=re.MULTILINE) is not None
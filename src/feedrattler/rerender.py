@@ -0,0 +1,568 @@
+import json
+import logging
+import os
+import pathlib
+import queue
+import re
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# The progress milestones of a conda-smithy rerender, reached at the first output line matching them
+MILESTONES = {
+    "pinning": re.compile(r"conda-forge-pinning"),
+    "migrations": re.compile(r"[Mm]igration"),
+    "ci_support": re.compile(r"\.ci_support"),
+    "readme": re.compile(r"README"),
+    "commit": re.compile(r"^\[\S+ [0-9a-f]{7,}\]"),
+}
+
+
+class RerenderOutput:
+    """
+    A ring buffer of the last lines of the output of a rerender, each with the time in seconds
+    since the start of the rerender it was received at.
+
+    The memory used is bounded by `max_lines` lines of at most `max_line_length` characters
+    whatever the size of the output. The milestones of `MILESTONES` are recorded from all the
+    lines, including the dropped ones.
+
+    Args:
+        max_lines: The number of lines kept.
+        max_line_length: The lines longer than this are truncated.
+    """
+
+    def __init__(self, max_lines: int = 1000, max_line_length: int = 2000):
+        self.max_line_length = max_line_length
+        self.lines: deque[tuple[float, str]] = deque(maxlen=max_lines)
+        self.n_lines = 0
+        self.milestones: dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    @property
+    def n_dropped_lines(self) -> int:
+        return self.n_lines - len(self.lines)
+
+    def append(self, line: str):
+        elapsed = time.perf_counter() - self._start
+        if len(line) > self.max_line_length:
+            line = line[: self.max_line_length] + ("\n" if line.endswith("\n") else "")
+        self.lines.append((elapsed, line))
+        self.n_lines += 1
+        for name, pattern in MILESTONES.items():
+            if name not in self.milestones and pattern.search(line):
+                self.milestones[name] = elapsed
+
+    def text(self) -> str:
+        return "".join(line for _, line in self.lines)
+
+    def to_dict(self) -> dict:
+        return {"lines": list(self.lines), "n_lines": self.n_lines, "milestones": self.milestones}
+
+    @classmethod
+    def from_dict(cls, data: dict, max_lines: int = 1000) -> "RerenderOutput":
+        output = cls(max_lines=max_lines)
+        output.lines.extend((elapsed, line) for elapsed, line in data["lines"])
+        output.n_lines = data["n_lines"]
+        output.milestones = data["milestones"]
+        return output
+
+
+@dataclass
+class RerenderResult:
+    feedstock_dir: pathlib.Path
+    returncode: Optional[int]
+    captured: RerenderOutput
+    duration: float
+    timed_out: bool = False
+    cancelled: bool = False
+    # The conda-forge pinning version used, when reported by a warm worker
+    pinning_version: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        return self.returncode == 0 and not self.timed_out and not self.cancelled
+
+    @property
+    def output(self) -> str:
+        """The last lines of the output, see `RerenderOutput`."""
+
+        return self.captured.text()
+
+    def output_tail(self, n_lines: int = 20) -> str:
+        return "\n".join(self.output.splitlines()[-n_lines:])
+
+    def milestones_summary(self) -> str:
+        return ", ".join(f"{name} at {elapsed:.1f}s" for name, elapsed in self.captured.milestones.items())
+
+    def write_log(self, path: os.PathLike) -> pathlib.Path:
+        """Write the captured output, with the time of every line and a summary header, to a file."""
+
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            f.write(f"# Rerender of {self.feedstock_dir}\n")
+            f.write(
+                f"# returncode={self.returncode} duration={self.duration:.1f}s "
+                f"timed_out={self.timed_out} cancelled={self.cancelled}\n"
+            )
+            f.write(f"# milestones: {self.milestones_summary() or 'none'}\n")
+            if self.captured.n_dropped_lines:
+                f.write(f"# {self.captured.n_dropped_lines} earlier lines dropped\n")
+            for elapsed, line in self.captured.lines:
+                f.write(f"[{elapsed:8.2f}s] {line.rstrip()}\n")
+        return path
+
+
+def rerender_command(feedstock_dir: os.PathLike) -> list[str]:
+    """The command rerendering a feedstock with conda-smithy in a child process."""
+
+    return [sys.executable, "-m", "feedrattler.rerender", str(feedstock_dir)]
+
+
+def warm_worker_command() -> list[str]:
+    """The command starting a long-lived rerender worker, see `serve_worker`."""
+
+    return [sys.executable, "-m", "feedrattler.rerender", "--worker"]
+
+
+# Process groups and `select` on pipes are POSIX-only. Elsewhere, e.g. on Windows, only the
+# rerender process itself is killed and the warm worker responses are read from a thread.
+_POSIX = os.name == "posix"
+
+
+def _kill(process: subprocess.Popen):
+    if not _POSIX:
+        process.kill()
+        return
+
+    # The child runs in its own session so the processes it spawned are killed too
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+class _WarmWorker:
+    """A long-lived rerender worker process and the pipes to send it requests."""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            warm_worker_command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            start_new_session=True,
+        )
+        self.ready = False
+
+        self._lines: "queue.Queue[str]" = queue.Queue()
+        if not _POSIX:
+            threading.Thread(target=self._read_lines, name="rerender-worker", daemon=True).start()
+
+    def _read_lines(self):
+        for line in self.process.stdout:
+            self._lines.put(line)
+        self._lines.put("")
+
+    def _read(self, timeout: Optional[float]) -> Optional[dict]:
+        if _POSIX:
+            ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+            if not ready:
+                return None
+            line = self.process.stdout.readline()
+        else:
+            try:
+                line = self._lines.get(timeout=timeout)
+            except queue.Empty:
+                return None
+        if not line:
+            raise EOFError("the rerender worker exited")
+        return json.loads(line)
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        if not self.ready:
+            self.ready = self._read(timeout) is not None
+        return self.ready
+
+    def request(
+        self, feedstock_dir: pathlib.Path, timeout: Optional[float], max_output_lines: int
+    ) -> Optional[dict]:
+        """Rerender a feedstock, returns `None` on timeout."""
+
+        # Preloading is not part of the rerender timeout but is bounded by the same duration,
+        # a worker stuck while preloading must not block the rerender forever
+        if not self.wait_ready(timeout):
+            return None
+        request = {"feedstock_dir": str(feedstock_dir), "max_output_lines": max_output_lines}
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+        return self._read(timeout)
+
+
+class RerenderPool:
+    """
+    Run conda-smithy rerenders in child processes, at most `max_workers` at a time.
+
+    Each rerender runs in its own process so its global side effects (logging setup, working
+    directory, stdout/stderr writes) do not leak into feedrattler and several feedstocks can be
+    rerendered across cores. The last `max_output_lines` lines of the output of every rerender
+    are captured, see `RerenderOutput`, and a rerender exceeding its timeout is killed instead of
+    blocking the other conversions.
+
+    With `warm=True`, rerenders are sent to long-lived worker processes that import conda-smithy
+    and resolve the conda-forge pinning once, instead of starting a fresh process per rerender.
+    A worker is only replaced when it times out, crashes or is cancelled. The output of a warm
+    rerender is only available once it is done.
+
+    Args:
+        max_workers: The maximum number of concurrent rerenders. Defaults to the number of CPUs.
+        timeout: The default timeout of a rerender in seconds. `None` disables it.
+        warm: Reuse long-lived worker processes with conda-smithy and the pinning preloaded.
+        max_output_lines: The number of the last lines of the output of each rerender kept.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = 900.0,
+        warm: bool = False,
+        max_output_lines: int = 1000,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.warm = warm
+        self.max_output_lines = max_output_lines
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="rerender")
+        self._lock = threading.Lock()
+        self._processes: set[subprocess.Popen] = set()
+        self._idle_workers: list[_WarmWorker] = []
+        self._cancelled = False
+
+    def warm_up(self, timeout: Optional[float] = None):
+        """
+        Start all the warm workers and wait until they have preloaded conda-smithy and the pinning.
+
+        Args:
+            timeout: The time in seconds the workers have to preload. The workers that are not ready
+                by then are killed, new ones are started on demand by the rerenders.
+        """
+
+        with self._lock:
+            workers = [_WarmWorker() for _ in range(self.max_workers - len(self._idle_workers))]
+            self._idle_workers.extend(workers)
+
+        # The workers preload concurrently so they share the same deadline
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        stuck = []
+        for worker in workers:
+            remaining = max(deadline - time.monotonic(), 0.0) if deadline is not None else None
+            try:
+                ready = worker.wait_ready(remaining)
+            except (EOFError, OSError, ValueError):
+                ready = False
+            if not ready:
+                stuck.append(worker)
+
+        if stuck:
+            logger.warning(f"⚠️ {len(stuck)} warm rerender workers failed to preload, killing them")
+            with self._lock:
+                self._idle_workers = [worker for worker in self._idle_workers if worker not in stuck]
+            for worker in stuck:
+                _kill(worker.process)
+                worker.process.wait()
+        logger.info(f"🔥 {len(workers) - len(stuck)} warm rerender workers ready")
+
+    def submit(
+        self, feedstock_dir: os.PathLike, timeout: Optional[float] = None, stream_logs: bool = False
+    ) -> "Future[RerenderResult]":
+        """
+        Queue the rerender of a feedstock.
+
+        Args:
+            feedstock_dir: The feedstock clone, named after the feedstock.
+            timeout: The timeout of this rerender in seconds. Defaults to the pool timeout.
+            stream_logs: Forward the conda-smithy output to the logs as it is produced.
+        """
+
+        return self._executor.submit(
+            self._run,
+            pathlib.Path(feedstock_dir),
+            self.timeout if timeout is None else timeout,
+            stream_logs,
+        )
+
+    def rerender(
+        self, feedstock_dir: os.PathLike, timeout: Optional[float] = None, stream_logs: bool = False
+    ) -> RerenderResult:
+        """Rerender a feedstock and wait for the result, see `submit`."""
+
+        return self.submit(feedstock_dir, timeout=timeout, stream_logs=stream_logs).result()
+
+    def _run(
+        self, feedstock_dir: pathlib.Path, timeout: Optional[float], stream_logs: bool
+    ) -> RerenderResult:
+        if self.warm:
+            return self._run_warm(feedstock_dir, timeout, stream_logs)
+
+        start = time.perf_counter()
+
+        with self._lock:
+            if self._cancelled:
+                return RerenderResult(feedstock_dir, None, RerenderOutput(), 0.0, cancelled=True)
+            process = subprocess.Popen(
+                rerender_command(feedstock_dir),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                start_new_session=True,
+            )
+            self._processes.add(process)
+
+        captured = RerenderOutput(max_lines=self.max_output_lines)
+
+        def read_output():
+            for line in process.stdout:
+                captured.append(line)
+                if stream_logs:
+                    logger.info(f"🔄 {line.rstrip()}")
+
+        reader = threading.Thread(target=read_output, name=threading.current_thread().name, daemon=True)
+        reader.start()
+
+        timed_out = False
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"⏳ Rerendering {feedstock_dir.name} timed out after {timeout:.0f}s, killing it")
+            timed_out = True
+            _kill(process)
+            process.wait()
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+                cancelled = self._cancelled
+
+        reader.join()
+        process.stdout.close()
+
+        return RerenderResult(
+            feedstock_dir=feedstock_dir,
+            returncode=process.returncode,
+            captured=captured,
+            duration=time.perf_counter() - start,
+            timed_out=timed_out,
+            cancelled=cancelled and process.returncode != 0,
+        )
+
+    def _run_warm(
+        self, feedstock_dir: pathlib.Path, timeout: Optional[float], stream_logs: bool
+    ) -> RerenderResult:
+        with self._lock:
+            if self._cancelled:
+                return RerenderResult(feedstock_dir, None, RerenderOutput(), 0.0, cancelled=True)
+            worker = self._idle_workers.pop() if self._idle_workers else _WarmWorker()
+            self._processes.add(worker.process)
+
+        start = time.perf_counter()
+        response = None
+        crashed = False
+        try:
+            response = worker.request(feedstock_dir, timeout, self.max_output_lines)
+        except (EOFError, OSError, ValueError) as e:
+            logger.warning(f"⚠️ The rerender worker of {feedstock_dir.name} crashed: {e}")
+            crashed = True
+        finally:
+            with self._lock:
+                self._processes.discard(worker.process)
+                cancelled = self._cancelled
+                if response is not None and not cancelled:
+                    self._idle_workers.append(worker)
+
+        # `request` only returns `None` once the timeout expired
+        timed_out = response is None and timeout is not None and not crashed and not cancelled
+        if timed_out:
+            logger.warning(f"⏳ Rerendering {feedstock_dir.name} timed out after {timeout:.0f}s, killing it")
+        if response is None:
+            _kill(worker.process)
+            worker.process.wait()
+            response = {"returncode": worker.process.returncode, "output": RerenderOutput().to_dict()}
+
+        captured = RerenderOutput.from_dict(response["output"], max_lines=self.max_output_lines)
+        if stream_logs:
+            for line in captured.text().splitlines():
+                logger.info(f"🔄 {line}")
+
+        return RerenderResult(
+            feedstock_dir=feedstock_dir,
+            returncode=response["returncode"],
+            captured=captured,
+            duration=time.perf_counter() - start,
+            timed_out=timed_out,
+            cancelled=cancelled and response["returncode"] != 0,
+            pinning_version=response.get("pinning_version"),
+        )
+
+    def cancel(self):
+        """Kill the running rerenders and cancel the queued ones."""
+
+        with self._lock:
+            self._cancelled = True
+            processes = list(self._processes)
+        for process in processes:
+            _kill(process)
+
+    def shutdown(self, cancel: bool = False):
+        if cancel:
+            self.cancel()
+        self._executor.shutdown(wait=True, cancel_futures=cancel)
+
+        with self._lock:
+            workers, self._idle_workers = self._idle_workers, []
+        for worker in workers:
+            # Closing stdin makes an idle worker exit
+            worker.process.stdin.close()
+            try:
+                worker.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                _kill(worker.process)
+                worker.process.wait()
+
+    def __enter__(self) -> "RerenderPool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Do not leave orphan rerenders behind when interrupted
+        self.shutdown(cancel=exc_type is not None)
+
+
+def main(
+    feedstock_dir: str,
+    exclusive_config_file: Optional[str] = None,
+    temporary_directory: Optional[str] = None,
+):
+    from conda_smithy import configure_feedstock
+
+    configure_feedstock.main(
+        forge_file_directory=feedstock_dir,
+        forge_yml=None,
+        no_check_uptodate=True,  # NOTE: ok or not?
+        commit=True,
+        exclusive_config_file=exclusive_config_file,
+        check=False,
+        temporary_directory=temporary_directory,
+    )
+
+
+def serve_worker():
+    """
+    Run a warm rerender worker.
+
+    conda-smithy is imported and the conda-forge pinning is resolved once, then the feedstock
+    directories received as JSON lines on stdin are rerendered one after the other. A JSON line
+    is written to stdout once ready and after each rerender with its exit code, the last lines
+    of its output and the pinning version it used.
+    """
+
+    from conda_smithy import configure_feedstock
+
+    # The pinning is downloaded once and reused for all the rerenders of this worker
+    with tempfile.TemporaryDirectory(prefix="feedrattler-rerender-") as temporary_directory:
+        exclusive_config_file, pinning_version = configure_feedstock.get_cfp_file_path(temporary_directory)
+        _serve_requests(exclusive_config_file, temporary_directory, pinning_version)
+
+
+@contextmanager
+def _follow(path: str, captured: RerenderOutput) -> Iterator[None]:
+    # Read the lines appended to a file into `captured` as they are written, until exiting
+    stop = threading.Event()
+
+    def read_lines():
+        with open(path) as f:
+            partial = ""
+            while True:
+                stopping = stop.is_set()
+                line = f.readline()
+                if line.endswith("\n"):
+                    captured.append(partial + line)
+                    partial = ""
+                elif line:
+                    partial += line
+                elif stopping:
+                    break
+                else:
+                    time.sleep(0.05)
+            if partial:
+                captured.append(partial)
+
+    reader = threading.Thread(target=read_lines, daemon=True)
+    reader.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        reader.join()
+
+
+def _serve_requests(exclusive_config_file: str, temporary_directory: str, pinning_version: str):
+    # Keep the original stdout for the responses, everything else written to fd 1 and 2
+    # (including by subprocesses) is captured per rerender
+    responses = os.fdopen(os.dup(1), "w")
+    responses.write(json.dumps({"ready": True}) + "\n")
+    responses.flush()
+
+    for line in sys.stdin:
+        request = json.loads(line)
+
+        captured = RerenderOutput(max_lines=request.get("max_output_lines", 1000))
+        with tempfile.NamedTemporaryFile("w+") as output, _follow(output.name, captured):
+            sys.stdout.flush()
+            sys.stderr.flush()
+            saved_fds = os.dup(1), os.dup(2)
+            os.dup2(output.fileno(), 1)
+            os.dup2(output.fileno(), 2)
+            try:
+                main(request["feedstock_dir"], exclusive_config_file, temporary_directory)
+                returncode = 0
+            except SystemExit as e:
+                returncode = e.code if isinstance(e.code, int) else int(e.code is not None)
+            except Exception:
+                traceback.print_exc()
+                returncode = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os.dup2(saved_fds[0], 1)
+                os.dup2(saved_fds[1], 2)
+                os.close(saved_fds[0])
+                os.close(saved_fds[1])
+
+        response = {
+            "returncode": returncode,
+            "output": captured.to_dict(),
+            "pinning_version": pinning_version,
+        }
+        responses.write(json.dumps(response) + "\n")
+        responses.flush()
+
+
+if __name__ == "__main__":
+    if sys.argv[1] == "--worker":
+        serve_worker()
+    else:
+        main(sys.argv[1])
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import re
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from git import Repo
+
+from .conversion_cache import _package_version
+from .utils import default_cache_dir, directory_size
+
+logger = logging.getLogger(__name__)
+
+PINNING_URL = "https://api.anaconda.org/package/conda-forge/conda-forge-pinning"
+
+
+def pinning_from_message(message: str) -> Optional[str]:
+    """The conda-forge pinning version of a conda-smithy rerender commit message."""
+
+    match = re.search(r"conda-forge-pinning ([\w.]+[\w])", message)
+    return match.group(1) if match is not None else None
+
+
+@dataclass
+class RerenderChanges:
+    """
+    The changes made to a feedstock by a rerender, relative to the feedstock root.
+
+    Args:
+        message: The message of the rerender commit, `None` if the rerender changed nothing.
+        files: The added and modified files.
+        removed: The removed files.
+        files_dir: The directory holding the content of the added and modified files.
+    """
+
+    message: Optional[str] = None
+    files: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    files_dir: Optional[pathlib.Path] = None
+
+    def apply(self, repo_dir: os.PathLike):
+        """Apply the changes to a feedstock clone with the same rerender inputs."""
+
+        repo_dir = pathlib.Path(repo_dir)
+        for file in self.files:
+            (repo_dir / file).parent.mkdir(parents=True, exist_ok=True)
+            # The file modes are kept, e.g. for the executable CI scripts
+            shutil.copy2(self.files_dir / file, repo_dir / file)
+        for file in self.removed:
+            (repo_dir / file).unlink(missing_ok=True)
+
+    def paths(self) -> list[str]:
+        return [*self.files, *self.removed]
+
+
+class RerenderCache:
+    """
+    An on-disk cache of rerender outputs keyed by the hash of everything they depend on.
+
+    conda-smithy regenerates the CI files (`.ci_support`, `.azure-pipelines`, `.github/workflows`,
+    `.scripts`, the README, ...) from the feedstock files, its name, the conda-forge pinning and
+    its own version. Rerendering a feedstock again from the same converted tree, e.g. when
+    retrying after a failed push or refreshing the branch of an unchanged feedstock, reuses the
+    files generated by the previous rerender instead of running conda-smithy.
+
+    Args:
+        cache_dir: The directory holding the outputs. Defaults to `rerenders` in the feedrattler cache dir.
+        pinning_ttl: The time in seconds during which the latest conda-forge pinning version is reused
+            before being looked up again.
+    """
+
+    def __init__(self, cache_dir: Optional[os.PathLike] = None, pinning_ttl: float = 600.0):
+        self.cache_dir = (
+            pathlib.Path(cache_dir) if cache_dir is not None else default_cache_dir() / "rerenders"
+        )
+        self.pinning_ttl = pinning_ttl
+        self._lock = threading.Lock()
+        self._pinning: Optional[tuple[float, str]] = None
+
+    def pinning_version(self) -> Optional[str]:
+        """The latest version of the conda-forge pinning, the one a rerender would use, or `None` if unknown."""
+
+        import requests
+
+        with self._lock:
+            if self._pinning is not None and time.monotonic() - self._pinning[0] < self.pinning_ttl:
+                return self._pinning[1]
+            try:
+                response = requests.get(PINNING_URL, timeout=10)
+                response.raise_for_status()
+                version = response.json()["latest_version"]
+            except (requests.RequestException, KeyError, ValueError) as e:
+                logger.warning(f"⚠️ Failed to look up the conda-forge pinning version: {e}")
+                return None
+            self._pinning = (time.monotonic(), version)
+            return version
+
+    @staticmethod
+    def key(git_repo: Repo, feedstock_name: str, pinning_version: str, rev: str = "HEAD") -> str:
+        """
+        The cache key of the rerender of a feedstock clone at `rev`, before it is rerendered.
+
+        Besides the recipe and `conda-forge.yml`, conda-smithy reads the migrations of
+        `.ci_support/migrations` and rewrites or removes the existing CI files, so the key covers
+        the whole tracked tree: the cached changes are only replayed on the exact same tree.
+        """
+
+        digest = hashlib.sha256()
+
+        def update(name: str, content: bytes):
+            digest.update(f"{name}\0{len(content)}\0".encode())
+            digest.update(content)
+
+        update("feedstock", feedstock_name.encode())
+        update("conda-smithy", _package_version("conda-smithy").encode())
+        update("conda-forge-pinning", pinning_version.encode())
+        update("tree", git_repo.commit(rev).tree.hexsha.encode())
+
+        return digest.hexdigest()
+
+    def path(self, key: str) -> pathlib.Path:
+        return self.cache_dir / key[:2] / key
+
+    def get(self, key: str) -> Optional[RerenderChanges]:
+        path = self.path(key)
+        if not path.exists():
+            return None
+
+        metadata = json.loads((path / "rerender.json").read_text())
+        return RerenderChanges(**metadata, files_dir=path / "files")
+
+    def put(self, key: str, git_repo: Repo, base_sha: str):
+        """Store the output of a rerender, the changes from `base_sha` to the `HEAD` of the clone."""
+
+        path = self.path(key)
+        if path.exists():
+            return
+
+        changes = RerenderChanges()
+        if git_repo.head.commit.hexsha != base_sha:
+            changes.message = git_repo.head.commit.message
+            for line in git_repo.git.diff("--name-status", "--no-renames", base_sha, "HEAD").splitlines():
+                status, file = line.split("\t", 1)
+                (changes.removed if status == "D" else changes.files).append(file)
+
+        # Write to a temporary dir first so a concurrent `get` never sees a partial entry
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = pathlib.Path(tempfile.mkdtemp(dir=path.parent))
+        repo_dir = pathlib.Path(git_repo.working_dir)
+        for file in changes.files:
+            (tmp_path / "files" / file).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(repo_dir / file, tmp_path / "files" / file)
+        (tmp_path / "rerender.json").write_text(
+            json.dumps({"message": changes.message, "files": changes.files, "removed": changes.removed})
+        )
+        try:
+            tmp_path.rename(path)
+        except OSError:
+            # Stored concurrently by another rerender
+            shutil.rmtree(tmp_path)
+
+    def size(self) -> int:
+        return directory_size(self.cache_dir) if self.cache_dir.exists() else 0
+
+    def clear(self):
+        if self.cache_dir.exists():
+            logger.info(f"🗑️ Clearing the rerender cache {self.cache_dir}")
+            shutil.rmtree(self.cache_dir)
@@ -0,0 +1,111 @@
+import dataclasses
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Optional
+
+from .utils import default_cache_dir
+
+logger = logging.getLogger(__name__)
+
+
+class BatchStatus(str, Enum):
+    success = "success"
+    failed = "failed"
+    skipped = "skipped"
+
+
+@dataclass
+class FeedstockResult:
+    """
+    The result of the conversion of a feedstock.
+
+    Args:
+        feedstock_name: The name of the feedstock.
+        status: Whether the conversion succeeded, failed or was skipped.
+        duration: The elapsed time in seconds.
+        message: The error or the reason for skipping.
+        failed_stage: The stage the conversion failed in, e.g. `clone` or `rerender`.
+        warnings: The conversion warnings, if any.
+        pr_url: The URL of the created or updated pull request.
+        manual_pr_url: The URL to create the pull request manually at, when creating it failed.
+        stage_durations: The wall time in seconds of every completed stage.
+        finished_at: The end time of the conversion as a Unix timestamp.
+        run_id: The run the conversion was part of, set when stored.
+    """
+
+    feedstock_name: str
+    status: BatchStatus
+    duration: float
+    message: Optional[str] = None
+    failed_stage: Optional[str] = None
+    warnings: Optional[str] = None
+    pr_url: Optional[str] = None
+    manual_pr_url: Optional[str] = None
+    stage_durations: dict[str, float] = field(default_factory=dict)
+    finished_at: Optional[float] = None
+    run_id: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FeedstockResult":
+        return cls(**{**data, "status": BatchStatus(data["status"])})
+
+
+class ResultStore:
+    """
+    An append-only JSON lines file with the result of every conversion of every run.
+
+    The store is meant to be queried across runs, e.g. to list the feedstocks that failed in
+    a given stage and convert them again, or to plan a campaign from the observed durations.
+    Appending is safe from several threads, and from several processes as each result is a
+    single small write.
+
+    Args:
+        path: The path to the file. Defaults to `results.jsonl` in the feedrattler cache dir.
+        run_id: The identifier of the results appended by this run. Defaults to the start time
+            and the process ID.
+    """
+
+    def __init__(self, path: Optional[os.PathLike] = None, run_id: Optional[str] = None):
+        self.path = pathlib.Path(path) if path is not None else default_cache_dir() / "results.jsonl"
+        self.run_id = run_id if run_id is not None else f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self._lock = threading.Lock()
+
+    def append(self, result: FeedstockResult) -> FeedstockResult:
+        result = dataclasses.replace(result, run_id=self.run_id)
+        line = json.dumps(dataclasses.asdict(result))
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+        return result
+
+    def results(self) -> list[FeedstockResult]:
+        """All the stored results, oldest first."""
+
+        if not self.path.exists():
+            return []
+
+        results = []
+        with open(self.path) as f:
+            for n, line in enumerate(f, start=1):
+                try:
+                    results.append(FeedstockResult.from_dict(json.loads(line)))
+                except (ValueError, TypeError) as e:
+                    # e.g. a line cut short by a killed run
+                    logger.warning(f"⚠️ Ignoring the invalid line {n} of {self.path}: {e}")
+        return results
+
+    def latest(self) -> list[FeedstockResult]:
+        """The last result of every feedstock, in the order they were last converted."""
+
+        latest = {}
+        for result in self.results():
+            latest.pop(result.feedstock_name, None)
+            latest[result.feedstock_name] = result
+        return list(latest.values())
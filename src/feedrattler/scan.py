@@ -0,0 +1,283 @@
+import base64
+import dataclasses
+import json
+import logging
+import os
+import pathlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Optional, Union
+
+from github import Github, UnknownObjectException
+
+from .detect import FeedstockFormat
+from .github_client import GitHubClient
+from .recipe import is_multi_output, is_noarch_python
+from .utils import default_cache_dir
+
+logger = logging.getLogger(__name__)
+
+RECIPE_FILES = {FeedstockFormat.v1: "recipe.yaml", FeedstockFormat.v0: "meta.yaml"}
+
+
+@dataclass
+class FeedstockScan:
+    """
+    The properties of a feedstock that the conversion fixes depend on.
+
+    Args:
+        feedstock_name: The name of the feedstock repository.
+        format: The recipe format, `missing` when the feedstock has no recipe.
+        has_bld_bat: Whether the recipe has a `bld.bat` script.
+        noarch_python: Whether the recipe, or one of its outputs, is a `noarch: python` package.
+        multi_output: Whether the recipe defines several outputs.
+        pushed_at: The time of the last push to the repository reported by GitHub.
+    """
+
+    feedstock_name: str
+    format: FeedstockFormat
+    has_bld_bat: bool = False
+    noarch_python: bool = False
+    multi_output: bool = False
+    pushed_at: Optional[str] = None
+
+
+class ScanCache:
+    """
+    An on-disk cache of the previous scans of the feedstocks of an owner, with the validators
+    used to only pay for the repositories that changed since:
+
+    - The pages of the repository listing and the `recipe/` directory listings are stored with
+      their ETag and revalidated with `If-None-Match`. Unchanged ones get a `304 Not Modified`
+      response that does not count against the rate limit.
+    - A feedstock whose `pushed_at` did not change is not requested at all.
+    - The recipe file is only downloaded again when its blob SHA changed.
+
+    Args:
+        cache_dir: The directory holding the scans. Defaults to `scans` in the feedrattler cache dir.
+    """
+
+    def __init__(self, cache_dir: Optional[os.PathLike] = None):
+        self.cache_dir = pathlib.Path(cache_dir) if cache_dir is not None else default_cache_dir() / "scans"
+
+    def path(self, owner: str) -> pathlib.Path:
+        return self.cache_dir / f"{owner}.json"
+
+    def load(self, owner: str) -> dict[str, Any]:
+        path = self.path(owner)
+        if not path.exists():
+            return {"pages": {}, "feedstocks": {}}
+        return json.loads(path.read_text())
+
+    def save(self, owner: str, data: dict[str, Any]):
+        path = self.path(owner)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data))
+        tmp_path.rename(path)
+
+
+def _conditional_get(
+    gh: Github, url: str, etag: Optional[str] = None, parameters: Optional[dict[str, Any]] = None
+) -> tuple[Optional[str], Any]:
+    """
+    GET a REST API URL, with `If-None-Match` when an ETag is given.
+
+    Returns:
+        The ETag of the response and its data, `None` if not modified since `etag`.
+    """
+
+    headers = {"If-None-Match": etag} if etag is not None else None
+    response_headers, data = gh.requester.requestJsonAndCheck(
+        "GET", url, parameters=parameters, headers=headers
+    )
+    return response_headers.get("etag", etag), data
+
+
+def _list_recipe_dir(gh: Github, owner: str, feedstock_name: str, etag: Optional[str]):
+    try:
+        return _conditional_get(gh, f"/repos/{owner}/{feedstock_name}/contents/recipe", etag)
+    except UnknownObjectException:
+        return None, []
+
+
+def _get_recipe_text(gh: Github, owner: str, feedstock_name: str, recipe_file: str) -> str:
+    _, data = _conditional_get(gh, f"/repos/{owner}/{feedstock_name}/contents/recipe/{recipe_file}")
+    return base64.b64decode(data["content"]).decode()
+
+
+def list_feedstocks(
+    gh: Union[Github, GitHubClient],
+    owner: str = "conda-forge",
+    pages: Optional[dict[str, Any]] = None,
+    per_page: int = 100,
+) -> dict[str, Optional[str]]:
+    """
+    List the feedstock repositories of an owner that are not archived.
+
+    Args:
+        gh: The GitHub client.
+        owner: The organization owning the feedstocks.
+        pages: The cached pages of a previous listing by page number, revalidated with their ETag
+            and updated in place.
+        per_page: The number of repositories per page.
+
+    Returns:
+        The `pushed_at` time of each feedstock by name.
+    """
+
+    client = GitHubClient.wrap(gh)
+    pages = pages if pages is not None else {}
+    feedstocks = {}
+
+    page = 1
+    while True:
+        cached = pages.get(str(page))
+        etag, data = client.call(
+            "scan_list",
+            _conditional_get,
+            f"/orgs/{owner}/repos",
+            cached["etag"] if cached is not None else None,
+            parameters={"type": "public", "sort": "full_name", "per_page": per_page, "page": page},
+        )
+        if data is None:
+            repositories = cached["repositories"]
+        else:
+            repositories = [
+                {"name": repo["name"], "pushed_at": repo["pushed_at"], "archived": repo["archived"]}
+                for repo in data
+            ]
+            pages[str(page)] = {"etag": etag, "repositories": repositories}
+
+        for repo in repositories:
+            if repo["name"].endswith("-feedstock") and not repo["archived"]:
+                feedstocks[repo["name"]] = repo["pushed_at"]
+
+        if len(repositories) < per_page:
+            break
+        page += 1
+
+    # Drop the pages after the last one from a previous listing of more repositories
+    for stale_page in [key for key in pages if int(key) > page]:
+        del pages[stale_page]
+
+    return feedstocks
+
+
+def scan_feedstocks(
+    gh: Union[Github, GitHubClient],
+    owner: str = "conda-forge",
+    cache: Optional[ScanCache] = None,
+) -> list[FeedstockScan]:
+    """
+    Scan all the feedstocks of an owner to triage a conversion campaign.
+
+    Every feedstock is reported with its recipe format and whether it has a `bld.bat`, is
+    `noarch: python` or is multi-output, the cases handled by the recipe fixes. The scan only
+    uses the REST API and, with a cache, only the repositories that changed since the previous
+    scan cost rate limit budget, see `ScanCache`.
+
+    Args:
+        gh: The GitHub client. The requests of the scan are issued concurrently with it.
+        owner: The organization owning the feedstocks.
+        cache: The cache of the previous scans. Every scan starts from scratch if not set.
+
+    Returns:
+        The scan of every feedstock, sorted by name.
+    """
+
+    client = GitHubClient.wrap(gh)
+    data = cache.load(owner) if cache is not None else {"pages": {}, "feedstocks": {}}
+    entries = data["feedstocks"]
+    stats = Counter()
+
+    try:
+        logger.info(f"📡 Listing the feedstocks of {owner}")
+        feedstocks = list_feedstocks(client, owner, pages=data["pages"])
+        for feedstock_name in set(entries) - set(feedstocks):
+            del entries[feedstock_name]
+
+        # Revalidate the `recipe/` directory of the feedstocks pushed to since the previous scan
+        changed = {
+            name: client.submit(
+                "scan_recipe_dir",
+                _list_recipe_dir,
+                owner,
+                name,
+                entries[name]["recipe_dir_etag"] if name in entries else None,
+            )
+            for name, pushed_at in feedstocks.items()
+            if name not in entries or entries[name]["scan"]["pushed_at"] != pushed_at
+        }
+        stats["unchanged"] = len(feedstocks) - len(changed)
+        logger.info(f"🔍 Scanning {len(changed)} new or updated feedstocks out of {len(feedstocks)}")
+
+        # Entries are only updated once complete so an interrupted scan is resumed correctly
+        recipe_futures = {}
+        for name, future in changed.items():
+            etag, listing = future.result()
+            pushed_at = feedstocks[name]
+            if listing is None:
+                stats["not_modified"] += 1
+                entries[name]["scan"]["pushed_at"] = pushed_at
+                continue
+
+            files = {item["name"]: item["sha"] for item in listing if item["type"] == "file"}
+            scan = FeedstockScan(
+                feedstock_name=name,
+                format=FeedstockFormat.missing,
+                has_bld_bat="bld.bat" in files,
+                pushed_at=pushed_at,
+            )
+            recipe_sha = None
+            for feedstock_format, recipe_file in RECIPE_FILES.items():
+                if recipe_file in files:
+                    scan.format, recipe_sha = feedstock_format, files[recipe_file]
+                    break
+
+            previous = entries.get(name)
+            if recipe_sha is not None and previous is not None and previous["recipe_sha"] == recipe_sha:
+                scan.noarch_python = previous["scan"]["noarch_python"]
+                scan.multi_output = previous["scan"]["multi_output"]
+            elif recipe_sha is not None:
+                future = client.submit(
+                    "scan_recipe", _get_recipe_text, owner, name, RECIPE_FILES[scan.format]
+                )
+                recipe_futures[name] = (future, scan, etag, recipe_sha)
+                continue
+
+            stats["listed"] += 1
+            entries[name] = {
+                "scan": dataclasses.asdict(scan),
+                "recipe_dir_etag": etag,
+                "recipe_sha": recipe_sha,
+            }
+
+        for name, (future, scan, etag, recipe_sha) in recipe_futures.items():
+            recipe_text = future.result()
+            scan.noarch_python = is_noarch_python(recipe_text)
+            scan.multi_output = is_multi_output(recipe_text)
+            stats["listed"] += 1
+            stats["recipes_fetched"] += 1
+            entries[name] = {
+                "scan": dataclasses.asdict(scan),
+                "recipe_dir_etag": etag,
+                "recipe_sha": recipe_sha,
+            }
+    finally:
+        if client is not gh:
+            client.close()
+        # Keep the progress of an interrupted scan
+        if cache is not None:
+            cache.save(owner, data)
+
+    logger.info(
+        f"📡 Scanned {len(feedstocks)} feedstocks: {stats['unchanged']} unchanged, "
+        f"{stats['not_modified']} not modified, {stats['listed']} listed and "
+        f"{stats['recipes_fetched']} recipes fetched"
+    )
+
+    return [
+        FeedstockScan(**{**entries[name]["scan"], "format": FeedstockFormat(entries[name]["scan"]["format"])})
+        for name in sorted(feedstocks)
+    ]
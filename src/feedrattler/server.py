@@ -0,0 +1,220 @@
+import dataclasses
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Union
+
+from github import Github
+
+from .batch import FeedstockResult, convert_one
+from .github_client import GitHubClient
+from .rerender import RerenderPool
+from .results import ResultStore
+from .utils import default_cache_dir
+from .workspace import WorkspaceManager
+
+logger = logging.getLogger(__name__)
+
+# The `convert_feedstock_to_v1` arguments a job can set
+JOB_OPTIONS = frozenset(
+    {
+        "use_pixi",
+        "git_rev",
+        "branch_name",
+        "do_rerender",
+        "draft_pr",
+        "clone_depth",
+        "clone_filter",
+        "clone_single_branch",
+        "rerender_timeout",
+        "save_rerender_logs",
+        "resume",
+        "on_existing",
+    }
+)
+
+
+class Spool:
+    """
+    A spool directory used as a local job queue between `submit` and a running server.
+
+    Jobs are JSON files moved from `incoming/` to `running/` when a server claims them and
+    their result is written to `done/`. Renames are atomic so a job is never claimed twice.
+
+    Args:
+        spool_dir: The spool directory. Defaults to `spool` in the feedrattler cache dir.
+    """
+
+    def __init__(self, spool_dir: Optional[os.PathLike] = None):
+        self.spool_dir = pathlib.Path(spool_dir) if spool_dir is not None else default_cache_dir() / "spool"
+        for state in ("incoming", "running", "done"):
+            (self.spool_dir / state).mkdir(parents=True, exist_ok=True)
+
+    def path(self, state: str, job_id: str) -> pathlib.Path:
+        return self.spool_dir / state / f"{job_id}.json"
+
+    def _write(self, path: pathlib.Path, data: dict):
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, indent=2))
+        tmp_path.rename(path)
+
+    def submit(self, feedstock_name: str, github_username: Optional[str] = None, **options) -> str:
+        """
+        Queue the conversion of a feedstock.
+
+        Args:
+            feedstock_name: The name of the feedstock repository.
+            github_username: The GitHub username owning the fork. Defaults to the server user.
+            **options: `convert_feedstock_to_v1` arguments, see `JOB_OPTIONS`.
+
+        Returns:
+            The job id.
+        """
+
+        if unknown_options := set(options) - JOB_OPTIONS:
+            raise ValueError(f"❗ Unsupported job options: {sorted(unknown_options)}")
+
+        # Job ids sort in submission order
+        job_id = f"{time.time_ns()}-{feedstock_name}"
+        self._write(
+            self.path("incoming", job_id),
+            {"feedstock_name": feedstock_name, "github_username": github_username, "options": options},
+        )
+        return job_id
+
+    def claim(self) -> Optional[tuple[str, dict]]:
+        """Claim the oldest queued job, if any."""
+
+        for path in sorted((self.spool_dir / "incoming").glob("*.json")):
+            job_id = path.stem
+            try:
+                path.rename(self.path("running", job_id))
+            except FileNotFoundError:
+                # Claimed by another server
+                continue
+            return job_id, json.loads(self.path("running", job_id).read_text())
+        return None
+
+    def complete(self, job_id: str, result: FeedstockResult):
+        self._write(self.path("done", job_id), dataclasses.asdict(result))
+        self.path("running", job_id).unlink(missing_ok=True)
+
+    def result(self, job_id: str) -> Optional[FeedstockResult]:
+        """The result of a job, `None` while it is not done."""
+
+        path = self.path("done", job_id)
+        if not path.exists():
+            return None
+        return FeedstockResult.from_dict(json.loads(path.read_text()))
+
+    def recover(self) -> int:
+        """
+        Queue again the jobs left running by a server that did not exit cleanly.
+
+        Only call it when no other server is using the spool.
+        """
+
+        paths = list((self.spool_dir / "running").glob("*.json"))
+        for path in paths:
+            path.rename(self.path("incoming", path.stem))
+        return len(paths)
+
+
+def serve(
+    gh: Union[Github, GitHubClient],
+    github_username: str,
+    spool: Spool,
+    max_workers: int = 4,
+    rerender_workers: Optional[int] = None,
+    rerender_timeout: Optional[float] = 900.0,
+    poll_interval: float = 1.0,
+    workspace_dir: Optional[str] = None,
+    keep_failed: bool = False,
+    workspace_quota: Optional[int] = None,
+    tmpfs: bool = False,
+    stop_event: Optional[threading.Event] = None,
+    result_store: Optional[ResultStore] = None,
+    **convert_kwargs,
+):
+    """
+    Run a long-lived conversion server processing the jobs of a spool directory.
+
+    The server keeps everything that is identical from one conversion to the next: the heavy
+    modules are imported once, the GitHub client keeps its pooled connections and rate limit
+    budget, and rerenders run in warm workers with conda-smithy and the conda-forge pinning
+    preloaded. Restart the server to pick up a new pinning.
+
+    Args:
+        gh: The GitHub client, shared by all jobs.
+        github_username: The GitHub username owning the forks, unless a job sets its own.
+        spool: The spool directory to take jobs from.
+        max_workers: The maximum number of feedstocks converted concurrently.
+        rerender_workers: The number of warm rerender workers. Defaults to the number of CPUs.
+        rerender_timeout: The timeout of a rerender in seconds.
+        poll_interval: The time in seconds between two checks for new jobs.
+        workspace_dir: A directory in which each feedstock is cloned to `<workspace_dir>/<feedstock_name>`.
+            A temporary dir is used if not set.
+        keep_failed: Keep the workspaces of the failed jobs.
+        workspace_quota: The maximum total size in bytes of the workspaces.
+        tmpfs: Create the temporary workspace dir on a RAM-backed filesystem.
+        stop_event: Stop taking new jobs once set. The running jobs are completed before returning.
+        result_store: Append the result of every job to this store.
+        **convert_kwargs: Extra arguments forwarded to `convert_feedstock_to_v1` for every job.
+    """
+
+    client = GitHubClient.wrap(gh)
+    stop_event = stop_event if stop_event is not None else threading.Event()
+
+    if n_recovered := spool.recover():
+        logger.info(f"♻️ Queued again {n_recovered} jobs left running by a previous server")
+
+    def run_job(job_id: str, job: dict):
+        result = convert_one(
+            client,
+            job["feedstock_name"],
+            workspaces,
+            # A job can be retried in the same workspace
+            True,
+            github_username=job["github_username"] or github_username,
+            rerender_pool=rerender_pool,
+            **{**convert_kwargs, **job["options"]},
+        )
+        if result_store is not None:
+            result = result_store.append(result)
+        spool.complete(job_id, result)
+        logger.info(f"🏁 Job {job_id}: {result.status.value} in {result.duration:.1f}s")
+
+    with (
+        WorkspaceManager(
+            workspace_dir, keep_failed=keep_failed, quota=workspace_quota, tmpfs=tmpfs
+        ) as workspaces,
+        RerenderPool(max_workers=rerender_workers, timeout=rerender_timeout, warm=True) as rerender_pool,
+        ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="feedrattler") as executor,
+    ):
+        start = time.perf_counter()
+        rerender_pool.warm_up(rerender_timeout)
+        logger.info(
+            f"🔥 Server ready in {time.perf_counter() - start:.1f}s, waiting for jobs in {spool.spool_dir}"
+        )
+
+        running: set[Future] = set()
+        while not stop_event.is_set():
+            running = {future for future in running if not future.done()}
+            # Only claim jobs when a worker is free so the queued jobs stay in `incoming/`
+            claimed = spool.claim() if len(running) < max_workers else None
+            if claimed is None:
+                stop_event.wait(poll_interval)
+                continue
+            job_id, job = claimed
+            logger.info(f"📥 Starting job {job_id}")
+            running.add(executor.submit(run_job, job_id, job))
+
+        logger.info(f"🛑 Stopping the server after {len(running)} running jobs")
+
+    client.log_latency_summary()
+    if client is not gh:
+        client.close()
@@ -1,16 +1,22 @@
 import logging
 import os
 import pathlib
+import random
 import re
 import shutil
 import subprocess
+import time
 from enum import Enum
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Optional, TypeVar
 
-import ruamel.yaml
+if TYPE_CHECKING:
+    # ruamel.yaml is imported by the functions using it so the CLI starts fast, see `feedrattler.cli`
+    import ruamel.yaml
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 class CloneType(str, Enum):
     auto = "auto"
@@ -18,7 +24,43 @@ class CloneType(str, Enum):
     https = "https"
 
 
+class ExistingPolicy(str, Enum):
+    """What to do when the conversion branch or PR of a feedstock already exists."""
+
+    # Skip the feedstock
+    skip = "skip"
+    # Convert again and overwrite the branch, updating the open PR
+    update = "update"
+    # Convert again, overwrite the branch, and replace the open PR with a new one
+    force = "force"
+
+
+def default_cache_dir() -> pathlib.Path:
+    """
+    The directory where feedrattler keeps its caches: `$FEEDRATTLER_CACHE_DIR`
+    if set, otherwise `feedrattler` in the user cache directory.
+    """
+
+    if cache_dir := os.getenv("FEEDRATTLER_CACHE_DIR"):
+        return pathlib.Path(cache_dir)
+    return pathlib.Path(os.getenv("XDG_CACHE_HOME", pathlib.Path.home() / ".cache")) / "feedrattler"
+
+
+def directory_size(path: os.PathLike) -> int:
+    """The total size in bytes of the files in a directory tree."""
+
+    size = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            file_path = os.path.join(root, file)
+            if not os.path.islink(file_path):
+                size += os.path.getsize(file_path)
+    return size
+
+
 def initialize_yaml():
+    import ruamel.yaml
+
     yaml = ruamel.yaml.YAML()
     yaml.indent(mapping=2, sequence=4, offset=2)
     yaml.width = 4096
@@ -40,9 +82,27 @@ def update_python_min_in_recipe(yaml_file_path: os.PathLike):
     with open(yaml_file_path, "r") as f:
         data = yaml.load(f)
 
+    if not update_python_min_in_recipe_data(data):
+        return
+
+    with open(yaml_file_path, "w") as f:
+        yaml.dump(data, f)
+
+
+def update_python_min_in_recipe_data(data: "ruamel.yaml.CommentedMap") -> bool:
+    """
+    In-memory version of `update_python_min_in_recipe`.
+
+    Args:
+        data: The recipe loaded with ruamel, updated in place.
+
+    Returns:
+        Whether the recipe is a `noarch: python` recipe and the fix has been applied.
+    """
+
     # Only proceed if build.noarch is set to python
     if data.get("build", {}).get("noarch", "") != "python":
-        return
+        return False
 
     logging.info("🔄 Updating `recipe.yaml` to use `${{ python_min }}.*`")
 
@@ -66,8 +126,7 @@ def update_python_min_in_recipe(yaml_file_path: os.PathLike):
         if "python" in test and "python_version" in test["python"]:
             test["python"]["python_version"] = replace_python_min(test["python"]["python_version"])
 
-    with open(yaml_file_path, "w") as f:
-        yaml.dump(data, f)
+    return True
 
 
 def update_python_version_in_tests(yaml_file_path: os.PathLike):
@@ -84,9 +143,29 @@ def update_python_version_in_tests(yaml_file_path: os.PathLike):
     with open(yaml_file_path, "r") as f:
         data = yaml.load(f)
 
+    if not update_python_version_in_tests_data(data):
+        return
+
+    with open(yaml_file_path, "w") as f:
+        yaml.dump(data, f)
+
+
+def update_python_version_in_tests_data(data: "ruamel.yaml.CommentedMap") -> bool:
+    """
+    In-memory version of `update_python_version_in_tests`.
+
+    Args:
+        data: The recipe loaded with ruamel, updated in place.
+
+    Returns:
+        Whether the recipe is a `noarch: python` recipe and the fix has been applied.
+    """
+
+    import ruamel.yaml
+
     # Only proceed if build.noarch is set to python
     if data.get("build", {}).get("noarch", "") != "python":
-        return
+        return False
 
     logging.info("🔄 Updating `recipe.yaml` to add `python_min` to tests[].python")
 
@@ -110,8 +189,7 @@ def update_python_version_in_tests(yaml_file_path: os.PathLike):
                 if "python_version" not in python_section:
                     python_section["python_version"] = r"${{ python_min }}.*"
 
-    with open(yaml_file_path, "w") as f:
-        yaml.dump(data, f)
+    return True
 
 
 def token_from_gh_cli(github_username: Optional[str]) -> Optional[str]:
@@ -178,9 +256,21 @@ def remove_empty_script_test(yaml_file_path: os.PathLike):
     with open(yaml_file_path, "r") as f:
         data = yaml.load(f)
 
+    if not remove_empty_script_test_data(data):
+        return
+
+    with open(yaml_file_path, "w") as f:
+        yaml.dump(data, f)
+
+
+def remove_empty_script_test_data(data: "ruamel.yaml.CommentedMap") -> bool:
+    """In-memory version of `remove_empty_script_test`."""
+
+    import ruamel.yaml
+
     # Only proceed if build.noarch is set to python
     if data.get("build", {}).get("noarch", "") != "python":
-        return
+        return False
 
     logging.info("🔄 Remove empty script test section if needed")
 
@@ -202,19 +292,18 @@ def remove_empty_script_test(yaml_file_path: os.PathLike):
             if "script" not in test_element:
                 tests_section.remove(test_element)
 
-    with open(yaml_file_path, "w") as f:
-        yaml.dump(data, f)
+    return True
 
 
-def rename_bld_bat_to_build_bat(yaml_file_path: os.PathLike):
-    """If present, rename bld.bat to build.bat"""
+def rename_bld_bat_to_build_bat(yaml_file_path: os.PathLike) -> bool:
+    """If present, rename bld.bat to build.bat. Returns whether it was renamed."""
 
     yaml_file_path = pathlib.Path(yaml_file_path).resolve()
     yaml_file_folder = yaml_file_path.parent
     candidate_bld_bat_path = yaml_file_folder / "bld.bat"
 
     if not candidate_bld_bat_path.exists():
-        return
+        return False
 
     build_bat_path = yaml_file_folder / "build.bat"
 
@@ -227,3 +316,58 @@ def rename_bld_bat_to_build_bat(yaml_file_path: os.PathLike):
     logging.info("🔄 Renaming `bld.bat` script to `build.bat`")
 
     candidate_bld_bat_path.rename(build_bat_path)
+    return True
+
+
+def wait_until(
+    check: Callable[[], Optional[T]],
+    description: str,
+    timeout: float = 60.0,
+    initial_delay: float = 0.5,
+    max_delay: float = 8.0,
+    factor: float = 2.0,
+    jitter: float = 0.25,
+) -> tuple[T, float]:
+    """
+    Poll `check` with an exponential backoff until it returns a truthy value.
+
+    The first check happens immediately, so nothing is waited for if the resource is
+    already ready.
+
+    Args:
+        check: A function returning a truthy value once the awaited resource is ready.
+        description: What is being waited for, used in the log messages.
+        timeout: The overall deadline in seconds.
+        initial_delay: The delay in seconds before the second check.
+        max_delay: The maximum delay in seconds between two checks.
+        factor: The multiplier applied to the delay after each check.
+        jitter: The relative random jitter applied to each delay, e.g. 0.25 for +/-25%.
+
+    Returns:
+        The value returned by `check` and the time waited in seconds.
+    """
+
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = initial_delay
+    attempt = 1
+
+    while True:
+        value = check()
+        elapsed = time.monotonic() - start
+        if value:
+            if attempt > 1:
+                logger.info(f"✅ {description} ready after {elapsed:.1f}s ({attempt} attempts)")
+            return value, elapsed
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise Exception(
+                f"❗ Timed out after {elapsed:.1f}s ({attempt} attempts) waiting for {description}"
+            )
+
+        sleep = min(delay * random.uniform(1 - jitter, 1 + jitter), max_delay, remaining)
+        logger.info(f"⏳ Waiting for {description}... attempt {attempt}, next check in {sleep:.1f}s")
+        time.sleep(sleep)
+        delay = min(delay * factor, max_delay)
+        attempt += 1
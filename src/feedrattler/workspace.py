@@ -0,0 +1,163 @@
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from .utils import directory_size
+
+logger = logging.getLogger(__name__)
+
+
+class WorkspaceManager:
+    """
+    Owns the per-feedstock workspaces, the directories in which the feedstocks are cloned,
+    converted and rerendered.
+
+    A workspace is removed once its conversion is done, whether it succeeded or failed, unless
+    `keep_failed` is set to inspect or resume the failed conversions. The total size of the
+    workspaces can be bounded with `quota`: the kept workspaces are evicted, oldest first, to
+    make room for a new one, and a new workspace waits for the running conversions to complete
+    while the quota is still exceeded. The quota is only checked when a workspace is acquired,
+    a running conversion is never interrupted.
+
+    The root may hold other directories, e.g. with a user-supplied `--workspace-dir`. Only the
+    workspaces created by a `WorkspaceManager`, marked by a `<feedstock_name>.feedrattler-workspace`
+    file next to them, are counted in the quota and evicted.
+
+    Args:
+        root: The directory holding the workspaces at `<root>/<feedstock_name>`. A temporary
+            directory, removed on close unless it holds kept workspaces, is used if not set.
+        keep_failed: Keep the workspaces of the failed conversions.
+        quota: The maximum total size in bytes of the workspaces.
+        tmpfs: Create the temporary root on the RAM-backed filesystem at `/dev/shm` for faster
+            git and rerender I/O. Memory is limited, consider setting a `quota`.
+    """
+
+    TMPFS_DIR = "/dev/shm"
+    MARKER_SUFFIX = ".feedrattler-workspace"
+
+    def __init__(
+        self,
+        root: Optional[os.PathLike] = None,
+        keep_failed: bool = False,
+        quota: Optional[int] = None,
+        tmpfs: bool = False,
+    ):
+        self.owned = root is None
+        if root is None:
+            tmp_dir = None
+            if tmpfs:
+                if not os.path.isdir(self.TMPFS_DIR):
+                    raise Exception(f"❗ No RAM-backed filesystem at {self.TMPFS_DIR}")
+                tmp_dir = self.TMPFS_DIR
+            root = tempfile.mkdtemp(prefix="feedrattler-", dir=tmp_dir)
+        elif tmpfs:
+            raise Exception("❗ tmpfs workspaces are temporary, mount a tmpfs on the workspace dir instead")
+
+        self.root = pathlib.Path(root)
+        self.keep_failed = keep_failed
+        self.quota = quota
+        self._condition = threading.Condition()
+        self._active: set[str] = set()
+
+    def __enter__(self) -> "WorkspaceManager":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def path(self, feedstock_name: str) -> pathlib.Path:
+        return self.root / feedstock_name
+
+    def _marker(self, feedstock_name: str) -> pathlib.Path:
+        return self.root / f"{feedstock_name}{self.MARKER_SUFFIX}"
+
+    def _workspaces(self) -> list[pathlib.Path]:
+        if not self.root.exists():
+            return []
+        return [
+            self.path(marker.name.removesuffix(self.MARKER_SUFFIX))
+            for marker in self.root.glob(f"*{self.MARKER_SUFFIX}")
+            if self.path(marker.name.removesuffix(self.MARKER_SUFFIX)).is_dir()
+        ]
+
+    def kept(self) -> list[pathlib.Path]:
+        """The workspaces not in use, oldest first."""
+
+        paths = [path for path in self._workspaces() if path.name not in self._active]
+        return sorted(paths, key=lambda path: path.stat().st_mtime)
+
+    def usage(self) -> int:
+        """The total size in bytes of the workspaces."""
+
+        return sum(directory_size(path) for path in self._workspaces())
+
+    def _make_room(self, feedstock_name: str) -> bool:
+        # Evict the kept workspaces until the quota is met, but the one about to be reused
+        total_size = self.usage()
+        for path in self.kept():
+            if total_size < self.quota:
+                break
+            if path.name == feedstock_name:
+                continue
+            size = directory_size(path)
+            logger.info(f"🗑️ Evicting the workspace {path} ({size / 2**20:.1f} MiB)")
+            shutil.rmtree(path)
+            self._marker(path.name).unlink(missing_ok=True)
+            total_size -= size
+        return total_size < self.quota
+
+    @contextmanager
+    def workspace(self, feedstock_name: str) -> Iterator[pathlib.Path]:
+        """
+        Acquire the workspace of a feedstock for the duration of its conversion.
+
+        The workspace directory is not created, the conversion clones into it. A workspace kept
+        by a previous conversion of the feedstock is reused, e.g. to resume it.
+        """
+
+        with self._condition:
+            if feedstock_name in self._active:
+                raise Exception(f"❗ The workspace of {feedstock_name} is already in use")
+            if self.quota is not None:
+                # A conversion is always let through when none is running, even over the quota
+                while not self._make_room(feedstock_name) and self._active:
+                    logger.info(
+                        f"⏳ The workspace quota is exceeded, {feedstock_name} waits for a running conversion"
+                    )
+                    self._condition.wait()
+            self._active.add(feedstock_name)
+
+        path = self.path(feedstock_name)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._marker(feedstock_name).touch()
+        failed = True
+        try:
+            yield path
+            failed = False
+        finally:
+            try:
+                if failed and self.keep_failed and path.exists():
+                    logger.info(f"📁 Keeping the workspace of {feedstock_name} at {path}")
+                else:
+                    if path.exists():
+                        shutil.rmtree(path)
+                    self._marker(feedstock_name).unlink(missing_ok=True)
+            finally:
+                with self._condition:
+                    self._active.discard(feedstock_name)
+                    self._condition.notify_all()
+
+    def close(self):
+        """Remove the temporary root, unless it holds kept workspaces."""
+
+        if not self.owned or not self.root.exists():
+            return
+        if kept := self.kept():
+            logger.info(f"📁 {len(kept)} failed workspaces are kept in {self.root}")
+        else:
+            shutil.rmtree(self.root)
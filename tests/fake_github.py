@@ -0,0 +1,543 @@
+"""
+A local stand-in for GitHub to run conversions end to end offline.
+
+`FakeGitHub` serves the subset of the GitHub REST API used by feedrattler (repositories,
+contents, branches, forks and pull requests) over HTTP, backed by local bare git repositories
+that are used as the origin and fork remotes of the conversions. `generate_corpus` creates
+feedstocks of the common recipe shapes to load it.
+"""
+
+import base64
+import json
+import pathlib
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+from git import GitCommandError, Repo
+from github import Github
+
+from feedrattler.github_client import GitHubClient
+
+GIT_IDENTITY = {
+    "GIT_AUTHOR_NAME": "feedrattler",
+    "GIT_AUTHOR_EMAIL": "feedrattler@example.com",
+    "GIT_COMMITTER_NAME": "feedrattler",
+    "GIT_COMMITTER_EMAIL": "feedrattler@example.com",
+}
+
+CONDA_FORGE_YML = """\
+github:
+  branch_name: main
+  tooling_branch_name: main
+conda_forge_output_validation: true
+"""
+
+SIMPLE_META_YAML = """\
+{{% set name = "{name}" %}}
+{{% set version = "1.{index}.0" %}}
+
+package:
+  name: {{{{ name|lower }}}}
+  version: {{{{ version }}}}
+
+source:
+  url: https://example.com/{{{{ name }}}}-{{{{ version }}}}.tar.gz
+  sha256: {sha256}
+
+build:
+  number: 0
+
+requirements:
+  build:
+    - {{{{ compiler('c') }}}}
+    - {{{{ stdlib('c') }}}}
+    - make
+  host:
+    - zlib
+  run:
+    - zlib
+
+test:
+  commands:
+    - {name} --version
+
+about:
+  home: https://example.com/{{{{ name }}}}
+  license: MIT
+  license_file: LICENSE
+  summary: A compiled package
+
+extra:
+  recipe-maintainers:
+    - feedrattler
+"""
+
+NOARCH_PYTHON_META_YAML = """\
+{{% set name = "{name}" %}}
+{{% set version = "2.{index}.0" %}}
+
+package:
+  name: {{{{ name|lower }}}}
+  version: {{{{ version }}}}
+
+source:
+  url: https://pypi.org/packages/source/{{{{ name[0] }}}}/{{{{ name }}}}/{{{{ name }}}}-{{{{ version }}}}.tar.gz
+  sha256: {sha256}
+
+build:
+  number: 1
+  noarch: python
+  script: {{{{ PYTHON }}}} -m pip install . -vv --no-deps --no-build-isolation
+
+requirements:
+  host:
+    - python {{{{ python_min }}}}
+    - pip
+    - setuptools
+  run:
+    - python >={{{{ python_min }}}}
+    - requests
+
+test:
+  imports:
+    - {module}
+  commands:
+    - pip check
+  requires:
+    - python {{{{ python_min }}}}
+    - pip
+
+about:
+  home: https://example.com/{{{{ name }}}}
+  license: BSD-3-Clause
+  license_file: LICENSE
+  summary: A pure Python package
+
+extra:
+  recipe-maintainers:
+    - feedrattler
+"""
+
+MULTI_OUTPUT_META_YAML = """\
+{{% set name = "{name}" %}}
+{{% set version = "3.{index}.0" %}}
+
+package:
+  name: {{{{ name }}}}-split
+  version: {{{{ version }}}}
+
+source:
+  url: https://example.com/{{{{ name }}}}-{{{{ version }}}}.tar.gz
+  sha256: {sha256}
+
+build:
+  number: 0
+
+outputs:
+  - name: lib{{{{ name }}}}
+    script: build.sh
+    requirements:
+      build:
+        - {{{{ compiler('c') }}}}
+        - {{{{ stdlib('c') }}}}
+      run_exports:
+        - {{{{ pin_subpackage('lib' ~ name, max_pin='x') }}}}
+    test:
+      commands:
+        - test -f $PREFIX/lib/lib{{{{ name }}}}.so
+  - name: {{{{ name }}}}
+    requirements:
+      host:
+        - {{{{ pin_subpackage('lib' ~ name, exact=True) }}}}
+      run:
+        - {{{{ pin_subpackage('lib' ~ name, exact=True) }}}}
+    test:
+      commands:
+        - {name} --help
+
+about:
+  home: https://example.com/{{{{ name }}}}
+  license: Apache-2.0
+  license_file: LICENSE
+  summary: A multi-output package
+
+extra:
+  recipe-maintainers:
+    - feedrattler
+"""
+
+RECIPE_SHAPES = {
+    "simple": SIMPLE_META_YAML,
+    "noarch_python": NOARCH_PYTHON_META_YAML,
+    "multi_output": MULTI_OUTPUT_META_YAML,
+}
+
+
+def generate_feedstock(name: str, shape: str, index: int = 0) -> dict[str, str]:
+    """The files of a v0 feedstock of the given recipe shape, by path."""
+
+    meta_yaml = RECIPE_SHAPES[shape].format(
+        name=name,
+        module=name.replace("-", "_"),
+        index=index,
+        sha256=f"{index:064x}",
+    )
+    files = {
+        "README.md": f"About {name}-feedstock\n",
+        "LICENSE.txt": "BSD-3-Clause\n",
+        "conda-forge.yml": CONDA_FORGE_YML,
+        "recipe/meta.yaml": meta_yaml,
+        "recipe/LICENSE": "MIT\n",
+    }
+    if shape != "noarch_python":
+        files["recipe/build.sh"] = "#!/bin/bash\nmake install PREFIX=$PREFIX\n"
+        files["recipe/bld.bat"] = "nmake install\nif errorlevel 1 exit 1\n"
+    return files
+
+
+def generate_corpus(n: int) -> dict[str, dict[str, str]]:
+    """`n` feedstocks cycling through the recipe shapes, by feedstock name."""
+
+    shapes = list(RECIPE_SHAPES)
+    corpus = {}
+    for index in range(n):
+        name = f"pkg{index:04d}"
+        corpus[f"{name}-feedstock"] = generate_feedstock(name, shapes[index % len(shapes)], index)
+    return corpus
+
+
+def _commit_files(work_repo: Repo, files: dict[str, str], message: str) -> str:
+    for path, content in files.items():
+        file_path = pathlib.Path(work_repo.working_dir) / path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content)
+    work_repo.git.add(".")
+    work_repo.git.commit("-m", message, env=GIT_IDENTITY)
+    return work_repo.head.commit.hexsha
+
+
+class _NotFound(Exception):
+    pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-RateLimit-Limit", "5000")
+        self.send_header("X-RateLimit-Remaining", "4999")
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method: str):
+        github = self.server.github
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        data = json.loads(self.rfile.read(length)) if length else {}
+
+        with github.lock:
+            github.requests.append((method, url.path))
+        if github.latency:
+            time.sleep(github.latency)
+
+        try:
+            for route_method, pattern, route in github.routes:
+                if route_method == method and (match := re.fullmatch(pattern, url.path)):
+                    status, response = route(*map(unquote, match.groups()), query=query, data=data)
+                    return self._send(status, response)
+            raise _NotFound()
+        except _NotFound:
+            self._send(404, {"message": "Not Found"})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    github: "FakeGitHub"
+
+
+class FakeGitHub:
+    """
+    A local GitHub serving the REST API used by feedrattler, with bare git repositories at
+    `<root>/<owner>/<name>.git` as remotes.
+
+    Forks are created synchronously for `username` and pull requests are only kept in memory.
+    Use it as a context manager to start and stop the server.
+
+    Args:
+        username: The authenticated user, owning the forks.
+        root: The directory holding the bare repositories. A temporary dir is used if not set.
+        latency: A delay in seconds added to every API response to emulate the network.
+    """
+
+    def __init__(self, username: str = "gh-user", root: Optional[str] = None, latency: float = 0.0):
+        self.username = username
+        self.root = pathlib.Path(root if root is not None else tempfile.mkdtemp(prefix="fake-github-"))
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests: list[tuple[str, str]] = []
+        self.pulls: dict[str, list[dict]] = {}
+        self.comments: dict[str, list[str]] = {}
+
+        repo = r"/repos/([^/]+)/([^/]+)"
+        self.routes = [
+            ("GET", repo, self._get_repo),
+            ("GET", repo + r"/contents/?(.*)", self._get_contents),
+            ("GET", repo + r"/branches/(.+)", self._get_branch),
+            ("POST", repo + r"/forks", self._create_fork),
+            ("POST", repo + r"/merge-upstream", self._merge_upstream),
+            ("GET", repo + r"/pulls", self._get_pulls),
+            ("POST", repo + r"/pulls", self._create_pull),
+            ("GET", repo + r"/pulls/(\d+)", self._get_pull),
+            ("GET", repo + r"/pulls/(\d+)/files", self._get_pull_files),
+            ("PATCH", repo + r"/pulls/(\d+)", self._edit_pull),
+            ("POST", repo + r"/issues/(\d+)/comments", self._create_comment),
+        ]
+        self._server: Optional[_Server] = None
+
+    def __enter__(self) -> "FakeGitHub":
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.github = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def client(self, **kwargs) -> GitHubClient:
+        """A `GitHubClient` talking to the fake GitHub."""
+
+        # The fake GitHub has no secondary rate limit, PyGithub does not need to space the requests out
+        gh = Github(
+            base_url=self.base_url, retry=None, seconds_between_requests=None, seconds_between_writes=None
+        )
+        return GitHubClient(gh, **kwargs)
+
+    def repo_path(self, owner: str, name: str) -> pathlib.Path:
+        return self.root / owner / f"{name}.git"
+
+    def add_repo(self, name: str, files: dict[str, str], owner: str = "conda-forge") -> Repo:
+        """Create a bare repository with a single commit of `files` on `main`."""
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            work_repo = Repo.init(work_dir, initial_branch="main")
+            _commit_files(work_repo, files, "Initial commit")
+            return Repo.clone_from(work_dir, self.repo_path(owner, name), bare=True)
+
+    def push_commit(self, name: str, files: dict[str, str], owner: str = "conda-forge") -> str:
+        """Push a commit of `files` on top of `main`, e.g. to make the forks stale."""
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            work_repo = Repo.clone_from(self.repo_path(owner, name), work_dir)
+            sha = _commit_files(work_repo, files, "Update")
+            work_repo.remotes.origin.push("main").raise_if_error()
+            return sha
+
+    def pull_requests(self, name: str, owner: str = "conda-forge") -> list[dict]:
+        with self.lock:
+            return list(self.pulls.get(f"{owner}/{name}", []))
+
+    def _repo(self, owner: str, name: str) -> Repo:
+        path = self.repo_path(owner, name)
+        if not path.exists():
+            raise _NotFound()
+        return Repo(path)
+
+    def _repo_json(self, owner: str, name: str) -> dict:
+        full_name = f"{owner}/{name}"
+        return {
+            "id": abs(hash(full_name)),
+            "name": name,
+            "full_name": full_name,
+            "owner": {"login": owner},
+            "fork": owner != "conda-forge",
+            "url": f"{self.base_url}/repos/{full_name}",
+            "html_url": f"https://github.com/{full_name}",
+            "clone_url": str(self.repo_path(owner, name)),
+            "ssh_url": str(self.repo_path(owner, name)),
+            "default_branch": "main",
+        }
+
+    def _get_repo(self, owner, name, query, data):
+        self._repo(owner, name)
+        return 200, self._repo_json(owner, name)
+
+    def _get_contents(self, owner, name, path, query, data):
+        repo = self._repo(owner, name)
+        ref = query.get("ref", "main")
+        try:
+            object_type = repo.git.cat_file("-t", f"{ref}:{path}")
+        except GitCommandError:
+            raise _NotFound()
+
+        def content_json(item_path: str, item_type: str, sha: str) -> dict:
+            return {
+                "type": "dir" if item_type == "tree" else "file",
+                "name": item_path.rsplit("/", 1)[-1],
+                "path": item_path,
+                "sha": sha,
+                "url": f"{self.base_url}/repos/{owner}/{name}/contents/{item_path}?ref={ref}",
+            }
+
+        if object_type == "tree":
+            listing = []
+            for line in repo.git.ls_tree(ref, *([f"{path}/"] if path else [])).splitlines():
+                info, item_path = line.split("\t", 1)
+                _, item_type, sha = info.split()
+                listing.append(content_json(item_path, item_type, sha))
+            return 200, listing
+
+        content = repo.git.cat_file("blob", f"{ref}:{path}", stdout_as_string=False)
+        return 200, {
+            **content_json(path, "blob", repo.git.rev_parse(f"{ref}:{path}")),
+            "encoding": "base64",
+            "content": base64.b64encode(content).decode(),
+        }
+
+    def _get_branch(self, owner, name, branch, query, data):
+        repo = self._repo(owner, name)
+        try:
+            sha = repo.git.rev_parse("--verify", f"refs/heads/{branch}")
+        except GitCommandError:
+            raise _NotFound()
+        return 200, {"name": branch, "commit": {"sha": sha}}
+
+    def _create_fork(self, owner, name, query, data):
+        repo = self._repo(owner, name)
+        fork_path = self.repo_path(self.username, name)
+        if not fork_path.exists():
+            repo.clone(fork_path, bare=True)
+        return 202, self._repo_json(self.username, name)
+
+    def _merge_upstream(self, owner, name, query, data):
+        fork = self._repo(owner, name)
+        branch = data["branch"]
+        before = fork.git.rev_parse(f"refs/heads/{branch}")
+        try:
+            # Fast-forward only, like GitHub without a merge commit
+            fork.git.fetch(
+                str(self.repo_path("conda-forge", name)), f"refs/heads/{branch}:refs/heads/{branch}"
+            )
+        except GitCommandError:
+            return 409, {"message": "There are merge conflicts"}
+        merged = fork.git.rev_parse(f"refs/heads/{branch}") != before
+        return 200, {
+            "message": "Successfully fetched and fast-forwarded from upstream"
+            if merged
+            else "This branch is not behind the upstream",
+            "merge_type": "fast-forward" if merged else "none",
+            "base_branch": f"conda-forge:{branch}",
+        }
+
+    def _pull_json(self, owner: str, name: str, number: int, pull: dict) -> dict:
+        return {
+            "number": number,
+            "url": f"{self.base_url}/repos/{owner}/{name}/pulls/{number}",
+            "issue_url": f"{self.base_url}/repos/{owner}/{name}/issues/{number}",
+            "html_url": f"https://github.com/{owner}/{name}/pull/{number}",
+            **pull,
+        }
+
+    def _get_pulls(self, owner, name, query, data):
+        self._repo(owner, name)
+        state = query.get("state", "open")
+        pulls = self.pull_requests(name, owner)
+        return 200, [pull for pull in pulls if state == "all" or pull["state"] == state]
+
+    def _create_pull(self, owner, name, query, data):
+        self._repo(owner, name)
+        head_owner, head_branch = data["head"].split(":", 1)
+        try:
+            self._get_branch(head_owner, name, head_branch, query, data)
+        except _NotFound:
+            return 422, {"message": "Validation Failed", "errors": [{"field": "head", "code": "invalid"}]}
+
+        with self.lock:
+            pulls = self.pulls.setdefault(f"{owner}/{name}", [])
+            pull = self._pull_json(
+                owner,
+                name,
+                len(pulls) + 1,
+                {
+                    "title": data["title"],
+                    "body": data["body"],
+                    "state": "open",
+                    "draft": data.get("draft", False),
+                    "user": {"login": head_owner},
+                    "head": {"label": data["head"], "ref": head_branch},
+                    "base": {"label": f"{owner}:{data['base']}", "ref": data["base"]},
+                },
+            )
+            pulls.append(pull)
+        return 201, pull
+
+    def _get_pull(self, owner, name, number, query, data):
+        with self.lock:
+            pulls = self.pulls.get(f"{owner}/{name}", [])
+            if int(number) > len(pulls):
+                raise _NotFound()
+            return 200, pulls[int(number) - 1]
+
+    def _get_pull_files(self, owner, name, number, query, data):
+        _, pull = self._get_pull(owner, name, number, query, data)
+        head_owner = pull["head"]["label"].split(":", 1)[0]
+
+        def blobs(repo: Repo, rev: str) -> dict[str, str]:
+            return {
+                item.path: item.hexsha for item in repo.commit(rev).tree.traverse() if item.type == "blob"
+            }
+
+        # Compare the trees since the head may come from an unrelated repository
+        base = blobs(self._repo(owner, name), pull["base"]["ref"])
+        head = blobs(self._repo(head_owner, name), pull["head"]["ref"])
+        files = [
+            {
+                "filename": path,
+                "status": "removed" if path not in head else "added" if path not in base else "modified",
+            }
+            for path in sorted(base.keys() | head.keys())
+            if base.get(path) != head.get(path)
+        ]
+        return 200, files
+
+    def _edit_pull(self, owner, name, number, query, data):
+        with self.lock:
+            pulls = self.pulls.get(f"{owner}/{name}", [])
+            if int(number) > len(pulls):
+                raise _NotFound()
+            pull = pulls[int(number) - 1]
+            pull.update({key: value for key, value in data.items() if key in ("title", "body", "state")})
+            return 200, pull
+
+    def _create_comment(self, owner, name, number, query, data):
+        with self.lock:
+            self.comments.setdefault(f"{owner}/{name}#{number}", []).append(data["body"])
+        return 201, {"id": 1, "body": data["body"]}
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+from feedrattler import batch
+from feedrattler.batch import BatchStatus, convert_one, read_feedstock_list
+from feedrattler.convert import FeedstockSkipped
+from feedrattler.github_client import GitHubClient
+from feedrattler.workspace import WorkspaceManager
+
+
+def test_read_feedstock_list(tmp_path):
+    feedstock_list = tmp_path / "feedstocks.txt"
+    feedstock_list.write_text(
+        """# campaign 1
+numpy-feedstock
+  scipy-feedstock  # trailing comment
+
+numpy-feedstock
+"""
+    )
+
+    assert read_feedstock_list(str(feedstock_list)) == ["numpy-feedstock", "scipy-feedstock"]
+
+
+def test_read_feedstock_list_stdin(monkeypatch):
+    import io
+
+    monkeypatch.setattr("sys.stdin", io.StringIO("a-feedstock\nb-feedstock\n"))
+
+    assert read_feedstock_list("-") == ["a-feedstock", "b-feedstock"]
+
+
+def test_convert_one_reports_skipped_feedstocks(monkeypatch, tmp_path):
+    def fake_convert(gh, feedstock_name, **kwargs):
+        if feedstock_name == "skipped-feedstock":
+            raise FeedstockSkipped("already has an open pull request")
+        raise Exception("boom")
+
+    monkeypatch.setattr(batch, "convert_feedstock_to_v1", fake_convert)
+
+    workspaces = WorkspaceManager(tmp_path)
+    skipped = convert_one(None, "skipped-feedstock", workspaces, False)
+    assert skipped.status == BatchStatus.skipped
+    assert skipped.message == "already has an open pull request"
+    assert skipped.failed_stage is None
+    assert convert_one(None, "failed-feedstock", workspaces, False).status == BatchStatus.failed
+
+
+def test_convert_feedstocks_closes_the_client_it_creates(monkeypatch, tmp_path):
+    closed = []
+    monkeypatch.setattr(GitHubClient, "close", lambda self: closed.append(self))
+    monkeypatch.setattr(batch, "convert_feedstock_to_v1", lambda gh, feedstock_name, **kwargs: None)
+
+    gh = SimpleNamespace(requester=SimpleNamespace(rate_limiting=(-1, -1), rate_limiting_resettime=0))
+    results = batch.convert_feedstocks_to_v1(
+        gh, ["a-feedstock"], "me", workspace_dir=str(tmp_path), do_rerender=False
+    )
+    assert [result.status for result in results] == [BatchStatus.success]
+    assert len(closed) == 1
+
+    # A client given by the caller is left open
+    client = GitHubClient(gh)
+    batch.convert_feedstocks_to_v1(
+        client, ["a-feedstock"], "me", workspace_dir=str(tmp_path), do_rerender=False
+    )
+    assert len(closed) == 1
@@ -0,0 +1,20 @@
+from feedrattler.checkpoint import Checkpoint, Step
+
+
+def test_checkpoint_round_trip(tmp_path):
+    assert Checkpoint.load(tmp_path) is None
+
+    checkpoint = Checkpoint(tmp_path / "workspace", {"use_pixi": True})
+    checkpoint.record(Step.clone, sha="base")
+    checkpoint.record(Step.commit, sha="converted")
+
+    loaded = Checkpoint.load(tmp_path / "workspace")
+    assert loaded.options == {"use_pixi": True}
+    assert loaded.done(Step.commit)
+    assert not loaded.done(Step.rerender)
+    assert loaded.last_sha() == "converted"
+
+    loaded.record(Step.rerender, sha="rerendered")
+    loaded.record(Step.push, sha="rerendered")
+    assert Checkpoint.load(tmp_path / "workspace").last_sha() == "rerendered"
+    assert list(Checkpoint.load(tmp_path / "workspace").steps) == ["clone", "commit", "rerender", "push"]
@@ -0,0 +1,54 @@
+import pytest
+
+from feedrattler.conversion_cache import ConversionCache, ConversionOutput
+
+
+@pytest.fixture
+def feedstock(tmp_path):
+    repo_dir = tmp_path / "foo-feedstock"
+    (repo_dir / "recipe").mkdir(parents=True)
+    (repo_dir / "recipe" / "meta.yaml").write_text("package:\n  name: foo\n")
+    (repo_dir / "recipe" / "bld.bat").write_text("pip install .\n")
+    (repo_dir / "conda-forge.yml").write_text("conda_forge_output_validation: true\n")
+    return repo_dir
+
+
+def test_key_depends_on_all_inputs(feedstock):
+    key = ConversionCache.key(feedstock, use_pixi=True)
+
+    assert ConversionCache.key(feedstock, use_pixi=True) == key
+    assert ConversionCache.key(feedstock, use_pixi=False) != key
+
+    for path in ("recipe/meta.yaml", "recipe/bld.bat", "conda-forge.yml"):
+        content = (feedstock / path).read_text()
+        (feedstock / path).write_text(content + "# changed\n")
+        assert ConversionCache.key(feedstock, use_pixi=True) != key
+        (feedstock / path).write_text(content)
+
+    (feedstock / "recipe" / "build.sh").write_text("make\n")
+    assert ConversionCache.key(feedstock, use_pixi=True) != key
+
+
+def test_cache_round_trip_and_apply(tmp_path, feedstock):
+    cache = ConversionCache(tmp_path / "cache")
+    key = ConversionCache.key(feedstock, use_pixi=True)
+    output = ConversionOutput(
+        recipe_yaml="schema_version: 1\n",
+        conda_forge_yml="conda_build_tool: rattler-build\n",
+        warnings="❗ Warning while converting",
+        renames=[("recipe/bld.bat", "recipe/build.bat")],
+        removed=["recipe/meta.yaml"],
+    )
+
+    assert cache.get(key) is None
+    cache.put(key, output)
+    assert cache.get(key) == output
+
+    cache.get(key).apply(feedstock)
+    assert sorted(path.name for path in (feedstock / "recipe").iterdir()) == ["build.bat", "recipe.yaml"]
+    assert (feedstock / "recipe" / "recipe.yaml").read_text() == "schema_version: 1\n"
+    assert (feedstock / "recipe" / "build.bat").read_text() == "pip install .\n"
+    assert (feedstock / "conda-forge.yml").read_text() == "conda_build_tool: rattler-build\n"
+
+    cache.clear()
+    assert cache.get(key) is None
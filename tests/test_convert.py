@@ -0,0 +1,54 @@
+import pytest
+
+from feedrattler.convert import (
+    RecipeConversion,
+    _convert_feedstock_files,
+    _precheck_recipe,
+    convert_recipe_text,
+)
+
+META_YAML = """\
+{% set name = "foo" %}
+package:
+  name: {{ name }}
+"""
+
+
+def test_convert_recipe_text_rejects_unsupported_jinja():
+    conversion = convert_recipe_text(META_YAML + "{% if win %}\n  skip: true\n{% endif %}\n")
+
+    assert not conversion.success
+    assert conversion.errors == [
+        "Unsupported Jinja statement: {% if win %}",
+        "Unsupported Jinja statement: {% endif %}",
+    ]
+
+
+@pytest.mark.parametrize(
+    "recipe_files, meta_yaml, error",
+    [
+        (["meta.yaml", "bld.bat", "build.bat"], META_YAML, "both `bld.bat` and `build.bat`"),
+        (["build.sh"], None, "no `recipe/meta.yaml`"),
+        (["meta.yaml"], META_YAML + "{% for x in xs %}\n{% endfor %}\n", "Unsupported Jinja statement"),
+    ],
+)
+def test_precheck_recipe_rejects_doomed_feedstocks(recipe_files, meta_yaml, error):
+    with pytest.raises(Exception, match=error):
+        _precheck_recipe("foo-feedstock", recipe_files, meta_yaml)
+
+
+def test_convert_feedstock_files_reuses_the_precheck_conversion(tmp_path):
+    (tmp_path / "recipe").mkdir()
+    (tmp_path / "recipe" / "meta.yaml").write_text(META_YAML)
+    (tmp_path / "conda-forge.yml").write_text("conda_forge_output_validation: true\n")
+    recipe_yaml = "schema_version: 1\npackage:\n  name: foo\nbuild:\n  number: 1\n"
+    conversion = RecipeConversion(recipe_yaml=recipe_yaml, warnings=["Unknown selector"])
+
+    # The recipe is not converted nor post-processed again
+    output = _convert_feedstock_files(tmp_path, use_pixi=True, meta_yaml=META_YAML, conversion=conversion)
+
+    assert output.recipe_yaml == recipe_yaml
+    assert (tmp_path / "recipe" / "recipe.yaml").read_text() == recipe_yaml
+    assert not (tmp_path / "recipe" / "meta.yaml").exists()
+    assert "Unknown selector" in output.warnings
+    assert "conda_install_tool: pixi" in output.conda_forge_yml
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from feedrattler.detect import FeedstockFormat, detect_feedstock_formats
+
+
+class FakeRequester:
+    graphql_url = "https://api.github.com/graphql"
+
+    def __init__(self, repositories):
+        self.repositories = repositories
+        self.queries = []
+
+    def requestJsonAndCheck(self, verb, url, input):
+        variables = input["variables"]
+        self.queries.append(variables)
+        data, errors = {}, []
+        for key, name in variables.items():
+            if not key.startswith("name"):
+                continue
+            alias = f"r{key.removeprefix('name')}"
+            if name in self.repositories:
+                files = self.repositories[name]
+                data[alias] = {
+                    "v1": {"__typename": "Blob"} if "recipe.yaml" in files else None,
+                    "v0": {"__typename": "Blob"} if "meta.yaml" in files else None,
+                }
+            else:
+                data[alias] = None
+                errors.append({"type": "NOT_FOUND", "path": [alias]})
+        return {}, {"data": data, "errors": errors}
+
+
+def test_detect_feedstock_formats():
+    requester = FakeRequester(
+        {
+            "a-feedstock": ["meta.yaml"],
+            "b-feedstock": ["recipe.yaml"],
+            "c-feedstock": [],
+        }
+    )
+    gh = SimpleNamespace(requester=requester)
+
+    formats = detect_feedstock_formats(
+        gh, ["a-feedstock", "b-feedstock", "c-feedstock", "d-feedstock"], batch_size=3
+    )
+
+    assert formats == {
+        "a-feedstock": FeedstockFormat.v0,
+        "b-feedstock": FeedstockFormat.v1,
+        "c-feedstock": FeedstockFormat.missing,
+        "d-feedstock": FeedstockFormat.missing,
+    }
+    assert len(requester.queries) == 2
+    assert requester.queries[0]["v1Path"] == "HEAD:recipe/recipe.yaml"
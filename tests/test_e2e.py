@@ -0,0 +1,204 @@
+import logging
+import os
+import time
+from collections import defaultdict
+
+import pytest
+from fake_github import GIT_IDENTITY, FakeGitHub, generate_corpus
+from git import Repo
+
+from feedrattler.batch import BatchStatus, convert_feedstocks_to_v1
+from feedrattler.convert import ConversionReport, FeedstockSkipped, convert_feedstock_to_v1
+from feedrattler.metrics import RunMetrics
+from feedrattler.results import ResultStore
+from feedrattler.utils import ExistingPolicy
+
+# The conversion itself needs conda-recipe-manager, the rerender is not part of these runs
+pytest.importorskip("conda_recipe_manager")
+
+logger = logging.getLogger(__name__)
+
+# The number of feedstocks of the load test, e.g. `FEEDRATTLER_E2E_FEEDSTOCKS=200`
+N_FEEDSTOCKS = int(os.getenv("FEEDRATTLER_E2E_FEEDSTOCKS", "12"))
+
+# The maximum wall time in seconds of each stage of a conversion in the load test
+STAGE_BUDGETS = {
+    "check": 5.0,
+    "preflight": 1.0,
+    "precheck": 2.0,
+    "clone": 5.0,
+    "convert": 5.0,
+    "commit": 2.0,
+    "fork": 5.0,
+    "push": 5.0,
+    "pull_request": 2.0,
+}
+
+
+@pytest.fixture
+def github(tmp_path, monkeypatch):
+    for name, value in GIT_IDENTITY.items():
+        monkeypatch.setenv(name, value)
+    with FakeGitHub(root=tmp_path / "github") as github:
+        yield github
+
+
+def test_convert_feedstock_end_to_end(github, tmp_path):
+    github.add_repo("pkg0000-feedstock", generate_corpus(1)["pkg0000-feedstock"])
+    records = []
+
+    report = convert_feedstock_to_v1(
+        github.client(),
+        "pkg0000-feedstock",
+        github.username,
+        do_rerender=False,
+        metrics=RunMetrics(hooks=[records.append]),
+    )
+
+    # The branch pushed to the fork only has the conversion changes
+    fork = Repo(github.repo_path(github.username, "pkg0000-feedstock"))
+    branch = "convert_feedstock_to_v1_recipe_format"
+    changed = fork.git.diff("--name-status", "--no-renames", "main", branch).splitlines()
+    assert sorted(changed) == [
+        "A\trecipe/build.bat",
+        "A\trecipe/recipe.yaml",
+        "D\trecipe/bld.bat",
+        "D\trecipe/meta.yaml",
+        "M\tconda-forge.yml",
+    ]
+    assert "conda_build_tool: rattler-build" in fork.git.show(f"{branch}:conda-forge.yml")
+
+    (pull,) = github.pull_requests("pkg0000-feedstock")
+    assert pull["head"]["label"] == f"{github.username}:{branch}"
+    assert pull["title"] == "Convert pkg0000-feedstock to v1 feedstock"
+    assert pull["draft"]
+    assert report.pr_url == pull["html_url"]
+    assert list(report.stage_durations) == [*STAGE_BUDGETS, "total"]
+
+    assert [record.stage for record in records] == [*STAGE_BUDGETS, "total"]
+    assert records[-1].error is None
+
+    # The open PR is found by the pre-flight of the next run
+    skipped_report = ConversionReport()
+    with pytest.raises(FeedstockSkipped, match="already has an open pull request"):
+        convert_feedstock_to_v1(
+            github.client(), "pkg0000-feedstock", github.username, do_rerender=False, report=skipped_report
+        )
+    assert skipped_report.failed_stage is None
+
+    convert_feedstock_to_v1(
+        github.client(),
+        "pkg0000-feedstock",
+        github.username,
+        do_rerender=False,
+        on_existing=ExistingPolicy.force,
+    )
+    assert [pull["state"] for pull in github.pull_requests("pkg0000-feedstock")] == ["closed", "open"]
+
+
+def test_resume_after_pull_request(github, tmp_path):
+    github.add_repo("pkg0000-feedstock", generate_corpus(1)["pkg0000-feedstock"])
+    kwargs = dict(do_rerender=False, local_clone_dir=str(tmp_path / "workspace"))
+    first = convert_feedstock_to_v1(github.client(), "pkg0000-feedstock", github.username, **kwargs)
+
+    n_requests = len(github.requests)
+    resumed = convert_feedstock_to_v1(
+        github.client(), "pkg0000-feedstock", github.username, resume=True, **kwargs
+    )
+
+    (pull,) = github.pull_requests("pkg0000-feedstock")
+    assert first.pr_url == resumed.pr_url == pull["html_url"]
+    assert not any(method == "POST" for method, _ in github.requests[n_requests:])
+
+
+def test_hand_made_v1_pull_request_is_detected(github):
+    files = generate_corpus(1)["pkg0000-feedstock"]
+    github.add_repo("pkg0000-feedstock", files)
+    gh_repo = github.client().gh.get_repo("conda-forge/pkg0000-feedstock")
+
+    # An unrelated PR does not prevent the conversion
+    github.add_repo("pkg0000-feedstock", {**files, "README.md": "Typo\n"}, owner="contributor")
+    gh_repo.create_pull(title="Fix a typo", body="", head="contributor:main", base="main")
+
+    # Neither its branch nor its title tell it is a v1 conversion, only its files do
+    v1_files = {name: content for name, content in files.items() if name != "recipe/meta.yaml"}
+    github.add_repo(
+        "pkg0000-feedstock", {**v1_files, "recipe/recipe.yaml": "schema_version: 1\n"}, owner="someone"
+    )
+    gh_repo.create_pull(title="Modernize the recipe", body="", head="someone:main", base="main")
+
+    with pytest.raises(FeedstockSkipped, match="already has an open v1 pull request by someone"):
+        convert_feedstock_to_v1(github.client(), "pkg0000-feedstock", github.username, do_rerender=False)
+
+
+def test_stale_fork_is_synced_before_pushing(github):
+    github.add_repo("pkg0000-feedstock", generate_corpus(1)["pkg0000-feedstock"])
+    client = github.client()
+    client.gh.get_repo("conda-forge/pkg0000-feedstock").create_fork()
+    upstream_sha = github.push_commit("pkg0000-feedstock", {"README.md": "Updated\n"})
+
+    records = []
+    convert_feedstock_to_v1(
+        client,
+        "pkg0000-feedstock",
+        github.username,
+        do_rerender=False,
+        metrics=RunMetrics(hooks=[records.append]),
+    )
+
+    fork = Repo(github.repo_path(github.username, "pkg0000-feedstock"))
+    assert fork.git.rev_parse("main") == upstream_sha
+    assert ("POST", f"/repos/{github.username}/pkg0000-feedstock/merge-upstream") in github.requests
+    # Only the conversion commit is pushed
+    branch = "convert_feedstock_to_v1_recipe_format"
+    assert fork.git.rev_list("--count", f"main..{branch}") == "1"
+
+
+def test_batch_load(github, tmp_path):
+    """Convert `N_FEEDSTOCKS` feedstocks concurrently and check the latency budget of each stage."""
+
+    github.latency = 0.005
+    for name, files in generate_corpus(N_FEEDSTOCKS).items():
+        github.add_repo(name, files)
+    records = []
+    store = ResultStore(tmp_path / "results.jsonl")
+
+    start = time.perf_counter()
+    results = convert_feedstocks_to_v1(
+        github.client(max_workers=16),
+        generate_corpus(N_FEEDSTOCKS),
+        github.username,
+        max_workers=4,
+        workspace_dir=str(tmp_path / "workspace"),
+        do_rerender=False,
+        metrics=RunMetrics(hooks=[records.append]),
+        result_store=store,
+    )
+    duration = time.perf_counter() - start
+
+    assert [result.status for result in results] == [BatchStatus.success] * N_FEEDSTOCKS
+    assert sorted(result.feedstock_name for result in store.results()) == sorted(
+        generate_corpus(N_FEEDSTOCKS)
+    )
+    assert all(result.pr_url is not None for result in store.results())
+    assert all(len(github.pull_requests(result.feedstock_name)) == 1 for result in results)
+    # The workspaces of the successful conversions are removed
+    assert not any((tmp_path / "workspace").iterdir())
+
+    wall_times = defaultdict(list)
+    for record in records:
+        wall_times[record.stage].append(record.wall_time)
+    # Shown with the captured logs, e.g. with `pytest -o log_cli=true`
+    logger.info(
+        f"{N_FEEDSTOCKS} feedstocks, {len(github.requests)} API requests, "
+        f"{N_FEEDSTOCKS / duration:.1f} feedstocks/s"
+    )
+    for stage, times in wall_times.items():
+        logger.info(f"{stage:>14}: mean {sum(times) / len(times):.3f}s, max {max(times):.3f}s")
+
+    over_budget = {
+        stage: max(wall_times[stage])
+        for stage, budget in STAGE_BUDGETS.items()
+        if max(wall_times[stage]) > budget
+    }
+    assert not over_budget, f"Stages over their latency budget: {over_budget}"
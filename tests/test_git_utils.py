@@ -0,0 +1,126 @@
+import pytest
+from git import Repo
+
+from feedrattler.git_utils import (
+    MirrorCache,
+    clone_feedstock,
+    commit_paths,
+    is_shallow,
+    push_branch,
+    repo_size,
+    unpushed_size,
+)
+
+
+@pytest.fixture
+def upstream(tmp_path, monkeypatch):
+    for name in ["GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"]:
+        monkeypatch.setenv(name, "feedrattler")
+    for name in ["GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"]:
+        monkeypatch.setenv(name, "feedrattler@example.com")
+
+    repo = Repo.init(tmp_path / "upstream", initial_branch="main")
+    for i in range(3):
+        (tmp_path / "upstream" / f"file{i}.txt").write_text(f"{i}\n")
+        repo.git.add(".")
+        repo.git.commit("-m", f"commit {i}")
+    return repo
+
+
+def test_shallow_clone_pinned_rev_push_to_stale_fork(tmp_path, upstream):
+    git_rev = upstream.commit("HEAD~1").hexsha
+    fork = Repo.init(tmp_path / "fork.git", bare=True)
+
+    git_repo = clone_feedstock(f"file://{upstream.working_dir}", tmp_path / "clone", git_rev=git_rev, depth=1)
+    assert is_shallow(git_repo)
+    assert git_repo.head.commit.hexsha == git_rev
+
+    git_repo.create_head("convert").checkout()
+    (tmp_path / "clone" / "recipe.yaml").write_text("schema_version: 1\n")
+    git_repo.git.add("recipe.yaml")
+    git_repo.git.commit("-m", "convert")
+
+    # The fork has none of the history so the shallow clone is completed before pushing
+    push_branch(git_repo, fork.git_dir, "convert")
+    assert fork.commit("convert").parents[0].hexsha == git_rev
+    assert git_repo.remotes.origin.url == f"file://{upstream.working_dir}"
+
+
+def test_force_push_overwrites_previous_branch(tmp_path, upstream):
+    fork = Repo.init(tmp_path / "fork.git", bare=True)
+    push_branch(upstream, fork.git_dir, "main")
+
+    # A new conversion of the same feedstock does not descend from the pushed branch
+    git_repo = clone_feedstock(f"file://{upstream.working_dir}", tmp_path / "clone")
+    git_repo.git.reset("--hard", "HEAD~1")
+    (tmp_path / "clone" / "recipe.yaml").write_text("schema_version: 1\n")
+    git_repo.git.add("recipe.yaml")
+    git_repo.git.commit("-m", "convert")
+
+    with pytest.raises(Exception):
+        push_branch(git_repo, fork.git_dir, "main")
+    push_branch(git_repo, fork.git_dir, "main", force=True)
+    assert fork.commit("main").hexsha == git_repo.head.commit.hexsha
+
+
+def test_mirror_cache(tmp_path, upstream):
+    cache = MirrorCache(tmp_path / "mirrors", min_age=0)
+
+    git_repo = cache.clone("foo-feedstock", upstream.working_dir, tmp_path / "clone1")
+    assert git_repo.head.commit == upstream.head.commit
+    assert git_repo.remotes.origin.url == upstream.working_dir
+    assert (tmp_path / "clone1" / ".git" / "objects" / "info" / "alternates").exists()
+
+    # A new upstream commit is fetched into the existing mirror
+    (tmp_path / "upstream" / "new.txt").write_text("new\n")
+    upstream.git.add(".")
+    upstream.git.commit("-m", "new commit")
+    git_repo = cache.clone("foo-feedstock", upstream.working_dir, tmp_path / "clone2")
+    assert git_repo.head.commit.hexsha == upstream.head.commit.hexsha
+
+    # Only the branches and tags are mirrored, not e.g. the GitHub pull request refs
+    upstream.create_tag("v1.0")
+    upstream.git.update_ref("refs/pull/1/head", "HEAD~1")
+    cache.update("foo-feedstock", upstream.working_dir)
+    mirror = Repo(cache.mirror_path("foo-feedstock"))
+    assert mirror.git.for_each_ref("--format=%(refname)").splitlines() == [
+        "refs/heads/main",
+        "refs/tags/v1.0",
+    ]
+
+    assert [entry.feedstock_name for entry in cache.entries()] == ["foo-feedstock"]
+    assert [entry.feedstock_name for entry in cache.prune(0, keep={"foo-feedstock"})] == []
+    assert [entry.feedstock_name for entry in cache.prune(0)] == ["foo-feedstock"]
+    assert cache.entries() == []
+
+
+def test_repo_and_unpushed_sizes(tmp_path, upstream):
+    git_repo = clone_feedstock(f"file://{upstream.working_dir}", tmp_path / "clone")
+    assert repo_size(git_repo) > 0
+
+    git_repo.create_head("convert").checkout()
+    assert unpushed_size(git_repo, "convert") == 0
+
+    (tmp_path / "clone" / "recipe.yaml").write_text("schema_version: 1\n" * 100)
+    git_repo.git.add("recipe.yaml")
+    git_repo.git.commit("-m", "convert")
+    assert unpushed_size(git_repo, "convert") > 0
+
+
+def test_commit_paths_only_commits_the_given_paths(tmp_path, upstream):
+    git_repo = clone_feedstock(f"file://{upstream.working_dir}", tmp_path / "clone")
+    git_repo.create_head("convert").checkout()
+    clone_dir = tmp_path / "clone"
+    (clone_dir / "file0.txt").unlink()
+    (clone_dir / "file1.txt").rename(clone_dir / "renamed.txt")
+    (clone_dir / "file2.txt").write_text("changed\n")
+    (clone_dir / "untracked.txt").write_text("not committed\n")
+
+    sha = commit_paths(git_repo, ["file0.txt", "file1.txt", "renamed.txt", "file2.txt"], "convert")
+
+    assert git_repo.head.commit.hexsha == sha
+    assert git_repo.active_branch.name == "convert"
+    assert git_repo.head.commit.message.strip() == "convert"
+    assert sorted(git_repo.git.ls_tree("--name-only", "HEAD").splitlines()) == ["file2.txt", "renamed.txt"]
+    assert git_repo.untracked_files == ["untracked.txt"]
+    assert not git_repo.is_dirty()
@@ -0,0 +1,117 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from github import RateLimitExceededException
+
+from feedrattler.github_client import GitHubClient, RateLimitGovernor, count_calls
+
+
+def fake_gh(remaining=-1, limit=-1, reset=0):
+    return SimpleNamespace(
+        requester=SimpleNamespace(rate_limiting=(remaining, limit), rate_limiting_resettime=reset)
+    )
+
+
+def test_github_client_concurrent_calls():
+    client = GitHubClient(fake_gh(), max_workers=4)
+    barrier = threading.Barrier(3, timeout=5)
+
+    def request(gh, value):
+        # Only completes if the three calls run concurrently
+        barrier.wait()
+        time.sleep(0.01)
+        return value
+
+    futures = [client.submit("get_repo", request, i) for i in range(3)]
+    assert [future.result() for future in futures] == [0, 1, 2]
+
+    latencies = client.latencies()
+    assert list(latencies) == ["get_repo"]
+    assert len(latencies["get_repo"]) == 3
+    assert all(latency >= 0.01 for latency in latencies["get_repo"])
+    client.close()
+
+
+def test_github_client_count_calls():
+    client = GitHubClient(fake_gh())
+    client.call("get_repo", lambda gh: None)
+
+    with count_calls() as outer:
+        client.call("get_repo", lambda gh: None)
+        with count_calls() as inner:
+            # Background calls are counted in the context they are submitted from
+            client.submit("get_fork", lambda gh: None).result()
+        client.call("get_repo", lambda gh: None)
+
+    assert outer == {"get_repo": 2, "get_fork": 1}
+    assert inner == {"get_fork": 1}
+    client.close()
+
+
+def test_github_client_wrap():
+    client = GitHubClient(fake_gh())
+    assert GitHubClient.wrap(client) is client
+    assert isinstance(GitHubClient.wrap(fake_gh()), GitHubClient)
+
+
+def test_github_client_starts_its_threads_on_first_submit():
+    with GitHubClient(fake_gh()) as client:
+        client.call("get_repo", lambda gh: None)
+        assert client._executor is None
+        assert client.submit("get_repo", lambda gh: 1).result() == 1
+        executor = client._executor
+        assert executor is not None
+    assert client._executor is None
+    assert executor._shutdown
+
+
+def test_github_client_rotates_reads_and_pins_writes():
+    now = time.time()
+    primary, secondary = fake_gh(100, 5000, now + 600), fake_gh(4000, 5000, now + 600)
+    client = GitHubClient([primary, secondary], reserve=50)
+
+    # Seed the budgets from a first response of each token
+    client.call("get_user", lambda gh: None)
+    client.governor.update(1, 4000, 5000, now + 600)
+
+    assert client.call("get_repo", lambda gh: gh) is secondary
+    assert client.call("create_pull", lambda gh: gh, write=True) is primary
+
+
+def test_github_client_retries_after_rate_limit(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("feedrattler.github_client.time.sleep", sleeps.append)
+    client = GitHubClient(fake_gh())
+    attempts = iter([RateLimitExceededException(403, {}, {"retry-after": "30"}), None])
+
+    def request(gh):
+        if error := next(attempts):
+            raise error
+        return "ok"
+
+    assert client.call("create_pull", request) == "ok"
+    assert len(sleeps) == 1 and 29 <= sleeps[0] <= 30
+
+
+def test_rate_limit_governor_throttles_below_reserve():
+    governor = RateLimitGovernor(reserve=10)
+    governor.update(0, remaining=10, limit=5000, reset=time.time() + 120)
+
+    index, wait = governor.acquire()
+    assert index == 0
+    assert 119 <= wait <= 120
+
+
+def test_rate_limit_governor_projected_wait():
+    governor = RateLimitGovernor(n_tokens=2, reserve=0)
+    assert governor.projected_wait(1000) == 0
+
+    now = time.time()
+    governor.update(0, remaining=100, limit=1000, reset=now + 60)
+    governor.update(1, remaining=100, limit=1000, reset=now + 300)
+
+    assert governor.projected_wait(200) == 0
+    assert governor.projected_wait(201) == pytest.approx(60, abs=1)
+    assert governor.projected_wait(2201) == pytest.approx(60 + 3600, abs=1)
@@ -1,8 +1,22 @@
 def test_import():
     import feedrattler  # noqa: F401
+    import feedrattler.batch  # noqa: F401
+    import feedrattler.checkpoint  # noqa: F401
     import feedrattler.cli  # noqa: F401
+    import feedrattler.conversion_cache  # noqa: F401
     import feedrattler.convert  # noqa: F401
+    import feedrattler.detect  # noqa: F401
+    import feedrattler.git_utils  # noqa: F401
+    import feedrattler.github_client  # noqa: F401
+    import feedrattler.metrics  # noqa: F401
+    import feedrattler.recipe  # noqa: F401
+    import feedrattler.rerender  # noqa: F401
+    import feedrattler.rerender_cache  # noqa: F401
+    import feedrattler.results  # noqa: F401
+    import feedrattler.scan  # noqa: F401
+    import feedrattler.server  # noqa: F401
     import feedrattler.utils  # noqa: F401
+    import feedrattler.workspace  # noqa: F401
 
 
 def test_version():
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from feedrattler.convert import ConversionReport, FeedstockSkipped
+from feedrattler.metrics import JsonLinesWriter, RunMetrics
+
+
+def test_stage_tracker_records_stages(tmp_path):
+    records = []
+    metrics = RunMetrics(hooks=[records.append, JsonLinesWriter(tmp_path / "metrics.jsonl")])
+
+    with metrics.track("foo-feedstock") as stages:
+        stages.start("clone")
+        stages.set(bytes_cloned=100)
+        stages.start("convert")
+        sum(range(100_000))
+        stages.start("push")
+        stages.set(bytes_pushed=10)
+
+    assert [record.stage for record in records] == ["clone", "convert", "push", "total"]
+    assert all(record.feedstock_name == "foo-feedstock" and record.error is None for record in records)
+    assert records[1].cpu_time > 0
+    assert records[-1].wall_time >= sum(record.wall_time for record in records[:-1])
+    assert (records[-1].bytes_cloned, records[-1].bytes_pushed) == (100, 10)
+
+    lines = (tmp_path / "metrics.jsonl").read_text().splitlines()
+    assert [json.loads(line)["stage"] for line in lines] == ["clone", "convert", "push", "total"]
+
+
+def test_stage_tracker_records_errors():
+    records = []
+    metrics = RunMetrics(hooks=[records.append])
+
+    with pytest.raises(ValueError):
+        with metrics.track("foo-feedstock") as stages:
+            stages.start("clone")
+            stages.start("convert")
+            raise ValueError("boom")
+
+    assert [(record.stage, record.error) for record in records] == [
+        ("clone", None),
+        ("convert", "boom"),
+        ("total", "boom"),
+    ]
+
+
+def test_conversion_report_records_stages():
+    report = ConversionReport()
+
+    with pytest.raises(ValueError):
+        with RunMetrics().track("foo-feedstock", hooks=[report.add_stage]) as stages:
+            stages.start("clone")
+            stages.start("rerender")
+            raise ValueError("boom")
+
+    assert list(report.stage_durations) == ["clone", "rerender", "total"]
+    assert report.failed_stage == "rerender"
+
+
+def test_conversion_report_ignores_skipped_feedstocks():
+    report = ConversionReport()
+    records = []
+
+    with pytest.raises(FeedstockSkipped):
+        with RunMetrics(hooks=[records.append]).track(
+            "foo-feedstock", hooks=[report.add_stage], skip_exceptions=(FeedstockSkipped,)
+        ) as stages:
+            stages.start("check")
+            raise FeedstockSkipped("already has an open pull request")
+
+    assert report.failed_stage is None
+    assert [(record.stage, record.skipped) for record in records] == [("check", True), ("total", True)]
+
+
+def test_failing_hook_does_not_fail_the_conversion():
+    def hook(record):
+        raise RuntimeError("broken hook")
+
+    with RunMetrics(hooks=[hook]).track("foo-feedstock") as stages:
+        stages.start("clone")
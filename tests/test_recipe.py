@@ -0,0 +1,176 @@
+import pytest
+
+from feedrattler.recipe import find_unsupported_jinja, postprocess_recipe_data, postprocess_recipe_text
+from feedrattler.utils import (
+    initialize_yaml,
+    remove_empty_script_test,
+    rename_bld_bat_to_build_bat,
+    update_python_min_in_recipe,
+    update_python_version_in_tests,
+)
+
+NOARCH_PYTHON_RECIPE = """\
+schema_version: 1
+
+context:
+  name: foo
+  version: "1.2.3"
+  python_min: "3.9"
+
+package:
+  name: ${{ name|lower }}
+  version: ${{ version }}
+
+source:
+  url: https://pypi.org/packages/source/${{ name[0] }}/${{ name }}/${{ name }}-${{ version }}.tar.gz
+  sha256: 0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef
+
+build:
+  number: 0
+  noarch: python
+  script: ${{ PYTHON }} -m pip install . -vv --no-deps --no-build-isolation
+
+requirements:
+  host:
+    - python ${{ python_min }}
+    - pip
+    - setuptools
+  run:
+    - python >=${{ python_min }}
+    - numpy  # a comment
+
+tests:
+  - python:
+      imports:
+        - foo
+  - requirements:
+      run:
+        - python ${{ python_min }}
+  - script:
+      - foo --help
+    requirements:
+      run:
+        - pip
+
+about:
+  summary: 'A quoted summary'
+  license: MIT
+  license_file: LICENSE
+"""
+
+COMPILED_RECIPE = """\
+schema_version: 1
+
+package:
+  name: bar
+  version: 0.1.0
+
+build:
+  number: 4
+  skip:
+    - win
+
+requirements:
+  build:
+    - ${{ compiler('c') }}
+    - if: unix
+      then: make
+
+tests:
+  - script:
+      - bar --version
+"""
+
+MULTI_OUTPUT_RECIPE = """\
+schema_version: 1
+
+recipe:
+  name: baz-split
+  version: 2.0.0
+
+build:
+  number: 1
+  noarch: python
+
+outputs:
+  - package:
+      name: baz
+    tests:
+      - python:
+          imports:
+            - baz
+      - requirements:
+          run:
+            - pytest
+  - package:
+      name: baz-extra
+    tests:
+      - python:
+          imports:
+            - baz.extra
+          python_version: ${{ python_min }}.*
+"""
+
+
+def _legacy_postprocess(recipe_yaml_path):
+    # Reproduce the previous pipeline with one load/dump round trip per edit
+    yaml = initialize_yaml()
+    with open(recipe_yaml_path, "r") as f:
+        data = yaml.load(f)
+    data["build"]["number"] = int(data["build"]["number"]) + 1
+    with open(recipe_yaml_path, "w") as f:
+        yaml.dump(data, f)
+
+    update_python_min_in_recipe(recipe_yaml_path)
+    update_python_version_in_tests(recipe_yaml_path)
+    remove_empty_script_test(recipe_yaml_path)
+    rename_bld_bat_to_build_bat(recipe_yaml_path)
+
+
+@pytest.mark.parametrize("recipe", [NOARCH_PYTHON_RECIPE, COMPILED_RECIPE, MULTI_OUTPUT_RECIPE])
+def test_postprocess_recipe_text_matches_legacy_pipeline(tmp_path, recipe):
+    legacy_path = tmp_path / "recipe.yaml"
+    legacy_path.write_text(recipe)
+    _legacy_postprocess(legacy_path)
+
+    assert postprocess_recipe_text(recipe) == legacy_path.read_text()
+
+
+def test_postprocess_recipe_text_bumps_build_number():
+    recipe_yaml = postprocess_recipe_text(COMPILED_RECIPE)
+
+    assert initialize_yaml().load(recipe_yaml)["build"]["number"] == 5
+
+
+def test_postprocess_recipe_data_bumps_build_number():
+    data = initialize_yaml().load(COMPILED_RECIPE)
+
+    postprocess_recipe_data(data)
+
+    assert data["build"]["number"] == 5
+
+
+def test_rename_bld_bat_to_build_bat(tmp_path):
+    recipe_path = tmp_path / "recipe.yaml"
+    recipe_path.write_text(COMPILED_RECIPE)
+    (tmp_path / "bld.bat").write_text("nmake install\n")
+
+    assert rename_bld_bat_to_build_bat(recipe_path)
+
+    assert not (tmp_path / "bld.bat").exists()
+    assert (tmp_path / "build.bat").read_text() == "nmake install\n"
+
+
+def test_find_unsupported_jinja():
+    meta_yaml = """\
+{% set name = "foo" %}
+{%- set version = "1.0" -%}
+package:
+  name: {{ name }}
+{% for dep in deps %}
+  - {{ dep }}
+{% endfor %}
+"""
+
+    assert find_unsupported_jinja(meta_yaml) == ["for dep in deps", "endfor"]
+    assert find_unsupported_jinja('{% set name = "foo" %}\n') == []
@@ -0,0 +1,219 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from feedrattler import rerender
+from feedrattler.rerender import RerenderOutput, RerenderPool, RerenderResult, _follow
+
+
+@pytest.fixture
+def fake_rerender(monkeypatch):
+    # Replace conda-smithy by a small python script receiving the feedstock dir as argument
+    def set_script(script):
+        monkeypatch.setattr(
+            rerender,
+            "rerender_command",
+            lambda feedstock_dir: [sys.executable, "-c", script, str(feedstock_dir)],
+        )
+
+    return set_script
+
+
+def test_rerender_captures_output(tmp_path, fake_rerender):
+    fake_rerender("import sys; print('rendering', sys.argv[1]); print('oops', file=sys.stderr)")
+
+    with RerenderPool(max_workers=1) as pool:
+        result = pool.rerender(tmp_path)
+
+    assert result.success
+    assert result.output == f"rendering {tmp_path}\noops\n"
+
+
+def test_rerender_failure(tmp_path, fake_rerender):
+    fake_rerender("import sys; print('boom'); sys.exit(3)")
+
+    with RerenderPool(max_workers=1) as pool:
+        result = pool.rerender(tmp_path)
+
+    assert not result.success
+    assert result.returncode == 3
+    assert result.output_tail() == "boom"
+
+
+def test_rerender_timeout_kills_process(tmp_path, fake_rerender):
+    # The child spawns a grandchild, both must be killed
+    fake_rerender(
+        "import subprocess, sys, time; "
+        "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)']); "
+        "print('started', flush=True); time.sleep(60)"
+    )
+
+    start = time.perf_counter()
+    with RerenderPool(max_workers=1, timeout=1) as pool:
+        result = pool.rerender(tmp_path)
+
+    assert result.timed_out
+    assert not result.success
+    assert result.output == "started\n"
+    assert time.perf_counter() - start < 10
+
+
+def test_rerender_output_is_bounded(tmp_path, fake_rerender):
+    fake_rerender(
+        "print('Downloading conda-forge-pinning'); "
+        "[print(f'line {i}') for i in range(50)]; "
+        "print('x' * 100); print('[main 1a2b3c4d] MNT: Re-rendered')"
+    )
+
+    with RerenderPool(max_workers=1, max_output_lines=3) as pool:
+        result = pool.rerender(tmp_path)
+
+    assert result.output.splitlines()[0] == "line 49"
+    assert result.captured.n_dropped_lines == 50
+    # The milestones are recorded from the dropped lines too
+    assert list(result.captured.milestones) == ["pinning", "commit"]
+
+
+def test_rerender_output_truncates_long_lines():
+    captured = RerenderOutput(max_lines=2, max_line_length=5)
+    captured.append("a" * 10 + "\n")
+
+    assert captured.text() == "aaaaa\n"
+
+
+def test_rerender_write_log(tmp_path):
+    captured = RerenderOutput(max_lines=1)
+    for line in ("Updating .ci_support\n", "error\n"):
+        captured.append(line)
+    result = RerenderResult(tmp_path / "foo-feedstock", 1, captured, 2.0)
+
+    lines = result.write_log(tmp_path / "logs" / "foo-feedstock.log").read_text().splitlines()
+
+    assert lines[1] == "# returncode=1 duration=2.0s timed_out=False cancelled=False"
+    assert lines[2].startswith("# milestones: ci_support at ")
+    assert lines[3] == "# 1 earlier lines dropped"
+    assert lines[4].endswith("s] error")
+
+
+def test_follow_reads_lines_as_written(tmp_path):
+    path = tmp_path / "output"
+    path.write_text("")
+    captured = RerenderOutput()
+
+    with open(path, "a") as f, _follow(str(path), captured):
+        f.write("first\n")
+        f.flush()
+        time.sleep(0.2)
+        f.write("second\nno newline")
+        f.flush()
+
+    assert captured.text() == "first\nsecond\nno newline"
+    assert captured.lines[1][0] > captured.lines[0][0]
+
+
+def test_rerender_runs_in_parallel_up_to_max_workers(tmp_path, fake_rerender):
+    fake_rerender("import time; time.sleep(1)")
+
+    start = time.perf_counter()
+    with RerenderPool(max_workers=4) as pool:
+        futures = [pool.submit(tmp_path / str(i)) for i in range(4)]
+        results = [future.result() for future in futures]
+
+    assert all(result.success for result in results)
+    assert time.perf_counter() - start < 3.5
+
+
+def test_rerender_cancel(tmp_path, fake_rerender):
+    fake_rerender("print('started', flush=True); import time; time.sleep(60)")
+
+    pool = RerenderPool(max_workers=1)
+    running = pool.submit(tmp_path / "a")
+    queued = pool.submit(tmp_path / "b")
+    while not pool._processes:
+        time.sleep(0.05)
+
+    threading.Timer(0.2, pool.shutdown, kwargs={"cancel": True}).start()
+
+    assert running.result(timeout=10).cancelled
+    assert queued.cancelled() or queued.result(timeout=10).cancelled
+
+
+FAKE_WARM_WORKER = """\
+import json, os, sys, time
+print(json.dumps({"ready": True}), flush=True)
+for line in sys.stdin:
+    name = os.path.basename(json.loads(line)["feedstock_dir"])
+    if name == "slow":
+        time.sleep(60)
+    if name == "crash":
+        os._exit(3)
+    output = {"lines": [[0.0, f"{os.getpid()} {name}\\n"]], "n_lines": 1, "milestones": {}}
+    response = {"returncode": 2 if name == "fail" else 0, "output": output, "pinning_version": "2025.01.01"}
+    print(json.dumps(response), flush=True)
+"""
+
+
+@pytest.fixture
+def fake_warm_worker(monkeypatch):
+    monkeypatch.setattr(rerender, "warm_worker_command", lambda: [sys.executable, "-c", FAKE_WARM_WORKER])
+
+
+def test_warm_rerender_reuses_workers(tmp_path, fake_warm_worker):
+    with RerenderPool(max_workers=1, warm=True) as pool:
+        pool.warm_up()
+        results = [pool.rerender(tmp_path / name) for name in ("a", "fail", "b")]
+
+    assert [result.success for result in results] == [True, False, True]
+    assert results[1].returncode == 2
+    assert results[0].pinning_version == "2025.01.01"
+    # The same worker process handled all the rerenders
+    assert len({result.output.split()[0] for result in results}) == 1
+
+
+def test_warm_rerender_timeout_replaces_worker(tmp_path, fake_warm_worker):
+    with RerenderPool(max_workers=1, timeout=1, warm=True) as pool:
+        first = pool.rerender(tmp_path / "a")
+        slow = pool.rerender(tmp_path / "slow")
+        after = pool.rerender(tmp_path / "b")
+
+    assert slow.timed_out
+    assert after.success
+    assert first.output.split()[0] != after.output.split()[0]
+
+
+def test_warm_rerender_timeout_while_preloading(tmp_path, monkeypatch):
+    command = [sys.executable, "-c", "import time; time.sleep(60)"]
+    monkeypatch.setattr(rerender, "warm_worker_command", lambda: command)
+
+    with RerenderPool(max_workers=1, timeout=1, warm=True) as pool:
+        result = pool.rerender(tmp_path / "a")
+
+    assert result.timed_out
+    assert result.duration < 10
+
+
+def test_warm_rerender_without_posix_apis(tmp_path, fake_warm_worker, monkeypatch):
+    # The fallback used on Windows: no process group nor `select` on the worker pipes
+    monkeypatch.setattr(rerender, "_POSIX", False)
+
+    with RerenderPool(max_workers=1, timeout=1, warm=True) as pool:
+        first = pool.rerender(tmp_path / "a")
+        slow = pool.rerender(tmp_path / "slow")
+        after = pool.rerender(tmp_path / "b")
+
+    assert first.success and after.success
+    assert slow.timed_out
+    assert first.output.split()[0] != after.output.split()[0]
+
+
+def test_warm_rerender_worker_crash(tmp_path, fake_warm_worker):
+    with RerenderPool(max_workers=1, warm=True) as pool:
+        crashed = pool.rerender(tmp_path / "crash")
+        after = pool.rerender(tmp_path / "b")
+
+    assert not crashed.success
+    assert not crashed.timed_out
+    assert crashed.returncode == 3
+    assert after.success
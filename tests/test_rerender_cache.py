@@ -0,0 +1,99 @@
+import os
+import pathlib
+
+import pytest
+from git import Repo
+
+from feedrattler.git_utils import commit_paths
+from feedrattler.rerender_cache import RerenderCache, pinning_from_message
+
+
+@pytest.fixture
+def feedstock(tmp_path, monkeypatch):
+    for name in ["GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"]:
+        monkeypatch.setenv(name, "feedrattler")
+    for name in ["GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"]:
+        monkeypatch.setenv(name, "feedrattler@example.com")
+
+    repo_dir = tmp_path / "foo-feedstock"
+    (repo_dir / "recipe").mkdir(parents=True)
+    (repo_dir / "recipe" / "recipe.yaml").write_text("schema_version: 1\n")
+    (repo_dir / "conda-forge.yml").write_text("conda_build_tool: rattler-build\n")
+    (repo_dir / ".ci_support").mkdir()
+    (repo_dir / ".ci_support" / "old.yaml").write_text("old\n")
+    repo = Repo.init(repo_dir, initial_branch="main")
+    repo.git.add(".")
+    repo.git.commit("-m", "Convert to v1 feedstock")
+    return repo
+
+
+def _rerender(repo_dir):
+    # What conda-smithy does: regenerate the CI files and commit them
+    (repo_dir / ".ci_support" / "old.yaml").unlink()
+    (repo_dir / ".ci_support" / "linux_64_.yaml").write_text("target_platform: linux-64\n")
+    (repo_dir / ".scripts").mkdir()
+    (repo_dir / ".scripts" / "build_steps.sh").write_text("#!/bin/bash\n")
+    (repo_dir / ".scripts" / "build_steps.sh").chmod(0o755)
+    repo = Repo(repo_dir)
+    repo.git.add("-A")
+    repo.git.commit("-m", "MNT: Re-rendered with conda-smithy 3.50")
+
+
+def test_key_depends_on_all_inputs(feedstock):
+    key = RerenderCache.key(feedstock, "foo-feedstock", "2025.01.01")
+
+    assert RerenderCache.key(feedstock, "foo-feedstock", "2025.01.01") == key
+    assert RerenderCache.key(feedstock, "foo-feedstock", "2025.01.02") != key
+    assert RerenderCache.key(feedstock, "bar-feedstock", "2025.01.01") != key
+
+    # Any tracked file, e.g. a migration conda-smithy reads, is an input
+    keys = {key}
+    for path in ("recipe/recipe.yaml", "conda-forge.yml", ".ci_support/migrations/python313.yaml"):
+        (pathlib.Path(feedstock.working_dir) / path).parent.mkdir(parents=True, exist_ok=True)
+        with open(os.path.join(feedstock.working_dir, path), "a") as f:
+            f.write("# changed\n")
+        feedstock.git.add(path)
+        feedstock.git.commit("-m", f"Change {path}")
+        keys.add(RerenderCache.key(feedstock, "foo-feedstock", "2025.01.01"))
+    assert len(keys) == 4
+    assert RerenderCache.key(feedstock, "foo-feedstock", "2025.01.01", rev="HEAD~3") == key
+
+
+def test_cache_round_trip_and_apply(tmp_path, feedstock):
+    repo_dir = tmp_path / "foo-feedstock"
+    cache = RerenderCache(tmp_path / "cache")
+    key = RerenderCache.key(feedstock, "foo-feedstock", "2025.01.01")
+    base_sha = feedstock.head.commit.hexsha
+
+    assert cache.get(key) is None
+    _rerender(repo_dir)
+    cache.put(key, feedstock, base_sha)
+
+    # A fresh clone of the converted feedstock gets the same rerender
+    clone_dir = tmp_path / "clone" / "foo-feedstock"
+    clone = Repo.clone_from(repo_dir, clone_dir)
+    clone.git.reset("--hard", base_sha)
+    changes = cache.get(key)
+    assert changes.message == "MNT: Re-rendered with conda-smithy 3.50\n"
+    assert sorted(changes.paths()) == [
+        ".ci_support/linux_64_.yaml",
+        ".ci_support/old.yaml",
+        ".scripts/build_steps.sh",
+    ]
+
+    changes.apply(clone_dir)
+    commit_paths(clone, changes.paths(), changes.message)
+    assert clone.head.commit.tree.hexsha == feedstock.head.commit.tree.hexsha
+    assert os.access(clone_dir / ".scripts" / "build_steps.sh", os.X_OK)
+
+    cache.clear()
+    assert cache.get(key) is None
+
+
+def test_pinning_from_message():
+    message = (
+        "MNT: Re-rendered with conda-build 25.1.1, conda-smithy 3.45.4, "
+        "and conda-forge-pinning 2025.01.28.09.50.28\n"
+    )
+    assert pinning_from_message(message) == "2025.01.28.09.50.28"
+    assert pinning_from_message("Update README") is None
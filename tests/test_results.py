@@ -0,0 +1,39 @@
+from feedrattler.results import BatchStatus, FeedstockResult, ResultStore
+
+
+def test_result_store_round_trip(tmp_path):
+    store = ResultStore(tmp_path / "results.jsonl", run_id="run1")
+    store.append(FeedstockResult("a-feedstock", BatchStatus.failed, 1.0, "boom", failed_stage="rerender"))
+    store.append(
+        FeedstockResult(
+            "b-feedstock",
+            BatchStatus.success,
+            2.0,
+            pr_url="https://github.com/conda-forge/b-feedstock/pull/1",
+            stage_durations={"clone": 0.5, "total": 2.0},
+        )
+    )
+    ResultStore(store.path, run_id="run2").append(FeedstockResult("a-feedstock", BatchStatus.success, 3.0))
+    # A line cut short by a killed run is ignored
+    with open(store.path, "a") as f:
+        f.write('{"feedstock_name": "c-feed')
+
+    results = store.results()
+    assert [(result.feedstock_name, result.run_id) for result in results] == [
+        ("a-feedstock", "run1"),
+        ("b-feedstock", "run1"),
+        ("a-feedstock", "run2"),
+    ]
+    assert results[0].status == BatchStatus.failed
+    assert results[0].failed_stage == "rerender"
+    assert results[1].stage_durations == {"clone": 0.5, "total": 2.0}
+
+    latest = store.latest()
+    assert [(result.feedstock_name, result.status) for result in latest] == [
+        ("b-feedstock", BatchStatus.success),
+        ("a-feedstock", BatchStatus.success),
+    ]
+
+
+def test_result_store_missing_file(tmp_path):
+    assert ResultStore(tmp_path / "results.jsonl").results() == []
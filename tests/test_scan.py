@@ -0,0 +1,109 @@
+import base64
+import hashlib
+import json
+from types import SimpleNamespace
+
+from github import UnknownObjectException
+
+from feedrattler.detect import FeedstockFormat
+from feedrattler.github_client import GitHubClient
+from feedrattler.scan import FeedstockScan, ScanCache, scan_feedstocks
+
+NOARCH_META_YAML = """\
+{% set name = "foo" %}
+package:
+  name: {{ name }}
+build:
+  noarch: python
+"""
+
+MULTI_OUTPUT_RECIPE_YAML = """\
+recipe:
+  name: bar
+outputs:
+  - package:
+      name: libbar
+"""
+
+
+class FakeRequester:
+    """A REST API serving feedstocks as `{name: (pushed_at, {file: content})}` with ETags."""
+
+    rate_limiting = (-1, -1)
+    rate_limiting_resettime = 0
+
+    def __init__(self, feedstocks):
+        self.feedstocks = feedstocks
+        self.requests = []
+
+    def _respond(self, data, headers):
+        etag = '"' + hashlib.sha1(json.dumps(data).encode()).hexdigest() + '"'
+        if (headers or {}).get("If-None-Match") == etag:
+            return {"etag": etag}, None
+        return {"etag": etag}, data
+
+    def requestJsonAndCheck(self, verb, url, parameters=None, headers=None):
+        self.requests.append((url, (headers or {}).get("If-None-Match") is not None))
+        parts = url.strip("/").split("/")
+        if parts[0] == "orgs":
+            repos = [
+                {"name": name, "pushed_at": pushed_at, "archived": False}
+                for name, (pushed_at, _) in sorted(self.feedstocks.items())
+            ]
+            start = (parameters["page"] - 1) * parameters["per_page"]
+            return self._respond(repos[start : start + parameters["per_page"]], headers)
+
+        _, files = self.feedstocks[parts[2]]
+        if not files:
+            raise UnknownObjectException(404, {}, {})
+        if len(parts) == 5:
+            listing = [
+                {"name": name, "type": "file", "sha": hashlib.sha1(content.encode()).hexdigest()}
+                for name, content in sorted(files.items())
+            ]
+            return self._respond(listing, headers)
+        return {}, {"content": base64.b64encode(files[parts[5]].encode()).decode()}
+
+
+def test_scan_feedstocks_only_pays_for_changes(tmp_path):
+    requester = FakeRequester(
+        {
+            "foo-feedstock": ("t0", {"meta.yaml": NOARCH_META_YAML, "bld.bat": "nmake"}),
+            "bar-feedstock": ("t0", {"recipe.yaml": MULTI_OUTPUT_RECIPE_YAML}),
+            "empty-feedstock": ("t0", {}),
+            "not-a-feedstock-repo": ("t0", {}),
+        }
+    )
+    client = GitHubClient(SimpleNamespace(requester=requester))
+    cache = ScanCache(tmp_path)
+
+    scans = scan_feedstocks(client, cache=cache)
+    assert scans == [
+        FeedstockScan("bar-feedstock", FeedstockFormat.v1, multi_output=True, pushed_at="t0"),
+        FeedstockScan("empty-feedstock", FeedstockFormat.missing, pushed_at="t0"),
+        FeedstockScan(
+            "foo-feedstock", FeedstockFormat.v0, has_bld_bat=True, noarch_python=True, pushed_at="t0"
+        ),
+    ]
+
+    # Nothing changed: only the repository listing is revalidated
+    requester.requests.clear()
+    assert scan_feedstocks(client, cache=cache) == scans
+    assert requester.requests == [("/orgs/conda-forge/repos", True)]
+
+    # A push outside of the recipe only revalidates the recipe dir
+    requester.feedstocks["foo-feedstock"] = ("t1", requester.feedstocks["foo-feedstock"][1])
+    requester.requests.clear()
+    assert scan_feedstocks(client, cache=cache)[2].pushed_at == "t1"
+    assert requester.requests == [
+        ("/orgs/conda-forge/repos", True),
+        ("/repos/conda-forge/foo-feedstock/contents/recipe", True),
+    ]
+
+    # A changed recipe is fetched again
+    requester.feedstocks["bar-feedstock"] = ("t2", {"recipe.yaml": "recipe:\n  name: bar\n"})
+    requester.requests.clear()
+    assert scan_feedstocks(client, cache=cache)[0] == FeedstockScan(
+        "bar-feedstock", FeedstockFormat.v1, pushed_at="t2"
+    )
+    assert len(requester.requests) == 3
@@ -0,0 +1,129 @@
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from feedrattler import batch, rerender
+from feedrattler.batch import BatchStatus, FeedstockResult
+from feedrattler.server import Spool, serve
+
+
+def test_spool_jobs_round_trip(tmp_path):
+    spool = Spool(tmp_path)
+    first = spool.submit("foo-feedstock", git_rev="abc")
+    second = spool.submit("bar-feedstock", github_username="someone")
+
+    job_id, job = spool.claim()
+    assert job_id == first
+    assert job == {"feedstock_name": "foo-feedstock", "github_username": None, "options": {"git_rev": "abc"}}
+    assert spool.result(first) is None
+
+    spool.complete(first, FeedstockResult("foo-feedstock", BatchStatus.failed, 1.5, "boom"))
+    assert spool.result(first) == FeedstockResult("foo-feedstock", BatchStatus.failed, 1.5, "boom")
+
+    # A job left running by a crashed server is queued again
+    assert spool.claim()[0] == second
+    assert spool.claim() is None
+    assert spool.recover() == 1
+    assert spool.claim()[0] == second
+
+
+def test_spool_rejects_unknown_options(tmp_path):
+    with pytest.raises(ValueError):
+        Spool(tmp_path).submit("foo-feedstock", local_clone_dir="/tmp")
+
+
+def test_serve_processes_submitted_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        rerender,
+        "warm_worker_command",
+        lambda: [
+            sys.executable,
+            "-c",
+            "import json; print(json.dumps({'ready': True}), flush=True); input()",
+        ],
+    )
+
+    calls = []
+
+    def fake_convert(gh, feedstock_name, **kwargs):
+        calls.append((feedstock_name, kwargs))
+        if feedstock_name == "bad-feedstock":
+            raise Exception("boom")
+
+    monkeypatch.setattr(batch, "convert_feedstock_to_v1", fake_convert)
+
+    spool = Spool(tmp_path)
+    stop_event = threading.Event()
+    server = threading.Thread(
+        target=serve,
+        kwargs=dict(
+            gh=SimpleNamespace(),
+            github_username="me",
+            spool=spool,
+            max_workers=2,
+            rerender_workers=1,
+            poll_interval=0.05,
+            stop_event=stop_event,
+            use_pixi=False,
+        ),
+    )
+    server.start()
+
+    job_ids = [
+        spool.submit("good-feedstock", use_pixi=True),
+        spool.submit("bad-feedstock", github_username="someone"),
+    ]
+    deadline = time.time() + 10
+    while any(spool.result(job_id) is None for job_id in job_ids) and time.time() < deadline:
+        time.sleep(0.05)
+    stop_event.set()
+    server.join(timeout=10)
+
+    results = [spool.result(job_id) for job_id in job_ids]
+    assert [result.status for result in results] == [BatchStatus.success, BatchStatus.failed]
+    assert results[1].message == "boom"
+
+    kwargs = dict(calls)
+    # Job options take precedence over the server defaults
+    assert kwargs["good-feedstock"]["use_pixi"] is True
+    assert kwargs["good-feedstock"]["github_username"] == "me"
+    assert kwargs["bad-feedstock"]["github_username"] == "someone"
+    assert kwargs["bad-feedstock"]["rerender_pool"] is kwargs["good-feedstock"]["rerender_pool"]
+
+
+def test_serve_starts_when_the_warm_up_is_stuck(tmp_path, monkeypatch):
+    # A worker hanging while importing conda-smithy or fetching the pinning
+    monkeypatch.setattr(
+        rerender, "warm_worker_command", lambda: [sys.executable, "-c", "import time; time.sleep(60)"]
+    )
+    monkeypatch.setattr(batch, "convert_feedstock_to_v1", lambda gh, feedstock_name, **kwargs: None)
+
+    spool = Spool(tmp_path)
+    stop_event = threading.Event()
+    server = threading.Thread(
+        target=serve,
+        kwargs=dict(
+            gh=SimpleNamespace(),
+            github_username="me",
+            spool=spool,
+            max_workers=1,
+            rerender_workers=2,
+            rerender_timeout=1,
+            poll_interval=0.05,
+            stop_event=stop_event,
+        ),
+    )
+    server.start()
+
+    job_id = spool.submit("good-feedstock")
+    deadline = time.time() + 10
+    while spool.result(job_id) is None and time.time() < deadline:
+        time.sleep(0.05)
+    stop_event.set()
+    server.join(timeout=10)
+
+    assert not server.is_alive()
+    assert spool.result(job_id).status == BatchStatus.success
@@ -0,0 +1,34 @@
+import subprocess
+import sys
+
+# Only imported by the CLI commands needing them, see `feedrattler.cli`
+HEAVY_PACKAGES = {"git", "github", "conda_recipe_manager", "conda_smithy", "ruamel"}
+
+
+def import_times(statement: str) -> dict[str, int]:
+    """The cumulative import time in microseconds of the modules imported by a statement."""
+
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    times = {}
+    for line in output.splitlines():
+        # import time: <self us> | <cumulative us> | <module>
+        _, cumulative, module = line.removeprefix("import time:").split("|")
+        if cumulative.strip().isdigit():
+            times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_import_is_light():
+    times = import_times("import feedrattler.cli")
+
+    heavy_modules = sorted(module for module in times if module.split(".")[0] in HEAVY_PACKAGES)
+    slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)[:10]
+    assert not heavy_modules, (
+        f"Heavy modules imported at CLI startup: {heavy_modules}, slowest imports: {slowest}"
+    )
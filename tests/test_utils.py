@@ -0,0 +1,42 @@
+import pytest
+
+from feedrattler.utils import wait_until
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    clock = {"now": 0.0, "sleeps": []}
+
+    def sleep(seconds):
+        clock["sleeps"].append(seconds)
+        clock["now"] += seconds
+
+    monkeypatch.setattr("feedrattler.utils.time.monotonic", lambda: clock["now"])
+    monkeypatch.setattr("feedrattler.utils.time.sleep", sleep)
+    return clock
+
+
+def test_wait_until_ready_immediately(fake_clock):
+    value, elapsed = wait_until(lambda: "ready", "resource")
+
+    assert value == "ready"
+    assert elapsed == 0
+    assert fake_clock["sleeps"] == []
+
+
+def test_wait_until_backoff(fake_clock):
+    attempts = iter([None, None, None, "ready"])
+
+    value, elapsed = wait_until(lambda: next(attempts), "resource", initial_delay=1, max_delay=3, jitter=0)
+
+    assert value == "ready"
+    assert fake_clock["sleeps"] == [1, 2, 3]
+    assert elapsed == 6
+
+
+def test_wait_until_timeout(fake_clock):
+    with pytest.raises(Exception, match="Timed out"):
+        wait_until(lambda: None, "resource", timeout=10, initial_delay=1, max_delay=4, jitter=0)
+
+    # The last sleep is truncated to the deadline
+    assert fake_clock["sleeps"] == [1, 2, 4, 3]
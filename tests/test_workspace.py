@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from feedrattler.workspace import WorkspaceManager
+
+
+def test_workspaces_are_removed_unless_failed_and_kept(tmp_path):
+    workspaces = WorkspaceManager(tmp_path, keep_failed=True)
+
+    with workspaces.workspace("foo-feedstock") as path:
+        (path / "foo-feedstock").mkdir(parents=True)
+    assert not path.exists()
+
+    with pytest.raises(Exception, match="boom"):
+        with workspaces.workspace("bar-feedstock") as path:
+            (path / "bar-feedstock").mkdir(parents=True)
+            raise Exception("boom")
+    assert workspaces.kept() == [path]
+
+
+def test_temporary_root_is_removed_on_close():
+    with WorkspaceManager() as workspaces:
+        with workspaces.workspace("foo-feedstock") as path:
+            path.mkdir()
+    assert not workspaces.root.exists()
+
+
+def test_quota_evicts_kept_workspaces_and_waits_for_running_ones(tmp_path):
+    workspaces = WorkspaceManager(tmp_path, keep_failed=True, quota=1000)
+
+    # A kept failed workspace is evicted to make room
+    with pytest.raises(Exception, match="boom"):
+        with workspaces.workspace("old-feedstock") as path:
+            path.mkdir()
+            (path / "blob").write_bytes(b"x" * 2000)
+            raise Exception("boom")
+    with workspaces.workspace("foo-feedstock") as path:
+        assert workspaces.kept() == []
+        path.mkdir()
+        (path / "blob").write_bytes(b"x" * 2000)
+
+        # A running workspace is never evicted, the next one waits for it
+        acquired = threading.Event()
+
+        def acquire():
+            with workspaces.workspace("bar-feedstock"):
+                acquired.set()
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        assert not acquired.wait(0.2)
+
+    thread.join(timeout=5)
+    assert acquired.is_set()
+
+
+def test_quota_ignores_the_directories_of_others(tmp_path):
+    (tmp_path / "notes").mkdir()
+    (tmp_path / "notes" / "blob").write_bytes(b"x" * 2000)
+    workspaces = WorkspaceManager(tmp_path, keep_failed=True, quota=1000)
+
+    with workspaces.workspace("foo-feedstock") as path:
+        path.mkdir()
+    assert workspaces.kept() == []
+    assert workspaces.usage() == 0
+    assert (tmp_path / "notes" / "blob").exists()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["notes"]